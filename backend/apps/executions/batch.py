@@ -0,0 +1,371 @@
+import asyncio
+import csv
+import dataclasses
+import importlib.util
+import itertools
+import json
+import os
+import time
+import typing
+from pathlib import Path
+from types import MappingProxyType, UnionType
+
+from django.conf import settings
+from django.utils import timezone
+
+from apps.ml.executors import run_in
+from apps.workflows.models import Workflow
+from core.metrics import metrics
+from .dag import DagExecutor
+from .models import BatchRun
+from .plan import CONFIG_SCHEMAS, compile_plan, config_errors
+from .scheduler import scheduler
+
+INPUT_FORMATS = ('csv', 'jsonl')
+OUTPUT_FORMATS = ('jsonl', 'parquet')
+
+RECORDS = metrics.counter('batch_records_total', 'Batch run records by outcome', ['status'])
+
+
+class BatchInputError(ValueError):
+    pass
+
+
+def parse_bindings(bindings):
+    # {"summarize.input_text": "text"} -> {"summarize": {"input_text": "text"}}
+    if not isinstance(bindings, dict) or not bindings:
+        raise BatchInputError('bindings must map "<task id>.<field>" to a record column')
+    parsed = {}
+    for target, column in bindings.items():
+        task_id, _, field_name = str(target).rpartition('.')
+        if not task_id or not field_name or not isinstance(column, str) or not column:
+            raise BatchInputError(
+                f'Invalid binding {target!r}: expected "<task id>.<field>": "<column>"'
+            )
+        parsed.setdefault(task_id, {})[field_name] = column
+    return parsed
+
+
+def detect_format(path, explicit=None, formats=INPUT_FORMATS):
+    fmt = (explicit or Path(path).suffix.lstrip('.')).lower()
+    if fmt == 'ndjson':
+        fmt = 'jsonl'
+    if fmt not in formats:
+        raise BatchInputError(f"Unsupported format {fmt!r}; expected one of {', '.join(formats)}")
+    return fmt
+
+
+def read_records(path, fmt, start=0):
+    """Yields the dataset's raw records one at a time, skipping ``start``.
+
+    CSV rows come out as dicts and JSONL records as their line of text;
+    parse_record() turns either into a record dict. A row the CSV reader
+    rejects comes out as a BatchInputError, so one bad record fails on its
+    own instead of stopping the run (and every resume) at that point.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            rows = csv.DictReader(f)
+        else:
+            rows = (line.strip() for line in f if line.strip())
+        index = 0
+        while True:
+            try:
+                row = next(rows)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                row = BatchInputError(f"Malformed CSV row: {e}")
+            if index >= start:
+                yield row
+            index += 1
+
+
+def parse_record(raw):
+    if isinstance(raw, BatchInputError):
+        raise raw
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError as e:
+            raise BatchInputError(f"Invalid JSON: {e}")
+    if not isinstance(raw, dict):
+        raise BatchInputError("Record is not an object")
+    return raw
+
+
+def coerce(value, expected):
+    # CSV cells are always strings; turn them into what the config expects.
+    if not isinstance(value, str):
+        return value
+    if expected is int:
+        return int(value)
+    if expected is float:
+        return float(value)
+    origin = typing.get_origin(expected)
+    if origin in (typing.Union, UnionType):
+        options = typing.get_args(expected)
+        return value if str in options else coerce(value, options[0])
+    if origin is list:
+        return json.loads(value) if value.lstrip().startswith('[') else [value]
+    return value
+
+
+def record_plan(plan, bindings, record):
+    """The plan with one record's values written into the bound config fields."""
+    steps = dict(plan.steps)
+    for task_id, fields in bindings.items():
+        step = steps[task_id]
+        config = dict(step.config)
+        for field_name, column in fields.items():
+            if column not in record:
+                raise BatchInputError(f"Record has no column {column!r}")
+            try:
+                config[field_name] = coerce(record[column], CONFIG_SCHEMAS[step.type][field_name])
+            except (ValueError, TypeError) as e:
+                raise BatchInputError(f"Column {column!r} for {task_id}.{field_name}: {e}")
+        problems = config_errors(step.type, config, {field for _, field in step.bindings})
+        if problems:
+            raise BatchInputError(f"Task {task_id} ({step.type}): " + ", ".join(problems))
+        steps[task_id] = dataclasses.replace(step, config=MappingProxyType(config))
+    return dataclasses.replace(plan, steps=MappingProxyType(steps))
+
+
+def working_path(batch):
+    # Results are appended (and checkpointed) as JSON Lines; Parquet output
+    # is converted from that file once the run finishes.
+    if batch.output_format == 'parquet':
+        return f"{batch.output_path}.partial.jsonl"
+    return batch.output_path
+
+
+def write_parquet(source, destination, rows_per_group=10_000):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('index', pa.int64()),
+        ('status', pa.string()),
+        ('input', pa.string()),
+        ('outputs', pa.string()),
+        ('errors', pa.string()),
+    ])
+
+    def flush(rows):
+        columns = {name: [row[name] for row in rows] for name in schema.names}
+        writer.write_table(pa.table(columns, schema=schema))
+
+    with pq.ParquetWriter(destination, schema) as writer, open(source, encoding='utf-8') as f:
+        rows = []
+        for line in f:
+            entry = json.loads(line)
+            rows.append({
+                'index': entry['index'],
+                'status': entry['status'],
+                # Nested values vary per workflow, so they stay JSON text.
+                'input': json.dumps(entry['input']),
+                'outputs': json.dumps(entry['outputs']),
+                'errors': json.dumps(entry['errors']),
+            })
+            if len(rows) >= rows_per_group:
+                flush(rows)
+                rows = []
+        if rows:
+            flush(rows)
+
+
+def _sync(out):
+    out.flush()
+    os.fsync(out.fileno())
+    return out.tell()
+
+
+class BatchRunner:
+    """Runs a workflow once per input record and appends results in order.
+
+    Up to ``concurrency`` records are in flight at once, so their model
+    calls land in the same inference batches, and the process-wide task
+    scheduler keeps the whole batch in one fair-queue slot next to other
+    workflows. Finished records wait (at most ``window`` of them) until
+    every earlier record is written, which keeps the output in input order
+    and lets a checkpoint be a plain record count plus file offset.
+    """
+
+    def __init__(self, batch, plan, bindings, service=None, concurrency=None, on_progress=None):
+        config = settings.BATCH_RUNS
+        self.batch = batch
+        self.plan = plan
+        self.bindings = bindings
+        if service is None:
+            from apps.ml.services import MLService
+            service = MLService(batching=True)
+        self.service = service
+        self.concurrency = concurrency or batch.concurrency or config['CONCURRENCY']
+        self.window = self.concurrency * 4
+        self.checkpoint_every = config['CHECKPOINT_EVERY']
+        self.checkpoint_interval = config['CHECKPOINT_INTERVAL']
+        self.on_progress = on_progress
+        self.leaves = [step_id for step_id, step in plan.steps.items() if not step.downstream]
+
+    async def run(self):
+        batch = self.batch
+        path = working_path(batch)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        mode = 'r+b' if os.path.exists(path) else 'wb'
+        with open(path, mode) as out:
+            # Drop anything written after the last checkpoint; those records
+            # run again.
+            out.truncate(batch.output_offset)
+            out.seek(batch.output_offset)
+            await self._run(out)
+        if batch.output_format == 'parquet':
+            await run_in('io', write_parquet, path, batch.output_path)
+            os.remove(path)
+
+    async def _run(self, out):
+        batch = self.batch
+        records = read_records(batch.input_path, batch.input_format, start=batch.checkpoint)
+        next_index = written = batch.checkpoint
+        finished, pending = {}, set()
+        buffered, exhausted = [], False
+        last_saved, last_saved_at = written, time.monotonic()
+        while True:
+            while (
+                not exhausted
+                and len(pending) < self.concurrency
+                and next_index - written < self.window
+            ):
+                if not buffered:
+                    # File reads run on the io pool, a window's worth at a time.
+                    buffered = await run_in(
+                        'io', lambda: list(itertools.islice(records, self.window))
+                    )
+                    buffered.reverse()
+                    if not buffered:
+                        exhausted = True
+                        break
+                raw = buffered.pop()
+                pending.add(asyncio.create_task(self._run_record(next_index, raw)))
+                next_index += 1
+            if not pending:
+                break
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index, ok, line = task.result()
+                finished[index] = (ok, line)
+            lines = []
+            while written in finished:
+                ok, line = finished.pop(written)
+                lines.append(line)
+                if ok:
+                    batch.succeeded += 1
+                else:
+                    batch.failed += 1
+                written += 1
+            if lines:
+                await run_in('io', out.writelines, lines)
+            if (
+                written - last_saved >= self.checkpoint_every
+                or time.monotonic() - last_saved_at >= self.checkpoint_interval
+            ):
+                await self._checkpoint(out, written)
+                last_saved, last_saved_at = written, time.monotonic()
+        await self._checkpoint(out, written)
+
+    async def _checkpoint(self, out, written):
+        batch = self.batch
+        batch.checkpoint = written
+        batch.output_offset = await run_in('io', _sync, out)
+        await BatchRun.objects.filter(id=batch.id).aupdate(
+            checkpoint=batch.checkpoint,
+            output_offset=batch.output_offset,
+            succeeded=batch.succeeded,
+            failed=batch.failed,
+            updated_at=timezone.now(),
+        )
+        if self.on_progress is not None:
+            self.on_progress(batch)
+
+    async def _run_record(self, index, raw):
+        outputs, errors, record = {}, {}, raw
+        try:
+            record = parse_record(raw)
+            executor = DagExecutor(
+                record_plan(self.plan, self.bindings, record),
+                self.service,
+                concurrency=settings.WORKFLOW_MAX_CONCURRENCY,
+                scheduler=scheduler,
+            )
+            await executor.run()
+            outputs = {
+                step_id: executor.results[step_id]
+                for step_id in self.leaves if step_id in executor.results
+            }
+            errors = {step_id: str(e) for step_id, e in executor.errors.items()}
+        except BatchInputError as e:
+            errors = {'input': str(e)}
+        ok = not errors
+        RECORDS.inc(status='completed' if ok else 'failed')
+        line = json.dumps(
+            {
+                'index': index,
+                'status': 'completed' if ok else 'failed',
+                'input': None if isinstance(record, Exception) else record,
+                'outputs': outputs,
+                'errors': errors,
+            },
+            default=str,
+        )
+        return index, ok, (line + '\n').encode()
+
+
+def prepare(workflow, bindings):
+    """Parses bindings and compiles the workflow with the bound fields."""
+    parsed = parse_bindings(bindings)
+    inputs = {task_id: fields.keys() for task_id, fields in parsed.items()}
+    return compile_plan(workflow, inputs=inputs), parsed
+
+
+def batch_dir(batch_id):
+    return Path(settings.BATCH_RUNS['DIR']) / str(batch_id)
+
+
+def create_batch_run(workflow, bindings, input_path, input_format=None, output_path=None,
+                     output_format=None, concurrency=0, batch_id=None):
+    """Validates a batch run's setup and records it as queued.
+
+    Raises BatchInputError or WorkflowGraphError, before anything runs.
+    """
+    input_format = detect_format(input_path, input_format)
+    output_format = detect_format(output_path or 'results.jsonl', output_format, OUTPUT_FORMATS)
+    if output_format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise BatchInputError("Parquet output needs pyarrow installed")
+    prepare(workflow, bindings)
+    batch = BatchRun(workflow=workflow, bindings=bindings, concurrency=concurrency or 0)
+    if batch_id is not None:
+        batch.id = batch_id
+    batch.input_path = str(input_path)
+    batch.input_format = input_format
+    batch.output_format = output_format
+    batch.output_path = str(output_path or batch_dir(batch.id) / f"results.{output_format}")
+    batch.save()
+    return batch
+
+
+async def run_batch(batch, on_progress=None):
+    # Safe to call again on an interrupted run: it resumes at the checkpoint.
+    batch.status = 'running'
+    await batch.asave(update_fields=['status', 'updated_at'])
+    try:
+        workflow = await Workflow.objects.aget(id=batch.workflow_id)
+        plan, bindings = prepare(workflow, batch.bindings)
+        await BatchRunner(batch, plan, bindings, on_progress=on_progress).run()
+    except Exception as e:
+        batch.status = 'failed'
+        batch.error = str(e)
+    else:
+        batch.status = 'completed'
+        batch.error = ''
+    batch.completed_at = timezone.now()
+    await batch.asave(update_fields=['status', 'error', 'completed_at', 'updated_at'])
+    return batch
@@ -0,0 +1,142 @@
+# bench_db.py
+#
+# Write-contention benchmark: --executions concurrent runs (threads, each
+# with its own database connection) log --events task steps each. A step
+# reads its execution row, appends a log event and updates the row in one
+# transaction, the pattern that made runs fail with "database is locked".
+# SQLite is measured on scratch databases with Django's stock setup
+# (rollback journal, synchronous=FULL, plain BEGIN, 5s timeout), with the
+# SQLITE profile from settings but plain BEGIN, and with the full profile;
+# with DB_ENGINE=postgres the configured database is used. Only successful
+# steps count towards steps/s. Run from the backend directory:
+#
+#   python -m apps.executions.bench_db --executions 16 --events 100
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+STOCK_SQLITE = {
+    'SQLITE_JOURNAL_MODE': 'DELETE',
+    'SQLITE_SYNCHRONOUS': 'FULL',
+    'SQLITE_BUSY_TIMEOUT_MS': '5000',
+    'SQLITE_MMAP_SIZE': '0',
+    'SQLITE_CACHE_SIZE': '-2000',
+    'SQLITE_TEMP_STORE': 'DEFAULT',
+    'SQLITE_TRANSACTION_MODE': '',
+}
+
+
+def run_child(args):
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    django.setup()
+
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.db import OperationalError, connection, transaction
+
+    from apps.executions.models import ExecutionEvent, WorkflowExecution
+    from apps.workflows.models import Workflow
+
+    if settings.DB_ENGINE == 'sqlite':
+        call_command('migrate', run_syncdb=True, verbosity=0)
+    workflow = Workflow.objects.create(name='bench-db', tasks=[], connections=[])
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start = threading.Barrier(args.executions)
+
+    def execution():
+        run = WorkflowExecution.objects.create(workflow=workflow)
+        start.wait()
+        for step in range(args.events):
+            started = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    run = WorkflowExecution.objects.get(id=run.id)
+                    ExecutionEvent.objects.create(
+                        execution=run, task_id=str(step), message=f'Task {step} completed',
+                        data={'status': 'completed'},
+                    )
+                    run.stats = {'executed': step + 1}
+                    run.save(update_fields=['stats'])
+            except OperationalError as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - started)
+        connection.close()
+
+    threads = [threading.Thread(target=execution) for _ in range(args.executions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    workflow.delete()
+
+    latencies.sort()
+    print(json.dumps({
+        'steps_per_second': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) if latencies else None,
+        'p95': latencies[int(len(latencies) * 0.95) - 1] if latencies else None,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+    }))
+
+
+def run_profile(name, env, args):
+    output = subprocess.run(
+        [sys.executable, '-m', 'apps.executions.bench_db', '--child',
+         '--executions', str(args.executions), '--events', str(args.events)],
+        env={**os.environ, **env}, capture_output=True, text=True, check=True,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    latency = (
+        f"p50 {result['p50'] * 1000:.1f}ms, p95 {result['p95'] * 1000:.1f}ms"
+        if result['p50'] is not None else 'no successful steps'
+    )
+    print(
+        f"{name:>8}: {result['steps_per_second']:8.1f} steps/s, {latency}, "
+        f"{result['errors']} failed"
+        + (f" ({result['first_error']})" if result['first_error'] else '')
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--executions', type=int, default=16, help='concurrent executions')
+    parser.add_argument('--events', type=int, default=100, help='logged steps per execution')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args)
+        return
+
+    total = args.executions * args.events
+    print(f'{args.executions} concurrent executions x {args.events} steps ({total} transactions)')
+    if os.environ.get('DB_ENGINE') == 'postgres':
+        run_profile('postgres', {}, args)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        profiles = (
+            ('stock', STOCK_SQLITE),
+            # The tuned pragmas with plain BEGIN, to separate the two changes.
+            ('deferred', {'SQLITE_TRANSACTION_MODE': ''}),
+            ('tuned', {}),
+        )
+        for name, env in profiles:
+            path = os.path.join(directory, f'{name}.sqlite3')
+            run_profile(name, {**env, 'DB_ENGINE': 'sqlite', 'SQLITE_PATH': path}, args)
+
+
+if __name__ == '__main__':
+    main()
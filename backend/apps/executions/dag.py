@@ -0,0 +1,241 @@
+import asyncio
+import contextlib
+import time
+from dataclasses import dataclass, field
+
+from apps.workflows.constants import VALID_TASK_CONNECTIONS
+from core.metrics import metrics
+
+TASK_METHODS = {
+    'scraping': 'scrape_web',
+    'summarization': 'summarize_text',
+    'classification': 'classify_image',
+    'email': 'send_email',
+}
+
+# Task types whose handler takes an ``on_progress`` callback; long-document
+# summaries report each map/reduce level before the final summary.
+PROGRESS_TASKS = {'summarization'}
+
+NODE_SECONDS = metrics.histogram(
+    'workflow_node_duration_seconds', 'Workflow node run time by task type', ['task_type', 'status']
+)
+NODES_REUSED = metrics.counter(
+    'workflow_nodes_reused_total', "Nodes that reused an earlier run's result", ['task_type']
+)
+
+
+class WorkflowGraphError(ValueError):
+    pass
+
+
+@dataclass
+class Node:
+    id: str
+    type: str
+    config: dict
+    upstream: list = field(default_factory=list)
+    downstream: list = field(default_factory=list)
+
+
+def build_dag(tasks, connections):
+    if not isinstance(tasks, list) or not isinstance(connections, list):
+        raise WorkflowGraphError("tasks and connections must be lists")
+    nodes = {}
+    for task in tasks:
+        if not isinstance(task, dict) or task.get('id') in (None, ''):
+            raise WorkflowGraphError(f"Task must be an object with an id: {task!r}")
+        node_id = str(task['id'])
+        if node_id in nodes:
+            raise WorkflowGraphError(f"Duplicate task id: {node_id}")
+        if not isinstance(task.get('type'), str) or task['type'] not in VALID_TASK_CONNECTIONS:
+            raise WorkflowGraphError(f"Invalid task type: {task.get('type')}")
+        nodes[node_id] = Node(id=node_id, type=task['type'], config=task.get('config') or {})
+
+    for connection in connections:
+        if not isinstance(connection, dict) or 'source' not in connection or 'target' not in connection:
+            raise WorkflowGraphError(
+                f"Connection must be an object with a source and target: {connection!r}"
+            )
+        source_id, target_id = str(connection['source']), str(connection['target'])
+        if source_id not in nodes or target_id not in nodes:
+            raise WorkflowGraphError(
+                f"Connection {source_id} -> {target_id} references an unknown task"
+            )
+        source, target = nodes[source_id], nodes[target_id]
+        if target.type not in VALID_TASK_CONNECTIONS[source.type]['valid_targets']:
+            raise WorkflowGraphError(
+                f"Cannot connect {source.type} to {target.type}"
+            )
+        if target_id in source.downstream:
+            continue
+        source.downstream.append(target_id)
+        target.upstream.append(source_id)
+
+    topological_order(nodes)
+    return nodes
+
+
+def topological_order(nodes):
+    remaining = {node_id: len(node.upstream) for node_id, node in nodes.items()}
+    ready = [node_id for node_id, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        node_id = ready.pop()
+        order.append(node_id)
+        for child in nodes[node_id].downstream:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                ready.append(child)
+    if len(order) != len(nodes):
+        raise WorkflowGraphError("Workflow connections contain a cycle")
+    return order
+
+
+def format_output(result):
+    if isinstance(result, str):
+        return result
+    if isinstance(result, dict):
+        # Scraping results: {selector: [text, ...]}, or {url: {...}} when
+        # several URLs were scraped.
+        return "\n".join(format_output(value) for value in result.values())
+    if isinstance(result, list):
+        # Classification results: [{"label": ..., "confidence": ...}, ...]
+        return "\n".join(
+            f"{item['label']}: {item['confidence']}"
+            if isinstance(item, dict) and 'label' in item else format_output(item)
+            for item in result
+        )
+    return str(result)
+
+
+def bind_inputs(step, results):
+    config = dict(step.config)
+    bound = {}
+    for upstream_id, field_name in step.bindings:
+        bound.setdefault(field_name, []).append(format_output(results[upstream_id]))
+    for field_name, values in bound.items():
+        config[field_name] = "\n\n".join(values)
+    return config
+
+
+class DagExecutor:
+    """Runs plan steps as soon as all of their upstream steps finish.
+
+    Up to ``concurrency`` nodes run at once. A failed node marks everything
+    downstream of it as skipped while unrelated branches keep going. With a
+    ``store``, nodes whose inputs match an earlier run reuse its result, so
+    only the subgraph below a change is recomputed. A ``scheduler`` adds the
+    process-wide per-task-type limits shared with other runs.
+    """
+
+    def __init__(self, plan, service, concurrency=4, on_event=None, store=None, scheduler=None):
+        self.plan = plan
+        self.nodes = plan.steps
+        self.service = service
+        self.concurrency = concurrency
+        self.on_event = on_event
+        self.store = store
+        self.scheduler = scheduler
+        self.results = {}
+        self.errors = {}
+        self.skipped = set()
+        self.durations = {}
+        self.reused = {}
+
+    async def run(self):
+        semaphore = asyncio.Semaphore(self.concurrency)
+        remaining = {node_id: len(node.upstream) for node_id, node in self.nodes.items()}
+        pending = {
+            asyncio.create_task(self._run_node(node_id, semaphore))
+            for node_id, count in remaining.items() if count == 0
+        }
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    node_id = task.result()
+                    for child in self.nodes[node_id].downstream:
+                        if node_id in self.errors or node_id in self.skipped:
+                            await self._skip(child)
+                        remaining[child] -= 1
+                        if remaining[child] == 0 and child not in self.skipped:
+                            pending.add(asyncio.create_task(self._run_node(child, semaphore)))
+        finally:
+            # If the run is cancelled or fails, don't leave nodes running
+            # detached from it.
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        return self.results
+
+    async def _run_node(self, node_id, semaphore):
+        try:
+            return await self._execute_node(node_id, semaphore)
+        except Exception as e:
+            # Failures outside the task call (result store, event callback)
+            # fail the node the same way, so its subgraph is skipped and the
+            # run still finishes.
+            self.results.pop(node_id, None)
+            self.errors.setdefault(node_id, e)
+            with contextlib.suppress(Exception):
+                await self._emit(node_id, 'failed', error=str(e))
+            return node_id
+
+    async def _execute_node(self, node_id, semaphore):
+        node = self.nodes[node_id]
+        config = bind_inputs(node, self.results)
+        if self.store is not None:
+            stored = await self.store.lookup(node, config)
+            if stored is not None:
+                self.results[node_id], self.reused[node_id] = stored
+                NODES_REUSED.inc(task_type=node.type)
+                await self._emit(node_id, 'reused', result=self.results[node_id])
+                return node_id
+        async with semaphore, self._slot(node):
+            await self._emit(node_id, 'running')
+            started = time.perf_counter()
+            try:
+                result = await self._call(node, config)
+            except Exception as e:
+                self.durations[node_id] = time.perf_counter() - started
+                NODE_SECONDS.observe(self.durations[node_id], task_type=node.type, status='failed')
+                self.errors[node_id] = e
+                await self._emit(node_id, 'failed', error=str(e))
+                return node_id
+            self.durations[node_id] = time.perf_counter() - started
+            NODE_SECONDS.observe(self.durations[node_id], task_type=node.type, status='completed')
+            self.results[node_id] = result
+            await self._emit(node_id, 'completed', result=result)
+        if self.store is not None:
+            await self.store.save(node, config, result, self.durations[node_id])
+        return node_id
+
+    def _slot(self, step):
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot(step.type, key=self.plan.workflow_id)
+
+    async def _call(self, step, config):
+        # MLService methods never block the loop: blocking work (parsing,
+        # unbatched inference, disk) goes to its executor in apps.ml.executors.
+        handler = getattr(self.service, step.handler)
+        if step.type in PROGRESS_TASKS:
+            async def on_progress(progress):
+                await self._emit(step.id, 'progress', progress=progress)
+            return await handler(config, on_progress=on_progress)
+        return await handler(config)
+
+    async def _skip(self, node_id):
+        if node_id in self.skipped:
+            return
+        self.skipped.add(node_id)
+        await self._emit(node_id, 'skipped')
+        for child in self.nodes[node_id].downstream:
+            await self._skip(child)
+
+    async def _emit(self, node_id, status, **details):
+        if self.on_event is not None:
+            # Reused nodes report the run time they saved.
+            duration = self.durations.get(node_id, self.reused.get(node_id))
+            await self.on_event(node_id, status, duration, **details)
@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ExecutionEvent
+
+
+class EventWriter:
+    """Buffers execution log events and inserts them with bulk_create.
+
+    The buffer is flushed once it holds ``batch_size`` events or the oldest
+    buffered event is ``flush_interval`` seconds old, and on ``aflush()`` at
+    the end of a run. Each flush is a single INSERT regardless of how many
+    tasks the workflow has. In async use a timer also flushes a partial
+    buffer after ``flush_interval``, so progress streams never lag by more
+    than that.
+    """
+
+    def __init__(self, execution, batch_size=None, flush_interval=None):
+        self.execution = execution
+        self.batch_size = batch_size or settings.EXECUTION_EVENT_BATCH_SIZE
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else settings.EXECUTION_EVENT_FLUSH_INTERVAL
+        )
+        self._buffer = []
+        self._oldest = None
+        self._timer = None
+
+    def _add(self, message, level='info', task_id='', **data):
+        if not self._buffer:
+            self._oldest = time.monotonic()
+        self._buffer.append(ExecutionEvent(
+            execution=self.execution,
+            task_id=task_id or '',
+            level=level,
+            message=message,
+            data=data,
+            timestamp=timezone.now(),
+        ))
+
+    def _due(self):
+        return (
+            len(self._buffer) >= self.batch_size
+            or time.monotonic() - self._oldest >= self.flush_interval
+        )
+
+    def append(self, message, level='info', task_id='', **data):
+        self._add(message, level, task_id, **data)
+        if self._due():
+            self.flush()
+
+    def flush(self):
+        events, self._buffer = self._buffer, []
+        if events:
+            ExecutionEvent.objects.bulk_create(events)
+
+    async def aappend(self, message, level='info', task_id='', **data):
+        self._add(message, level, task_id, **data)
+        if self._due():
+            await self.aflush()
+        elif self._timer is None:
+            loop = asyncio.get_running_loop()
+            self._timer = loop.call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self.aflush())
+            )
+
+    async def aflush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        events, self._buffer = self._buffer, []
+        if events:
+            await ExecutionEvent.objects.abulk_create(events)
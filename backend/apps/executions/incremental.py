@@ -0,0 +1,67 @@
+import hashlib
+import json
+
+from django.conf import settings
+
+from apps.ml.registry import registry
+from .models import NodeResult
+
+# Scraping reads live pages and email has side effects, so those always run.
+# Nodes below them are still reused when the output they receive is unchanged.
+REUSABLE_TASKS = {'summarization', 'classification'}
+
+
+def fingerprint(task_type, config):
+    # `config` is the bound config, so it already carries the upstream
+    # outputs; the model id makes a backend or model swap a cache miss.
+    payload = {'type': task_type, 'config': config}
+    if task_type in registry.specs:
+        payload['model'] = registry.model_id(task_type)
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class NodeResultStore:
+    """Per-node results of earlier executions of one workflow.
+
+    The DAG executor asks ``lookup`` before running a node and hands
+    successful results to ``save``. With ``reuse=False`` every node runs but
+    results are still stored for the next incremental run.
+    """
+
+    def __init__(self, execution, reuse=True, keep=None):
+        self.execution = execution
+        self.reuse = reuse
+        self.keep = keep or settings.WORKFLOW_INCREMENTAL['KEEP_PER_TASK']
+
+    async def lookup(self, node, config):
+        if not self.reuse or node.type not in REUSABLE_TASKS:
+            return None
+        stored = await (
+            NodeResult.objects
+            .filter(workflow_id=self.execution.workflow_id, fingerprint=fingerprint(node.type, config))
+            .only('result', 'duration')
+            .afirst()
+        )
+        if stored is None:
+            return None
+        return stored.result, stored.duration
+
+    async def save(self, node, config, result, duration):
+        if node.type not in REUSABLE_TASKS:
+            return
+        await NodeResult.objects.acreate(
+            workflow_id=self.execution.workflow_id,
+            execution=self.execution,
+            task_id=node.id,
+            fingerprint=fingerprint(node.type, config),
+            result=result,
+            duration=duration,
+        )
+        stale = [
+            pk async for pk in NodeResult.objects
+            .filter(workflow_id=self.execution.workflow_id, task_id=node.id)
+            .values_list('pk', flat=True)[self.keep:]
+        ]
+        if stale:
+            await NodeResult.objects.filter(pk__in=stale).adelete()
@@ -0,0 +1,75 @@
+import asyncio
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.executions.batch import BatchInputError, create_batch_run, run_batch
+from apps.executions.dag import WorkflowGraphError
+from apps.executions.models import BatchRun
+from apps.workflows.models import Workflow
+
+
+def parse_bind(values):
+    bindings = {}
+    for value in values:
+        target, sep, column = value.partition('=')
+        if not sep:
+            raise CommandError(f"Invalid --bind {value!r} (expected task.field=column)")
+        bindings[target] = column
+    return bindings
+
+
+class Command(BaseCommand):
+    help = 'Run a workflow over every record of a CSV or JSONL file, in this process.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('workflow', nargs='?', help='Workflow id.')
+        parser.add_argument('input', nargs='?', help='CSV or JSONL input file.')
+        parser.add_argument(
+            '--bind', action='append', default=[],
+            help='task_id.field=column; repeat for each bound field.',
+        )
+        parser.add_argument('--output', help='Result file (default: under BATCH_RUNS["DIR"]).')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Input format.')
+        parser.add_argument('--output-format', choices=['jsonl', 'parquet'])
+        parser.add_argument('--concurrency', type=int, default=0)
+        parser.add_argument('--resume', metavar='BATCH_ID', help='Continue an earlier batch run.')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                batch = BatchRun.objects.get(id=options['resume'])
+            except (BatchRun.DoesNotExist, ValueError):
+                raise CommandError(f"No batch run {options['resume']}")
+            if batch.status == 'completed':
+                raise CommandError('Batch run already completed')
+            self.stdout.write(f'Resuming batch {batch.id} at record {batch.checkpoint}')
+        else:
+            if not options['workflow'] or not options['input']:
+                raise CommandError('workflow and input are required unless --resume is given')
+            try:
+                workflow = Workflow.objects.get(id=options['workflow'])
+            except (Workflow.DoesNotExist, ValueError):
+                raise CommandError(f"No workflow {options['workflow']}")
+            try:
+                batch = create_batch_run(
+                    workflow,
+                    parse_bind(options['bind']),
+                    options['input'],
+                    input_format=options['format'],
+                    output_path=options['output'],
+                    output_format=options['output_format'],
+                    concurrency=options['concurrency'],
+                )
+            except (BatchInputError, WorkflowGraphError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(f'Batch {batch.id}')
+
+        def progress(batch):
+            self.stdout.write(f'  {batch.checkpoint} records ({batch.failed} failed)')
+
+        batch = asyncio.run(run_batch(batch, on_progress=progress))
+        if batch.status != 'completed':
+            raise CommandError(f'Batch {batch.id} failed: {batch.error} (resume with --resume {batch.id})')
+        self.stdout.write(
+            f'Done: {batch.succeeded} succeeded, {batch.failed} failed -> {batch.output_path}'
+        )
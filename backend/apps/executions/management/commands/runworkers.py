@@ -0,0 +1,63 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.executions.queue import WorkerPool
+from apps.ml.registry import warm_up
+from core.metrics import start_http_server
+# Importing the tasks module registers its job handlers.
+import apps.executions.tasks
+
+
+def parse_lanes(value):
+    lanes = {}
+    for part in value.split(','):
+        name, _, count = part.partition(':')
+        try:
+            lanes[name.strip()] = int(count or 1)
+        except ValueError:
+            raise CommandError(f"Invalid lane spec: {part!r} (expected name:count)")
+    return lanes
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers from the database-backed queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lanes',
+            help='Comma separated lane:workers pairs, e.g. "inference:1,io:4". '
+                 'Defaults to JOB_QUEUE["LANES"].',
+        )
+        parser.add_argument('--poll-interval', type=float)
+        parser.add_argument(
+            '--shutdown-timeout', type=float, default=30,
+            help='Seconds to wait for running jobs on SIGINT/SIGTERM.',
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help="Serve this process's Prometheus metrics on the given port.",
+        )
+
+    def handle(self, *args, **options):
+        lanes = parse_lanes(options['lanes']) if options['lanes'] else settings.JOB_QUEUE['LANES']
+        pool = WorkerPool(lanes, poll_interval=options['poll_interval'])
+        stop = threading.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stop.set())
+
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+        # Load models before claiming jobs (ML_WARMUP_MODELS, or all of them
+        # with ML_PROCESS_ROLE=inference).
+        warm_up()
+        pool.start()
+        self.stdout.write(
+            'Workers started: ' + ', '.join(f'{lane}={n}' for lane, n in lanes.items())
+        )
+        while not stop.wait(1):
+            pass
+        self.stdout.write('Stopping workers...')
+        pool.stop(timeout=options['shutdown_timeout'])
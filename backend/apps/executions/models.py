@@ -1,6 +1,7 @@
 from django.db import models
 import uuid
 from django.core.cache import cache
+from django.utils import timezone
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
@@ -10,6 +11,7 @@ class WorkflowExecution(models.Model):
     status = models.CharField(
         max_length=20,
         choices=[
+            ('queued', 'Queued'),
             ('running', 'Running'),
             ('completed', 'Completed'),
             ('failed', 'Failed'),
@@ -17,6 +19,8 @@ class WorkflowExecution(models.Model):
         default='running'
     )
     logs = models.JSONField(default=list)
+    # {'reused': [task ids], 'executed': [task ids], 'time_saved': seconds}
+    stats = models.JSONField(default=dict, blank=True)
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
@@ -26,18 +30,157 @@ class WorkflowExecution(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['started_at']),
             models.Index(fields=['workflow']),
+            models.Index(fields=['workflow', '-started_at']),
         ]
 
     def __str__(self):
         return f"Execution of {self.workflow.name} ({self.status})"
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Invalidate cache
-        cache.delete(f'execution_{self.id}')
-        cache.delete(f'workflow_executions_{self.workflow_id}')
+    def log_entries(self):
+        # Executions created before ExecutionEvent existed keep their log in
+        # the legacy `logs` column.
+        return list(self.logs) + [event.as_log() for event in self.events.all()]
+
+
+class ExecutionEvent(models.Model):
+    execution = models.ForeignKey(WorkflowExecution, on_delete=models.CASCADE, related_name='events')
+    task_id = models.CharField(max_length=255, blank=True)
+    level = models.CharField(
+        max_length=10,
+        choices=[
+            ('info', 'Info'),
+            ('warning', 'Warning'),
+            ('error', 'Error'),
+        ],
+        default='info'
+    )
+    message = models.TextField()
+    data = models.JSONField(default=dict, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['execution', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.level}: {self.message[:50]}"
+
+    def as_log(self):
+        entry = {
+            'task_id': self.task_id,
+            'message': self.message,
+            'timestamp': self.timestamp.isoformat(),
+            'level': self.level,
+        }
+        entry.update(self.data)
+        return entry
+
+
+class NodeResult(models.Model):
+    # Output of one successful node run, keyed by the fingerprint of its
+    # type, config and upstream outputs so later runs can reuse it.
+    workflow = models.ForeignKey('workflows.Workflow', on_delete=models.CASCADE, related_name='node_results')
+    execution = models.ForeignKey(WorkflowExecution, on_delete=models.CASCADE, related_name='node_results')
+    task_id = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    result = models.JSONField(null=True)
+    duration = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['workflow', 'fingerprint']),
+            models.Index(fields=['workflow', 'task_id', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} ({self.fingerprint[:12]})"
+
+
+class Job(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict)
+    lane = models.CharField(max_length=50, default='default')
+    priority = models.IntegerField(default=0)
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('done', 'Done'),
+            ('failed', 'Failed'),
+        ],
+        default='queued'
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    available_at = models.DateTimeField(default=timezone.now)
+    lease_owner = models.CharField(max_length=255, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-priority', 'created_at']
+        indexes = [
+            models.Index(fields=['status', 'lane', 'available_at']),
+            models.Index(fields=['status', 'lease_expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.name} [{self.lane}] ({self.status})"
 
 @receiver(post_save, sender=WorkflowExecution)
 def invalidate_execution_cache(sender, instance, **kwargs):
     cache.delete(f'execution_{instance.id}')
-    cache.delete(f'workflow_executions_{instance.workflow_id}')
\ No newline at end of file
+    cache.delete(f'workflow_executions_{instance.workflow_id}')
+
+class BatchRun(models.Model):
+    # One workflow run over every record of an input dataset. Records
+    # [0, checkpoint) are already in the output file, which is
+    # output_offset bytes long at that point, so an interrupted run resumes
+    # from there.
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    workflow = models.ForeignKey('workflows.Workflow', on_delete=models.CASCADE, related_name='batch_runs')
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('completed', 'Completed'),
+            ('failed', 'Failed'),
+        ],
+        default='queued'
+    )
+    input_path = models.CharField(max_length=500)
+    input_format = models.CharField(max_length=10, choices=[('csv', 'CSV'), ('jsonl', 'JSON Lines')])
+    output_path = models.CharField(max_length=500)
+    output_format = models.CharField(
+        max_length=10, choices=[('jsonl', 'JSON Lines'), ('parquet', 'Parquet')], default='jsonl'
+    )
+    # {"<task id>.<config field>": "<record column>"}
+    bindings = models.JSONField(default=dict)
+    concurrency = models.PositiveIntegerField(default=0)
+    checkpoint = models.PositiveIntegerField(default=0)
+    output_offset = models.BigIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['workflow', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"Batch run of {self.workflow_id} ({self.status}, {self.checkpoint} records)"
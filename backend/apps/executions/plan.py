@@ -0,0 +1,167 @@
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType, UnionType
+
+from django.conf import settings
+
+from apps.ml.models import TaskConfig
+from apps.workflows.constants import VALID_TASK_CONNECTIONS
+from .dag import TASK_METHODS, WorkflowGraphError, build_dag, topological_order
+
+CONFIG_SCHEMAS = {
+    'scraping': TaskConfig.WEB_SCRAPING,
+    'summarization': TaskConfig.SUMMARIZATION,
+    'classification': TaskConfig.IMAGE_CLASSIFICATION,
+    'email': TaskConfig.EMAIL,
+}
+
+# Fields each task needs, as groups of alternatives: scraping takes either
+# `url` or `urls`. Fields not listed have defaults in MLService.
+REQUIRED_FIELDS = {
+    'scraping': [('url', 'urls'), ('selectors',)],
+    'summarization': [('input_text',)],
+    'classification': [('image_url',)],
+    'email': [('recipient',), ('subject',), ('body',)],
+}
+
+
+def _matches(value, expected):
+    if expected is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected is int:
+        return isinstance(value, int) and not isinstance(value, bool)
+    origin = typing.get_origin(expected)
+    if origin in (typing.Union, UnionType):
+        return any(_matches(value, option) for option in typing.get_args(expected))
+    if origin is list:
+        (item_type,) = typing.get_args(expected)
+        return isinstance(value, list) and all(_matches(item, item_type) for item in value)
+    return isinstance(value, expected)
+
+
+def config_errors(task_type, config, bound=()):
+    """Problems with a task config checked against its TaskConfig schema.
+
+    ``bound`` names fields filled from upstream outputs at run time, which
+    the stored config doesn't need to contain.
+    """
+    if task_type not in CONFIG_SCHEMAS:
+        return [f"Invalid task type: {task_type}"]
+    if not isinstance(config, dict):
+        return ["config must be an object"]
+    errors = []
+    for alternatives in REQUIRED_FIELDS[task_type]:
+        if not any(config.get(name) not in (None, '') or name in bound for name in alternatives):
+            errors.append(f"missing {' or '.join(alternatives)}")
+    for name, expected in CONFIG_SCHEMAS[task_type].items():
+        value = config.get(name)
+        if value is not None and not _matches(value, expected):
+            errors.append(f"{name} must be {getattr(expected, '__name__', expected)}")
+    return errors
+
+
+def validate_config(task_type, config, bound=()):
+    errors = config_errors(task_type, config, bound)
+    if errors:
+        raise WorkflowGraphError(f"Invalid {task_type} config: " + ", ".join(errors))
+
+
+@dataclass(frozen=True)
+class PlanStep:
+    id: str
+    type: str
+    handler: str
+    config: MappingProxyType
+    upstream: tuple
+    downstream: tuple
+    # (upstream step id, config field) pairs filled in from upstream outputs.
+    bindings: tuple
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    workflow_id: str
+    order: tuple
+    steps: MappingProxyType
+
+
+def compile_plan(workflow, inputs=None):
+    """Turns a workflow into a validated, immutable ExecutionPlan.
+
+    ``inputs`` maps task ids to config fields that will be supplied at run
+    time (batch runs fill them from each input record). Raises
+    WorkflowGraphError listing every problem, so a malformed workflow fails
+    before any model is loaded.
+    """
+    nodes = build_dag(workflow.tasks, workflow.connections)
+    inputs = inputs or {}
+    steps, errors = {}, []
+    for task_id in inputs:
+        if task_id not in nodes:
+            errors.append(f"Unknown task {task_id}")
+    for node_id, node in nodes.items():
+        bindings = tuple(
+            (upstream_id, VALID_TASK_CONNECTIONS[nodes[upstream_id].type]['output_mapping'][node.type])
+            for upstream_id in node.upstream
+        )
+        supplied = set(inputs.get(node_id, ()))
+        unknown = sorted(supplied - CONFIG_SCHEMAS[node.type].keys())
+        if unknown:
+            errors.append(f"Task {node_id} ({node.type}): unknown field {', '.join(unknown)}")
+            continue
+        problems = config_errors(node.type, node.config, {field for _, field in bindings} | supplied)
+        if problems:
+            errors.append(f"Task {node_id} ({node.type}): " + ", ".join(problems))
+            continue
+        steps[node_id] = PlanStep(
+            id=node_id,
+            type=node.type,
+            handler=TASK_METHODS[node.type],
+            config=MappingProxyType(dict(node.config)),
+            upstream=tuple(node.upstream),
+            downstream=tuple(node.downstream),
+            bindings=bindings,
+        )
+    if errors:
+        raise WorkflowGraphError("; ".join(errors))
+    return ExecutionPlan(
+        workflow_id=str(workflow.id),
+        order=tuple(topological_order(nodes)),
+        steps=MappingProxyType(steps),
+    )
+
+
+class PlanCache:
+    # Plans are keyed by (workflow id, updated_at): any edit saves the
+    # workflow and so naturally misses the cache.
+    def __init__(self, max_size=256):
+        self.max_size = max_size
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, workflow):
+        key = (str(workflow.id), workflow.updated_at)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = compile_plan(workflow)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+
+plan_cache = PlanCache(max_size=settings.WORKFLOW_PLAN_CACHE_SIZE)
+
+
+def get_plan(workflow):
+    return plan_cache.get(workflow)
@@ -0,0 +1,242 @@
+import asyncio
+import inspect
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core.metrics import metrics
+from .models import Job
+
+JOB_WAIT_SECONDS = metrics.histogram(
+    'job_queue_wait_seconds', 'Time jobs spent queued after becoming due', ['lane']
+)
+JOB_SECONDS = metrics.histogram(
+    'job_duration_seconds', 'Job run time by outcome', ['name', 'outcome']
+)
+
+JOB_HANDLERS = {}
+
+
+def register(name):
+    def decorator(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return decorator
+
+
+def _job_fields(name, payload, lane, priority, max_attempts):
+    return dict(
+        name=name,
+        payload=payload or {},
+        lane=lane,
+        priority=priority,
+        max_attempts=max_attempts or settings.JOB_QUEUE['MAX_ATTEMPTS'],
+    )
+
+
+def enqueue(name, payload=None, lane='default', priority=0, max_attempts=None):
+    return Job.objects.create(**_job_fields(name, payload, lane, priority, max_attempts))
+
+
+async def aenqueue(name, payload=None, lane='default', priority=0, max_attempts=None):
+    return await Job.objects.acreate(**_job_fields(name, payload, lane, priority, max_attempts))
+
+
+def _claimable(now):
+    # Queued jobs that are due, plus running jobs whose worker stopped
+    # renewing its lease (crashed or was killed) and that have attempts
+    # left: at-least-once delivery.
+    return (
+        Q(status='queued', available_at__lte=now)
+        | Q(status='running', lease_expires_at__lt=now, attempts__lt=F('max_attempts'))
+    )
+
+
+def fail_exhausted(now):
+    # A job that kills its worker on every attempt must not be reclaimed
+    # forever; once it has used its attempts, give up on it. The read comes
+    # first so an idle queue never takes the write lock.
+    exhausted = Job.objects.filter(
+        status='running', lease_expires_at__lt=now, attempts__gte=F('max_attempts')
+    )
+    if not exhausted.exists():
+        return 0
+    return exhausted.update(
+        status='failed',
+        error='Lease expired: the worker stopped before finishing the job',
+        lease_expires_at=None,
+        updated_at=now,
+    )
+
+
+_sweep_lock = threading.Lock()
+_next_sweep = 0.0
+
+
+def _sweep_due():
+    # fail_exhausted() runs at most every SWEEP_INTERVAL seconds per process,
+    # not on every worker's every poll.
+    global _next_sweep
+    with _sweep_lock:
+        if time.monotonic() < _next_sweep:
+            return False
+        _next_sweep = time.monotonic() + settings.JOB_QUEUE['SWEEP_INTERVAL']
+        return True
+
+
+def claim(worker_id, lanes, lease_seconds=None):
+    lease_seconds = lease_seconds or settings.JOB_QUEUE['LEASE_SECONDS']
+    now = timezone.now()
+    if _sweep_due():
+        fail_exhausted(now)
+    candidates = (
+        Job.objects.filter(_claimable(now), lane__in=lanes)
+        .order_by('-priority', 'created_at')
+        .values_list('id', flat=True)[:10]
+    )
+    for job_id in candidates:
+        # Conditional UPDATE: only one worker can win the row, without
+        # needing SELECT ... FOR UPDATE (which SQLite doesn't have).
+        claimed = Job.objects.filter(_claimable(now), id=job_id).update(
+            status='running',
+            lease_owner=worker_id,
+            lease_expires_at=now + timedelta(seconds=lease_seconds),
+            attempts=F('attempts') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def renew_lease(job, lease_seconds=None):
+    lease_seconds = lease_seconds or settings.JOB_QUEUE['LEASE_SECONDS']
+    return Job.objects.filter(id=job.id, lease_owner=job.lease_owner, status='running').update(
+        lease_expires_at=timezone.now() + timedelta(seconds=lease_seconds)
+    )
+
+
+def complete(job, result=None):
+    Job.objects.filter(id=job.id, lease_owner=job.lease_owner).update(
+        status='done',
+        result=result,
+        lease_expires_at=None,
+        updated_at=timezone.now(),
+    )
+
+
+def fail(job, error):
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        backoff = settings.JOB_QUEUE['RETRY_BACKOFF'] * 2 ** (job.attempts - 1)
+        changes = {
+            'status': 'queued',
+            'available_at': now + timedelta(seconds=backoff),
+        }
+    else:
+        changes = {'status': 'failed'}
+    Job.objects.filter(id=job.id, lease_owner=job.lease_owner).update(
+        error=error, lease_expires_at=None, updated_at=now, **changes
+    )
+
+
+async def _run_on_job_loop(awaitable):
+    from apps.ml.services import aclose_for_loop
+
+    try:
+        return await awaitable
+    finally:
+        await aclose_for_loop()
+
+
+def run_job(job):
+    handler = JOB_HANDLERS[job.name]
+    result = handler(**job.payload)
+    if inspect.isawaitable(result):
+        # Each job gets its own loop, so the clients it opened close with it.
+        result = asyncio.run(_run_on_job_loop(result))
+    return result
+
+
+class Worker(threading.Thread):
+    def __init__(self, lanes, worker_id, stop_event, poll_interval=None):
+        super().__init__(name=worker_id, daemon=True)
+        self.lanes = lanes
+        self.worker_id = worker_id
+        self.stop_event = stop_event
+        self.poll_interval = poll_interval or settings.JOB_QUEUE['POLL_INTERVAL']
+
+    def run(self):
+        while not self.stop_event.is_set():
+            close_old_connections()
+            job = claim(self.worker_id, self.lanes)
+            if job is None:
+                self.stop_event.wait(self.poll_interval)
+                continue
+            self.process(job)
+        close_old_connections()
+
+    def process(self, job):
+        done = threading.Event()
+        lease_seconds = settings.JOB_QUEUE['LEASE_SECONDS']
+
+        def keep_alive():
+            while not done.wait(lease_seconds / 3):
+                renew_lease(job)
+            close_old_connections()
+
+        renewer = threading.Thread(target=keep_alive, daemon=True)
+        renewer.start()
+        JOB_WAIT_SECONDS.observe(
+            max(0.0, (timezone.now() - job.available_at).total_seconds()), lane=job.lane
+        )
+        started = time.perf_counter()
+        try:
+            result = run_job(job)
+        except Exception:
+            JOB_SECONDS.observe(time.perf_counter() - started, name=job.name, outcome='failed')
+            fail(job, traceback.format_exc())
+        else:
+            JOB_SECONDS.observe(time.perf_counter() - started, name=job.name, outcome='done')
+            complete(job, result)
+        finally:
+            done.set()
+            renewer.join()
+
+
+class WorkerPool:
+    """Runs ``count`` worker threads per lane, e.g. {'inference': 1, 'io': 4}.
+
+    Lanes keep slow model-heavy jobs from starving quick I/O-bound ones;
+    within a lane jobs run by priority, then age.
+    """
+
+    def __init__(self, lanes=None, poll_interval=None):
+        self.lanes = lanes or settings.JOB_QUEUE['LANES']
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.workers = []
+
+    def start(self):
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        for lane, count in self.lanes.items():
+            for i in range(count):
+                worker = Worker(
+                    [lane], f"{prefix}:{lane}:{i}", self.stop_event, self.poll_interval
+                )
+                worker.start()
+                self.workers.append(worker)
+
+    def stop(self, timeout=None):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout if timeout else None
+        for worker in self.workers:
+            worker.join(None if deadline is None else max(0, deadline - time.monotonic()))
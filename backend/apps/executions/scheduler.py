@@ -0,0 +1,190 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+from core.metrics import metrics
+
+SLOT_WAIT_SECONDS = metrics.histogram(
+    'scheduler_wait_seconds',
+    'Time tasks waited for a scheduler slot and rate-limit token',
+    ['task_type'],
+)
+
+
+class Overloaded(Exception):
+    def __init__(self, task_type, retry_after):
+        super().__init__(f"Too many {task_type} tasks waiting; retry in {retry_after:.0f}s")
+        self.task_type = task_type
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token now, letting the balance go negative, and returns how
+        # long the caller has to wait for it to be paid back.
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+class _Waiter:
+    __slots__ = ('loop', 'future', 'granted')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Lane:
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.queued = 0
+        # Fair-queue key (usually a workflow id) -> waiters, served round-robin.
+        self.waiters = OrderedDict()
+        self.hold_time = None
+
+
+class TaskScheduler:
+    """Per-task-type concurrency limits and rate limits for one process.
+
+    Callers from any thread or event loop wait for a slot with
+    ``async with scheduler.slot(task_type, key)``. When a slot frees up, it
+    goes to the next fair-queue key in turn, so one large workflow can't
+    starve the others.
+    """
+
+    def __init__(self, limits, rates=None, max_queue=50):
+        self.max_queue = max_queue
+        self._lanes = {task_type: _Lane(limit) for task_type, limit in limits.items()}
+        self._buckets = {task_type: TokenBucket(*rate) for task_type, rate in (rates or {}).items()}
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def slot(self, task_type, key='default', reject=False):
+        lane = self._lanes.get(task_type)
+        if lane is None:
+            yield
+            return
+        waiting = time.monotonic()
+        await self._acquire(task_type, lane, key, reject)
+        started = time.monotonic()
+        try:
+            bucket = self._buckets.get(task_type)
+            if bucket is not None:
+                delay = bucket.reserve()
+                if delay:
+                    await asyncio.sleep(delay)
+            SLOT_WAIT_SECONDS.observe(time.monotonic() - waiting, task_type=task_type)
+            yield
+        finally:
+            held = time.monotonic() - started
+            with self._lock:
+                lane.hold_time = held if lane.hold_time is None else 0.8 * lane.hold_time + 0.2 * held
+            self._release(lane)
+
+    async def _acquire(self, task_type, lane, key, reject):
+        with self._lock:
+            if lane.active < lane.limit and not lane.queued:
+                lane.active += 1
+                return
+            if reject and lane.queued >= self.max_queue:
+                raise Overloaded(task_type, self._estimate(lane))
+            waiter = _Waiter(asyncio.get_running_loop())
+            lane.waiters.setdefault(key, deque()).append(waiter)
+            lane.queued += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    queue = lane.waiters.get(key)
+                    if queue is not None and waiter in queue:
+                        queue.remove(waiter)
+                        lane.queued -= 1
+                        if not queue:
+                            del lane.waiters[key]
+            if granted:
+                self._release(lane)
+            raise
+
+    def _release(self, lane):
+        with self._lock:
+            lane.active -= 1
+            while lane.waiters and lane.active < lane.limit:
+                key, queue = next(iter(lane.waiters.items()))
+                waiter = queue.popleft()
+                lane.queued -= 1
+                if queue:
+                    lane.waiters.move_to_end(key)
+                else:
+                    del lane.waiters[key]
+                try:
+                    waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+                except RuntimeError:
+                    # The waiter's event loop already closed.
+                    continue
+                waiter.granted = True
+                lane.active += 1
+
+    def _estimate(self, lane):
+        hold_time = lane.hold_time or 1.0
+        return hold_time * (lane.queued / lane.limit + 1)
+
+    def estimate(self, task_type):
+        lane = self._lanes.get(task_type)
+        if lane is None:
+            return 0.0
+        with self._lock:
+            if lane.active < lane.limit and not lane.queued:
+                return 0.0
+            return self._estimate(lane)
+
+    def stats(self):
+        with self._lock:
+            return {
+                task_type: {
+                    'limit': lane.limit,
+                    'active': lane.active,
+                    'queued': lane.queued,
+                    'avg_seconds': round(lane.hold_time, 3) if lane.hold_time is not None else None,
+                }
+                for task_type, lane in self._lanes.items()
+            }
+
+
+scheduler = TaskScheduler(
+    settings.TASK_SCHEDULER['LIMITS'],
+    rates=settings.TASK_SCHEDULER['RATES'],
+    max_queue=settings.TASK_SCHEDULER['MAX_QUEUE'],
+)
+
+metrics.gauge(
+    'scheduler_active_tasks', 'Tasks holding a scheduler slot', ['task_type'],
+    collect=lambda: [((name,), lane['active']) for name, lane in scheduler.stats().items()],
+)
+metrics.gauge(
+    'scheduler_queued_tasks', 'Tasks waiting for a scheduler slot', ['task_type'],
+    collect=lambda: [((name,), lane['queued']) for name, lane in scheduler.stats().items()],
+)
@@ -0,0 +1,43 @@
+from rest_framework import serializers
+from .models import BatchRun, WorkflowExecution, ExecutionEvent
+from apps.workflows.serializers import SparseFieldsetMixin, requested_fields
+
+class ExecutionEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExecutionEvent
+        fields = ['id', 'task_id', 'level', 'message', 'data', 'timestamp']
+        read_only_fields = fields
+
+class WorkflowExecutionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # Existing clients read the whole log from `logs`; it is rebuilt from the
+    # event table so they keep working unchanged.
+    logs = serializers.SerializerMethodField()
+
+    class Meta:
+        model = WorkflowExecution
+        fields = ['id', 'workflow', 'status', 'logs', 'stats', 'started_at', 'completed_at']
+        read_only_fields = fields
+
+    def get_logs(self, obj):
+        return obj.log_entries()
+
+
+class WorkflowExecutionListSerializer(WorkflowExecutionSerializer):
+    # Listings skip the log unless it is asked for with ?fields=...,logs.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if not requested or 'logs' not in requested:
+            self.fields.pop('logs', None)
+
+
+class BatchRunSerializer(serializers.ModelSerializer):
+    processed = serializers.IntegerField(source='checkpoint', read_only=True)
+
+    class Meta:
+        model = BatchRun
+        fields = [
+            'id', 'workflow', 'status', 'input_format', 'output_format', 'bindings', 'concurrency',
+            'processed', 'succeeded', 'failed', 'error', 'created_at', 'updated_at', 'completed_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,137 @@
+import asyncio
+import json
+
+from django.conf import settings
+
+from .models import ExecutionEvent, WorkflowExecution
+
+TERMINAL_STATUSES = {'completed', 'failed'}
+
+
+def event_payload(event):
+    payload = {
+        'id': event.id,
+        'task_id': event.task_id,
+        'level': event.level,
+        'message': event.message,
+        'timestamp': event.timestamp.isoformat(),
+    }
+    payload.update(event.data)
+    return payload
+
+
+def format_sse(data, event=None, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    if event:
+        lines.append(f'event: {event}')
+    lines.append('data: ' + json.dumps(data, default=str))
+    return '\n'.join(lines) + '\n\n'
+
+
+async def fetch_events(execution_id, after_id, limit=500):
+    queryset = ExecutionEvent.objects.filter(
+        execution_id=execution_id, id__gt=after_id
+    ).order_by('id')[:limit]
+    return [event async for event in queryset]
+
+
+async def fetch_status(execution_id):
+    return await WorkflowExecution.objects.filter(id=execution_id).values_list(
+        'status', flat=True
+    ).afirst()
+
+
+class _Channel:
+    def __init__(self, last_id):
+        self.last_id = last_id
+        self.subscribers = set()
+        self.task = None
+
+
+class ExecutionStreamHub:
+    """Fans execution events out to every watcher of an execution.
+
+    However many clients are watching, each execution is polled by a single
+    task that reads only the events added since its last query.
+    """
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or settings.EXECUTION_STREAM['POLL_INTERVAL']
+        self._channels = {}
+
+    def subscribe(self, execution_id, last_id):
+        channel = self._channels.get(execution_id)
+        if channel is None:
+            channel = self._channels[execution_id] = _Channel(last_id)
+        channel.last_id = min(channel.last_id, last_id)
+        queue = asyncio.Queue()
+        channel.subscribers.add(queue)
+        if channel.task is None or channel.task.done():
+            channel.task = asyncio.create_task(self._poll(execution_id, channel))
+        return queue
+
+    def unsubscribe(self, execution_id, queue):
+        channel = self._channels.get(execution_id)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            if channel.task is not None:
+                channel.task.cancel()
+            del self._channels[execution_id]
+
+    async def _poll(self, execution_id, channel):
+        while channel.subscribers:
+            events = await fetch_events(execution_id, channel.last_id)
+            for event in events:
+                channel.last_id = event.id
+                self._broadcast(channel, ('event', event))
+            if not events:
+                status = await fetch_status(execution_id)
+                if status is None or status in TERMINAL_STATUSES:
+                    # Events are flushed before the final status is saved,
+                    # but they may have landed between the two queries above;
+                    # drain them so none are dropped before `end`.
+                    while events := await fetch_events(execution_id, channel.last_id):
+                        for event in events:
+                            channel.last_id = event.id
+                            self._broadcast(channel, ('event', event))
+                    self._broadcast(channel, ('end', status))
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+    def _broadcast(self, channel, message):
+        for queue in list(channel.subscribers):
+            queue.put_nowait(message)
+
+
+hub = ExecutionStreamHub()
+
+
+async def stream_execution(execution_id, last_event_id=0):
+    queue = hub.subscribe(execution_id, last_event_id)
+    heartbeat = settings.EXECUTION_STREAM['HEARTBEAT']
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(queue.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            if kind == 'end':
+                yield format_sse({'status': value}, event='end')
+                return
+            # Another watcher may have started the shared poller from an
+            # earlier cursor; skip what this client has already seen.
+            if value.id <= last_event_id:
+                continue
+            last_event_id = value.id
+            yield format_sse(
+                event_payload(value),
+                event='node' if value.task_id else 'execution',
+                event_id=value.id,
+            )
+    finally:
+        hub.unsubscribe(execution_id, queue)
@@ -1,54 +1,155 @@
-import asyncio
+import time
+
+from django.conf import settings
 from django.utils import timezone
 from apps.workflows.models import Workflow
-from apps.executions.models import WorkflowExecution
-from apps.ml.services import MLService
+from apps.executions.models import BatchRun, WorkflowExecution
+from apps.executions.batch import run_batch
+from apps.executions.dag import DagExecutor
+from apps.executions.events import EventWriter
+from apps.executions.incremental import NodeResultStore
+from apps.executions.plan import get_plan
+from apps.executions.scheduler import scheduler
+from apps.executions.queue import aenqueue, enqueue, register
+from core.metrics import metrics, sampled_profile
+
+RUN_SECONDS = metrics.histogram(
+    'workflow_run_duration_seconds', 'Workflow execution time by outcome', ['status']
+)
+
+
+def workflow_lane(workflow):
+    # A workflow runs in the most expensive lane any of its tasks needs.
+    lanes = settings.JOB_QUEUE['TASK_LANES']
+    task_lanes = {lanes.get(task.get('type'), 'default') for task in workflow.tasks}
+    for lane in settings.JOB_QUEUE['LANES']:
+        if lane in task_lanes:
+            return lane
+    return 'default'
+
+
+def _workflow_job(workflow, execution, incremental):
+    payload = {
+        'workflow_id': str(workflow.id),
+        'execution_id': str(execution.id),
+        'incremental': incremental,
+    }
+    return 'execute_workflow', payload, workflow_lane(workflow)
+
+
+def enqueue_workflow(workflow, priority=0, incremental=None):
+    execution = WorkflowExecution.objects.create(workflow=workflow, status='queued')
+    name, payload, lane = _workflow_job(workflow, execution, incremental)
+    return execution, enqueue(name, payload, lane=lane, priority=priority)
+
+
+async def aenqueue_workflow(workflow, priority=0, incremental=None):
+    execution = await WorkflowExecution.objects.acreate(workflow=workflow, status='queued')
+    name, payload, lane = _workflow_job(workflow, execution, incremental)
+    return execution, await aenqueue(name, payload, lane=lane, priority=priority)
 
 
-async def execute_workflow(workflow_id):
-    workflow = await Workflow.objects.get(id=workflow_id)
-    execution = await WorkflowExecution.objects.create(workflow=workflow)
-    
+def enqueue_batch(batch, priority=0):
+    return enqueue(
+        'execute_batch',
+        {'batch_id': str(batch.id)},
+        lane=workflow_lane(batch.workflow),
+        priority=priority,
+    )
+
+
+@register('execute_batch')
+async def execute_batch(batch_id):
+    # A retried job (or one reclaimed after a worker died) picks the run up
+    # at its last checkpoint.
+    batch = await BatchRun.objects.aget(id=batch_id)
+    if batch.status == 'completed':
+        return batch_id
+    await run_batch(batch)
+    return batch_id
+
+
+@register('execute_workflow')
+async def execute_workflow(workflow_id, execution_id=None, incremental=None):
+    workflow = await Workflow.objects.aget(id=workflow_id)
+    if execution_id:
+        execution = await WorkflowExecution.objects.aget(id=execution_id)
+    else:
+        execution = await WorkflowExecution.objects.acreate(workflow=workflow)
+    events = EventWriter(execution)
+    started = time.perf_counter()
+
     try:
+        # Compile before touching the workflow: a malformed graph or config
+        # fails here, before any model is loaded.
+        plan = get_plan(workflow)
         workflow.status = 'running'
-        await workflow.asave()
-        
-        ml_service = MLService()
-        
-        for task in workflow.tasks:
-            if task['type'] == 'summarization':
-                result = await asyncio.to_thread(
-                    ml_service.summarize_text,
-                    task['config'].get('text', '')
-                )            
-            elif task['type'] == 'classification':
-                result = await asyncio.to_thread(
-                   ml_service.classify_image,
-                   task['config'].get('image_url', '')
-               )
-            
-            execution.logs.append({
-                'task_id': task['id'],
-                'message': f"Task completed: {result}",
-                'timestamp': timezone.now().isoformat(),
-                'level': 'info'
-            })
-            await execution.save()
-        
-        workflow.status = 'completed'
-        execution.status = 'completed'
-        
+        # Status-only saves leave updated_at alone so the plan stays cached.
+        await workflow.asave(update_fields=['status'])
+        if execution.status != 'running':
+            execution.status = 'running'
+            await execution.asave()
+
+        async def log_event(node_id, status, duration, result=None, error=None, progress=None):
+            data = {'status': status}
+            if status == 'running':
+                message, level = "Task started", 'info'
+            elif status == 'completed':
+                message, level = f"Task completed: {result}", 'info'
+            elif status == 'reused':
+                message, level = f"Task reused from an earlier run: {result}", 'info'
+            elif status == 'failed':
+                message, level = f"Task failed: {error}", 'error'
+            elif status == 'progress':
+                message, level = (
+                    f"Task progress: {progress['stage']} of {progress['chunks']} chunks"
+                ), 'info'
+                data.update(progress)
+            else:
+                message, level = "Task skipped: an upstream task failed", 'warning'
+            if duration is not None:
+                data['duration'] = round(duration, 3)
+            await events.aappend(message, level=level, task_id=node_id, **data)
+
+        if incremental is None:
+            incremental = settings.WORKFLOW_INCREMENTAL['ENABLED']
+        # The ML stack is imported by whoever runs a workflow (job workers),
+        # not by everything that only queues one (the API's URL conf).
+        from apps.ml.services import MLService
+        executor = DagExecutor(
+            plan,
+            MLService(),
+            concurrency=settings.WORKFLOW_MAX_CONCURRENCY,
+            on_event=log_event,
+            store=NodeResultStore(execution, reuse=incremental),
+            scheduler=scheduler,
+        )
+        with sampled_profile(execution.id) as profile_path:
+            await executor.run()
+        execution.stats = {
+            'executed': sorted(executor.durations),
+            'reused': sorted(executor.reused),
+            'time_saved': round(sum(executor.reused.values()), 3),
+        }
+        if profile_path is not None:
+            execution.stats['profile'] = str(profile_path)
+
+        if executor.errors:
+            workflow.status = 'failed'
+            execution.status = 'failed'
+        else:
+            workflow.status = 'completed'
+            execution.status = 'completed'
+
     except Exception as e:
         workflow.status = 'failed'
         execution.status = 'failed'
-        execution.logs.append({
-            'message': str(e),
-            'timestamp': timezone.now().isoformat(),
-            'level': 'error'
-        })
+        await events.aappend(str(e), level='error')
     finally:
-        workflow.save()
+        await events.aflush()
+        await workflow.asave(update_fields=['status'])
         execution.completed_at = timezone.now()
-        execution.save()
-        
-    return str(execution.id)
\ No newline at end of file
+        await execution.asave()
+        RUN_SECONDS.observe(time.perf_counter() - started, status=execution.status)
+
+    return str(execution.id)
@@ -0,0 +1,95 @@
+import asyncio
+import csv
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import TransactionTestCase, override_settings
+
+from apps.workflows.models import Workflow
+from .batch import BatchRunner, create_batch_run, prepare
+from .models import BatchRun
+
+RECORDS = 12
+MALFORMED = 4
+
+
+class Crash(BaseException):
+    # Stands in for the process dying: nothing in the runner catches it.
+    pass
+
+
+class FakeService:
+    def __init__(self, crash_on=None):
+        self.crash_on = crash_on
+        self.seen = []
+
+    async def summarize_text(self, config, on_progress=None):
+        text = config['input_text']
+        self.seen.append(text)
+        if text == self.crash_on:
+            raise Crash()
+        await asyncio.sleep(0.001 * (len(self.seen) % 3))
+        return text.upper()
+
+
+def write_input(directory, fmt):
+    path = Path(directory) / f'input.{fmt}'
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.writer(f)
+            writer.writerow(['id', 'text'])
+            for i in range(RECORDS):
+                # The malformed row is missing its text column.
+                writer.writerow([i] if i == MALFORMED else [i, f'record {i}'])
+        else:
+            for i in range(RECORDS):
+                f.write('{"id": 4, "text": \n' if i == MALFORMED else
+                        json.dumps({'id': i, 'text': f'record {i}'}) + '\n')
+    return path
+
+
+@override_settings(BATCH_RUNS={**settings.BATCH_RUNS, 'CHECKPOINT_EVERY': 3, 'CHECKPOINT_INTERVAL': 60})
+class BatchResumeTests(TransactionTestCase):
+    # The runner checkpoints through the async ORM from another thread, so
+    # its writes have to be committed for this test to see them.
+    def setUp(self):
+        self.workflow = Workflow.objects.create(
+            name='batch', tasks=[{'id': 's', 'type': 'summarization', 'config': {}}],
+        )
+        self.bindings = {'s.input_text': 'text'}
+
+    def run_batch(self, batch, service):
+        plan, bindings = prepare(self.workflow, self.bindings)
+        asyncio.run(BatchRunner(batch, plan, bindings, service=service, concurrency=2).run())
+
+    def test_resume_after_a_crash_writes_every_record_once(self):
+        for fmt in ('csv', 'jsonl'):
+            with self.subTest(fmt=fmt), tempfile.TemporaryDirectory() as directory:
+                batch = create_batch_run(
+                    self.workflow, self.bindings, write_input(directory, fmt),
+                    output_path=Path(directory) / 'results.jsonl',
+                )
+                with self.assertRaises(Crash):
+                    self.run_batch(batch, FakeService(crash_on='record 8'))
+
+                batch = BatchRun.objects.get(id=batch.id)
+                self.assertGreater(batch.checkpoint, 0)
+                self.assertLess(batch.checkpoint, RECORDS)
+                self.run_batch(batch, FakeService())
+
+                with open(batch.output_path, encoding='utf-8') as f:
+                    rows = [json.loads(line) for line in f]
+                self.assertEqual([row['index'] for row in rows], list(range(RECORDS)))
+                for row in rows:
+                    if row['index'] == MALFORMED:
+                        self.assertEqual(row['status'], 'failed')
+                        self.assertIn('input', row['errors'])
+                    else:
+                        self.assertEqual(row['status'], 'completed')
+                        self.assertEqual(row['outputs'], {'s': f"RECORD {row['index']}"})
+
+                batch.refresh_from_db()
+                self.assertEqual(batch.checkpoint, RECORDS)
+                self.assertEqual((batch.succeeded, batch.failed), (RECORDS - 1, 1))
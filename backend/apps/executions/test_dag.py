@@ -0,0 +1,169 @@
+import asyncio
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from .dag import DagExecutor, Node, WorkflowGraphError, topological_order
+from .plan import compile_plan
+
+SCRAPE = {'url': 'http://example.com', 'selectors': ['p']}
+EMAIL = {'recipient': 'a@example.com', 'subject': 'Report'}
+
+
+def plan(tasks, connections):
+    workflow = SimpleNamespace(id='wf', tasks=tasks, connections=connections)
+    return compile_plan(workflow)
+
+
+def chain_plan():
+    # a (scraping) -> b (summarization) -> c (email), plus d (scraping) -> e (email).
+    return plan(
+        [
+            {'id': 'a', 'type': 'scraping', 'config': SCRAPE},
+            {'id': 'b', 'type': 'summarization', 'config': {}},
+            {'id': 'c', 'type': 'email', 'config': EMAIL},
+            {'id': 'd', 'type': 'scraping', 'config': SCRAPE},
+            {'id': 'e', 'type': 'email', 'config': EMAIL},
+        ],
+        [
+            {'source': 'a', 'target': 'b'},
+            {'source': 'b', 'target': 'c'},
+            {'source': 'd', 'target': 'e'},
+        ],
+    )
+
+
+class FakeService:
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.configs = {}
+
+    async def _run(self, kind, config):
+        self.configs[kind] = config
+        await asyncio.sleep(0)
+        if kind in self.fail:
+            raise RuntimeError(f'{kind} failed')
+        return f'{kind} output'
+
+    async def scrape_web(self, config):
+        return {'p': [await self._run('scrape', config)]}
+
+    async def summarize_text(self, config, on_progress=None):
+        if on_progress is not None:
+            await on_progress({'stage': 'map', 'depth': 0, 'chunks': 2, 'summaries': ['x', 'y']})
+        return await self._run('summarize', config)
+
+    async def send_email(self, config):
+        return await self._run('email', config)
+
+
+class DagExecutorTests(SimpleTestCase):
+    def run_plan(self, executor):
+        return asyncio.run(executor.run())
+
+    def test_nodes_run_after_their_upstream_with_its_output(self):
+        service = FakeService()
+        events = []
+
+        async def on_event(node_id, status, duration, **details):
+            events.append((node_id, status))
+
+        executor = DagExecutor(chain_plan(), service, on_event=on_event)
+        results = self.run_plan(executor)
+        self.assertEqual(set(results), {'a', 'b', 'c', 'd', 'e'})
+        for upstream, downstream in (('a', 'b'), ('b', 'c'), ('d', 'e')):
+            self.assertLess(
+                events.index((upstream, 'completed')), events.index((downstream, 'running'))
+            )
+        self.assertEqual(service.configs['summarize']['input_text'], 'scrape output')
+
+    def test_failure_skips_downstream_only(self):
+        service = FakeService(fail={'summarize'})
+        executor = DagExecutor(chain_plan(), service)
+        results = self.run_plan(executor)
+        self.assertEqual(set(executor.errors), {'b'})
+        self.assertEqual(executor.skipped, {'c'})
+        self.assertEqual(set(results), {'a', 'd', 'e'})
+
+    def test_error_outside_the_task_call_fails_the_node(self):
+        class BrokenStore:
+            async def lookup(self, step, config):
+                if step.id == 'a':
+                    raise OSError('store unavailable')
+                return None
+
+            async def save(self, step, config, result, duration):
+                pass
+
+        executor = DagExecutor(chain_plan(), FakeService(), store=BrokenStore())
+        results = self.run_plan(executor)
+        self.assertIsInstance(executor.errors['a'], OSError)
+        self.assertEqual(executor.skipped, {'b', 'c'})
+        self.assertEqual(set(results), {'d', 'e'})
+
+    def test_cancelling_the_run_cancels_running_nodes(self):
+        started, cancelled = asyncio.Event(), []
+
+        class SlowService(FakeService):
+            async def scrape_web(self, config):
+                started.set()
+                try:
+                    await asyncio.sleep(60)
+                except asyncio.CancelledError:
+                    cancelled.append(config['url'])
+                    raise
+
+        async def main():
+            run = asyncio.create_task(DagExecutor(chain_plan(), SlowService()).run())
+            await started.wait()
+            run.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await run
+            # Before asyncio.run() tears down whatever is left.
+            self.assertEqual(len(cancelled), 2)
+
+        asyncio.run(main())
+
+    def test_cycle_raises(self):
+        nodes = {
+            'a': Node('a', 'scraping', {}, upstream=['b'], downstream=['b']),
+            'b': Node('b', 'summarization', {}, upstream=['a'], downstream=['a']),
+        }
+        with self.assertRaises(WorkflowGraphError):
+            topological_order(nodes)
+
+    def test_invalid_connection_raises(self):
+        with self.assertRaises(WorkflowGraphError):
+            plan(
+                [
+                    {'id': 'a', 'type': 'email', 'config': EMAIL},
+                    {'id': 'b', 'type': 'scraping', 'config': SCRAPE},
+                ],
+                [{'source': 'a', 'target': 'b'}],
+            )
+
+    def test_progress_is_emitted_as_an_event(self):
+        events = []
+
+        async def on_event(node_id, status, duration, **details):
+            events.append((node_id, status, details))
+
+        self.run_plan(DagExecutor(chain_plan(), FakeService(), on_event=on_event))
+        statuses = [status for node_id, status, _ in events if node_id == 'b']
+        self.assertEqual(statuses, ['running', 'progress', 'completed'])
+        progress = next(details for _, status, details in events if status == 'progress')
+        self.assertEqual(progress['progress']['summaries'], ['x', 'y'])
+
+    def test_malformed_graph_raises(self):
+        graphs = [
+            ([{'type': 'scraping', 'config': SCRAPE}], []),
+            (['a'], []),
+            ([{'id': 'a', 'type': ['scraping']}], []),
+            ([{'id': 'a', 'type': 'scraping', 'config': SCRAPE}], ['a->b']),
+            ([{'id': 'a', 'type': 'scraping', 'config': SCRAPE}], [{'source': 'a'}]),
+            ({'a': {}}, []),
+        ]
+        for tasks, connections in graphs:
+            with self.subTest(tasks=tasks, connections=connections):
+                with self.assertRaises(WorkflowGraphError):
+                    plan(tasks, connections)
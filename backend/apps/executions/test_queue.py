@@ -0,0 +1,78 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import queue
+from .models import Job
+
+
+def expire(job):
+    Job.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        queue._next_sweep = 0.0
+
+    def test_claims_by_priority_then_age_within_lanes(self):
+        low = queue.enqueue('noop', priority=0)
+        high = queue.enqueue('noop', priority=5)
+        other_lane = queue.enqueue('noop', lane='io', priority=10)
+
+        job = queue.claim('w1', ['default'])
+        self.assertEqual(job.id, high.id)
+        self.assertEqual((job.status, job.lease_owner, job.attempts), ('running', 'w1', 1))
+        self.assertEqual(queue.claim('w2', ['default']).id, low.id)
+        self.assertIsNone(queue.claim('w3', ['default']))
+        self.assertEqual(queue.claim('w3', ['io']).id, other_lane.id)
+
+    @override_settings(JOB_QUEUE={**queue.settings.JOB_QUEUE, 'RETRY_BACKOFF': 60})
+    def test_failure_retries_with_backoff_then_fails(self):
+        queue.enqueue('noop', max_attempts=2)
+        job = queue.claim('w', ['default'])
+        queue.fail(job, 'boom')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), ('queued', 'boom'))
+        self.assertGreater(job.available_at, timezone.now() + timedelta(seconds=30))
+        self.assertIsNone(queue.claim('w', ['default']))
+
+        Job.objects.filter(id=job.id).update(available_at=timezone.now())
+        job = queue.claim('w', ['default'])
+        self.assertEqual(job.attempts, 2)
+        queue.fail(job, 'boom again')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    def test_expired_lease_is_reclaimed_and_stale_owner_loses_it(self):
+        queue.enqueue('noop')
+        first = queue.claim('w1', ['default'])
+        self.assertEqual(queue.renew_lease(first), 1)
+        self.assertIsNone(queue.claim('w2', ['default']))
+
+        expire(first)
+        second = queue.claim('w2', ['default'])
+        self.assertEqual((second.id, second.attempts), (first.id, 2))
+        self.assertEqual(queue.renew_lease(first), 0)
+        queue.complete(first, {'stale': True})
+        queue.complete(second, {'ok': True})
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.result), ('done', {'ok': True}))
+
+    def test_expired_job_without_attempts_left_is_failed(self):
+        queue.enqueue('noop', max_attempts=1)
+        job = queue.claim('w1', ['default'])
+        expire(job)
+        queue._next_sweep = 0.0
+        self.assertIsNone(queue.claim('w2', ['default']))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('Lease expired', job.error)
+
+    def test_run_job_runs_async_handlers(self):
+        @queue.register('test-async')
+        async def handler(value):
+            return value * 2
+
+        job = queue.enqueue('test-async', {'value': 21})
+        self.assertEqual(queue.run_job(job), 42)
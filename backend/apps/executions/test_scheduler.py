@@ -0,0 +1,163 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from .scheduler import Overloaded, TaskScheduler, TokenBucket
+
+
+class TaskSchedulerTests(SimpleTestCase):
+    def test_limit_caps_running_tasks(self):
+        scheduler = TaskScheduler({'scraping': 2})
+        running, peak = 0, 0
+
+        async def task():
+            nonlocal running, peak
+            async with scheduler.slot('scraping'):
+                running += 1
+                peak = max(peak, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        async def main():
+            await asyncio.gather(*(task() for _ in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(peak, 2)
+        self.assertEqual(scheduler.stats()['scraping']['active'], 0)
+        self.assertEqual(scheduler.stats()['scraping']['queued'], 0)
+
+    def test_unlimited_task_types_pass_through(self):
+        scheduler = TaskScheduler({})
+
+        async def main():
+            async with scheduler.slot('email'):
+                return True
+
+        self.assertTrue(asyncio.run(main()))
+
+    def test_waiting_keys_are_served_round_robin(self):
+        scheduler = TaskScheduler({'summarization': 1})
+        order = []
+
+        async def task(name, key):
+            async with scheduler.slot('summarization', key=key):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async def main():
+            release = asyncio.Event()
+
+            async def holder():
+                async with scheduler.slot('summarization', key='a'):
+                    await release.wait()
+
+            held = asyncio.create_task(holder())
+            await asyncio.sleep(0)
+            tasks = [asyncio.create_task(task(f'a{i}', 'a')) for i in range(3)]
+            tasks += [asyncio.create_task(task(f'b{i}', 'b')) for i in range(2)]
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.stats()['summarization']['queued'], 5)
+            release.set()
+            await asyncio.gather(held, *tasks)
+
+        asyncio.run(main())
+        self.assertEqual(order, ['a0', 'b0', 'a1', 'b1', 'a2'])
+
+    def test_slot_freed_on_one_loop_wakes_a_waiter_on_another(self):
+        scheduler = TaskScheduler({'classification': 1})
+        acquired, release, done = threading.Event(), threading.Event(), []
+
+        async def hold():
+            async with scheduler.slot('classification', key='a'):
+                acquired.set()
+                await asyncio.get_running_loop().run_in_executor(None, release.wait)
+
+        async def wait():
+            async with scheduler.slot('classification', key='b'):
+                done.append('b')
+
+        holder = threading.Thread(target=asyncio.run, args=(hold(),))
+        holder.start()
+        acquired.wait(5)
+        waiter = threading.Thread(target=asyncio.run, args=(wait(),))
+        waiter.start()
+        for _ in range(100):
+            if scheduler.stats()['classification']['queued']:
+                break
+            time.sleep(0.01)
+        self.assertEqual(done, [])
+        release.set()
+        holder.join(5)
+        waiter.join(5)
+        self.assertEqual(done, ['b'])
+
+    def test_cancelled_waiter_leaves_the_queue(self):
+        scheduler = TaskScheduler({'scraping': 1})
+
+        async def main():
+            async with scheduler.slot('scraping'):
+                waiter = asyncio.create_task(scheduler.slot('scraping').__aenter__())
+                await asyncio.sleep(0)
+                self.assertEqual(scheduler.stats()['scraping']['queued'], 1)
+                waiter.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await waiter
+                self.assertEqual(scheduler.stats()['scraping']['queued'], 0)
+
+        asyncio.run(main())
+        self.assertEqual(scheduler.stats()['scraping']['active'], 0)
+
+    def test_reject_raises_overloaded_with_retry_after(self):
+        scheduler = TaskScheduler({'summarization': 1}, max_queue=1)
+
+        async def main():
+            release = asyncio.Event()
+
+            async def hold(key):
+                async with scheduler.slot('summarization', key=key):
+                    await release.wait()
+
+            tasks = [asyncio.create_task(hold(key)) for key in ('a', 'b')]
+            await asyncio.sleep(0)
+            with self.assertRaises(Overloaded) as caught:
+                async with scheduler.slot('summarization', key='c', reject=True):
+                    pass
+            release.set()
+            await asyncio.gather(*tasks)
+            return caught.exception
+
+        error = asyncio.run(main())
+        self.assertEqual(error.task_type, 'summarization')
+        # No hold time measured yet: one second per queued task plus one.
+        self.assertEqual(error.retry_after, 2.0)
+
+    def test_token_bucket_delays_past_the_burst(self):
+        bucket = TokenBucket(rate=10, burst=2)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.01)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.01)
+
+
+class ExecuteTaskOverloadTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create(username='caller'))
+
+    def test_full_queue_answers_429_with_retry_after(self):
+        scheduler = TaskScheduler({'scraping': 1}, max_queue=0)
+        lane = scheduler._lanes['scraping']
+        lane.active, lane.hold_time = 1, 2.4
+        with mock.patch('apps.workflows.views.scheduler', scheduler):
+            response = self.client.post(
+                '/api/workflows/execute-task/',
+                {'nodeId': 'n1', 'type': 'scraping',
+                 'config': {'url': 'http://example.com', 'selectors': ['p']}},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(response.json()['retry_after'], 2.4)
@@ -0,0 +1,113 @@
+import os
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from rest_framework import viewsets
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from .batch import working_path
+from .models import BatchRun, WorkflowExecution
+from .serializers import (
+    BatchRunSerializer, WorkflowExecutionSerializer, WorkflowExecutionListSerializer,
+    ExecutionEventSerializer,
+)
+from apps.workflows.pagination import ExecutionCursorPagination
+from apps.workflows.serializers import requested_fields
+from .streaming import stream_execution
+from .tasks import enqueue_batch
+
+
+class ExecutionEventPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'limit'
+    max_page_size = 1000
+
+
+class WorkflowExecutionViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = WorkflowExecution.objects.select_related('workflow')
+    serializer_class = WorkflowExecutionSerializer
+    filterset_fields = ['status', 'workflow']
+    pagination_class = ExecutionCursorPagination
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return WorkflowExecutionListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        requested = requested_fields(self.request)
+        wants_logs = (
+            'logs' in requested if requested
+            else self.action == 'retrieve'
+        )
+        if wants_logs:
+            queryset = queryset.prefetch_related('events')
+        else:
+            queryset = queryset.defer('logs')
+        return queryset
+
+    @action(detail=True, methods=['get'])
+    def events(self, request, pk=None):
+        execution = self.get_object()
+        queryset = execution.events.all()
+        level = request.query_params.get('level')
+        if level:
+            queryset = queryset.filter(level=level)
+        paginator = ExecutionEventPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = ExecutionEventSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class BatchRunViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = BatchRun.objects.all()
+    serializer_class = BatchRunSerializer
+    filterset_fields = ['status', 'workflow']
+
+    @action(detail=True, methods=['get'])
+    def output(self, request, pk=None):
+        # While the run is going this is the JSON Lines written so far.
+        batch = self.get_object()
+        path = batch.output_path if batch.status == 'completed' else working_path(batch)
+        if not os.path.exists(path):
+            return Response({'error': 'No output yet'}, status=404)
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=os.path.basename(path))
+
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        batch = self.get_object()
+        if batch.status != 'failed':
+            return Response({'error': f'Batch run is {batch.status}'}, status=409)
+        batch.status = 'queued'
+        batch.save(update_fields=['status', 'updated_at'])
+        job = enqueue_batch(batch)
+        return Response({'batch_id': batch.id, 'job_id': job.id, 'status': 'queued'}, status=202)
+
+
+async def execution_stream(request, pk):
+    """Server-Sent Events feed of an execution's progress.
+
+    Sends one small event per node transition (started, completed, failed,
+    skipped) and an `end` event once the run finishes. Reconnecting clients
+    resume from the Last-Event-ID header (or ?after=<event id>).
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=403)
+    if not await WorkflowExecution.objects.filter(id=pk).aexists():
+        return HttpResponse(status=404)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('after') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        return HttpResponse('Invalid event id', status=400)
+
+    response = StreamingHttpResponse(
+        stream_execution(pk, last_event_id), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
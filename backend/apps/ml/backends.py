@@ -0,0 +1,137 @@
+# transformers and torch are imported inside the builders: importing this
+# module (every web and job worker does, via the registry) must stay cheap.
+import re
+from pathlib import Path
+
+from django.conf import settings
+
+
+class BackendUnavailable(Exception):
+    pass
+
+
+def artifact_dir(spec, backend):
+    return Path(settings.ML_ARTIFACTS_DIR) / re.sub(r'[^\w.-]', '__', spec.model) / backend
+
+
+def _build_eager(spec, export=False):
+    from transformers import pipeline
+
+    return pipeline(spec.task, model=spec.model, **spec.kwargs)
+
+
+def _build_int8(spec, export=False):
+    import torch
+    from transformers import pipeline
+
+    path = artifact_dir(spec, 'int8') / 'model.pt'
+    pipe = pipeline(spec.task, model=spec.model, **spec.kwargs)
+    if path.exists() and not export:
+        pipe.model = torch.load(path, weights_only=False)
+    else:
+        # Dynamic quantization stores Linear weights as int8 and quantizes
+        # activations on the fly; it needs no calibration data and speeds up
+        # the matmul-heavy transformer layers on CPU.
+        pipe.model = torch.ao.quantization.quantize_dynamic(
+            pipe.model, {torch.nn.Linear}, dtype=torch.qint8
+        )
+        if export:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            torch.save(pipe.model, path)
+    pipe.model.eval()
+    return pipe
+
+
+ORT_MODEL_CLASSES = {
+    'summarization': 'ORTModelForSeq2SeqLM',
+    'image-classification': 'ORTModelForImageClassification',
+}
+
+
+def _build_onnx(spec, export=False):
+    try:
+        import optimum.onnxruntime as ort
+    except ImportError:
+        raise BackendUnavailable("The onnx backend needs `pip install optimum[onnxruntime]`")
+    from transformers import AutoImageProcessor, AutoTokenizer, pipeline
+
+    model_class = getattr(ort, ORT_MODEL_CLASSES[spec.task])
+    path = artifact_dir(spec, 'onnx')
+    if export or not (path / 'config.json').exists():
+        model = model_class.from_pretrained(spec.model, export=True)
+        model.save_pretrained(path)
+    else:
+        model = model_class.from_pretrained(path)
+
+    if spec.task == 'summarization':
+        preprocessor = {'tokenizer': AutoTokenizer.from_pretrained(spec.model)}
+    else:
+        preprocessor = {'image_processor': AutoImageProcessor.from_pretrained(spec.model)}
+    return pipeline(spec.task, model=model, **preprocessor, **spec.kwargs)
+
+
+class _TracedClassifier:
+    # Makes a traced ViT look like the HF model the pipeline expects.
+    def __init__(self, traced, original):
+        self.traced = traced
+        self.config = original.config
+        self.device = original.device
+        self.dtype = original.dtype
+        self.framework = 'pt'
+
+    def __call__(self, pixel_values=None, **kwargs):
+        from transformers.modeling_outputs import ImageClassifierOutput
+        return ImageClassifierOutput(logits=self.traced(pixel_values))
+
+    def eval(self):
+        return self
+
+    def to(self, *args, **kwargs):
+        return self
+
+
+def _build_torchscript(spec, export=False):
+    import torch
+    from transformers import pipeline
+
+    if spec.task != 'image-classification':
+        # Autoregressive generate() can't run from a traced graph.
+        raise BackendUnavailable("The torchscript backend only supports image classification")
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, pixel_values):
+            return self.model(pixel_values=pixel_values, return_dict=False)[0]
+
+    pipe = pipeline(spec.task, model=spec.model, **spec.kwargs)
+    path = artifact_dir(spec, 'torchscript') / 'model.pt'
+    if path.exists() and not export:
+        traced = torch.jit.load(path)
+    else:
+        size = pipe.image_processor.size
+        example = torch.zeros(1, 3, size['height'], size['width'])
+        with torch.no_grad():
+            traced = torch.jit.trace(LogitsOnly(pipe.model.eval()), example)
+        traced = torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+        if export:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            torch.jit.save(traced, path)
+    pipe.model = _TracedClassifier(traced, pipe.model)
+    return pipe
+
+
+BACKENDS = {
+    'eager': _build_eager,
+    'int8': _build_int8,
+    'onnx': _build_onnx,
+    'torchscript': _build_torchscript,
+}
+
+
+def build_pipeline(spec, backend='eager', export=False):
+    if backend not in BACKENDS:
+        raise BackendUnavailable(f"Unknown inference backend: {backend}")
+    return BACKENDS[backend](spec, export=export)
@@ -0,0 +1,179 @@
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from core.metrics import metrics
+from .images import classify_pixels
+from .registry import registry
+
+BATCH_SIZE = metrics.histogram(
+    'ml_batch_size', 'Inputs per batched model call', ['batcher'],
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+BATCH_SECONDS = metrics.histogram(
+    'ml_batch_duration_seconds', 'Batched model call time (in the worker pool if enabled)', ['batcher']
+)
+BATCH_WAIT_SECONDS = metrics.histogram(
+    'ml_batch_wait_seconds', 'Time the oldest input of a batch waited for it to run', ['batcher']
+)
+
+
+class _Pending:
+    def __init__(self, deadline):
+        self.created = time.monotonic()
+        self.deadline = deadline
+        self.items = []
+        self.futures = []
+
+
+class InferenceBatcher:
+    """Coalesces concurrent single-input calls into batched model calls.
+
+    Callers submit one input together with a batch key (the model config,
+    e.g. ``(max_length, min_length)``). Inputs sharing a key are queued until
+    ``max_batch_size`` is reached or the oldest one has waited ``max_latency``
+    seconds, then ``run_batch(key, inputs)`` is called once and must return
+    one result per input, in order. ``workers`` threads run batches, so
+    with an inference process pool several batches can be in flight.
+    """
+
+    def __init__(self, run_batch, max_batch_size=8, max_latency=0.01, name='batcher', workers=1):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.name = name
+        self.workers = workers
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._threads = []
+
+    def submit(self, key, item):
+        future = Future()
+        with self._cond:
+            pending = self._pending.get(key)
+            if pending is None:
+                pending = _Pending(time.monotonic() + self.max_latency)
+                self._pending[key] = pending
+            pending.items.append(item)
+            pending.futures.append(future)
+            self._ensure_worker()
+            self._cond.notify()
+        return future
+
+    def __call__(self, key, item):
+        return self.submit(key, item).result()
+
+    async def asubmit(self, key, item):
+        return await asyncio.wrap_future(self.submit(key, item))
+
+    def _ensure_worker(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._loop, name=f'ml-{self.name}-{len(self._threads)}', daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def _next_ready(self):
+        # Called with the condition held. Returns a full or expired batch, or
+        # how long to wait until the earliest deadline.
+        now = time.monotonic()
+        earliest = None
+        for key, pending in self._pending.items():
+            if len(pending.items) >= self.max_batch_size or pending.deadline <= now:
+                return key, None
+            if earliest is None or pending.deadline < earliest:
+                earliest = pending.deadline
+        return None, (earliest - now if earliest is not None else None)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                key, timeout = self._next_ready()
+                while key is None:
+                    self._cond.wait(timeout)
+                    key, timeout = self._next_ready()
+                pending = self._pending[key]
+                items = pending.items[:self.max_batch_size]
+                futures = pending.futures[:self.max_batch_size]
+                del pending.items[:self.max_batch_size]
+                del pending.futures[:self.max_batch_size]
+                if not pending.items:
+                    del self._pending[key]
+            BATCH_WAIT_SECONDS.observe(time.monotonic() - pending.created, batcher=self.name)
+            self._run(key, items, futures)
+
+    def _run(self, key, items, futures):
+        BATCH_SIZE.observe(len(items), batcher=self.name)
+        try:
+            with BATCH_SECONDS.time(batcher=self.name):
+                results = self.run_batch(key, items)
+            if len(results) != len(items):
+                raise RuntimeError(
+                    f"{self.name} returned {len(results)} results for {len(items)} inputs"
+                )
+        except Exception as e:
+            if len(items) == 1:
+                futures[0].set_exception(e)
+                return
+            # One bad input (or a batch too big for memory) must not fail
+            # every request that shared the batch: retry each on its own.
+            for item, future in zip(items, futures):
+                self._run(key, [item], [future])
+            return
+        for future, result in zip(futures, results):
+            future.set_result(result)
+
+
+def summarize_kwargs(max_length, min_length):
+    # Shared by the batched and direct paths so they summarize alike.
+    return {'max_length': max_length, 'min_length': min_length, 'truncation': True}
+
+
+def _summarize_batch(key, texts):
+    outputs = registry.get('summarization')(
+        texts, batch_size=len(texts), **summarize_kwargs(*key)
+    )
+    return [output['summary_text'] for output in outputs]
+
+
+def _classify_batch(key, pixel_values):
+    # Inputs are arrays already decoded and normalized by the image
+    # ingestor, so the batch goes straight to the model.
+    (top_k,) = key
+    return classify_pixels(registry.get('classification'), pixel_values, top_k)
+
+
+BATCH_FUNCTIONS = {
+    'summarization': _summarize_batch,
+    'classification': _classify_batch,
+}
+
+
+def _batch_runner(task):
+    # With the worker pool enabled, batches run in the worker processes
+    # (which call BATCH_FUNCTIONS themselves) instead of this one.
+    if settings.ML_WORKER_POOL['ENABLED']:
+        from .workers import inference_pool
+        return functools.partial(inference_pool.run, task), inference_pool.size
+    return BATCH_FUNCTIONS[task], 1
+
+
+def _make_batcher(task):
+    run_batch, workers = _batch_runner(task)
+    return InferenceBatcher(
+        run_batch,
+        max_batch_size=settings.ML_BATCH_MAX_SIZE,
+        max_latency=settings.ML_BATCH_MAX_LATENCY,
+        name=f'{task}-batcher',
+        workers=workers,
+    )
+
+
+summarization_batcher = _make_batcher('summarization')
+classification_batcher = _make_batcher('classification')
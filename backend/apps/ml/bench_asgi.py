@@ -0,0 +1,157 @@
+# bench_asgi.py
+#
+# Measures the async execute_task endpoint under ASGI: serves core.asgi with
+# uvicorn in a subprocess and fires scraping requests at it (each against a
+# local page server that answers after --latency seconds) at several client
+# concurrency levels, reporting requests/s and latency percentiles. With a
+# truly async request path throughput grows with concurrency until the
+# scheduler's scraping limits kick in. Needs uvicorn and a migrated
+# database. Run from the backend directory:
+#
+#   python -m apps.ml.bench_asgi --concurrency 1,10,50 --requests 300 --latency 0.1
+import argparse
+import asyncio
+import itertools
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+import httpx
+
+# The bench measures the request path, not the scraping rate limits or the
+# per-host politeness cap (every page comes from one local host).
+os.environ.setdefault('SCHEDULER_SCRAPING_LIMIT', '1000')
+os.environ.setdefault('SCHEDULER_SCRAPING_RATE', '100000')
+os.environ.setdefault('SCHEDULER_SCRAPING_BURST', '100000')
+os.environ.setdefault('SCHEDULER_MAX_QUEUE', '100000')
+os.environ.setdefault('SCRAPER_MAX_CONNECTIONS_PER_HOST', '1000')
+os.environ.setdefault('SCRAPER_MAX_CONNECTIONS', '1000')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.utils.crypto import get_random_string
+
+from apps.ml.bench_scraping import SELECTORS, start_server
+
+
+def login():
+    user, _ = get_user_model().objects.get_or_create(username='bench-asgi')
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = 'django.contrib.auth.backends.ModelBackend'
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    csrf = get_random_string(32)
+    cookies = {settings.SESSION_COOKIE_NAME: session.session_key, settings.CSRF_COOKIE_NAME: csrf}
+    return cookies, {'X-CSRFToken': csrf}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_uvicorn(port):
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'core.asgi:application',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=os.environ.copy(),
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit('uvicorn exited; is it installed (pip install uvicorn)?')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit('uvicorn did not start')
+
+
+async def run_level(base, page_base, cookies, headers, concurrency, total, counter):
+    latencies, failures = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(
+        base_url=base, cookies=cookies, headers=headers, limits=limits, timeout=60
+    ) as client:
+        queue = iter(range(total))
+
+        async def worker():
+            nonlocal failures
+            for _ in queue:
+                # A fresh URL per request so nothing is coalesced or cached.
+                payload = {
+                    'nodeId': 'bench',
+                    'type': 'scraping',
+                    'config': {'url': f'{page_base}/page/{next(counter)}', 'selectors': SELECTORS},
+                }
+                started = time.perf_counter()
+                response = await client.post('/api/workflows/execute-task/', json=payload)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p95': latencies[int(len(latencies) * 0.95) - 1],
+        'failures': failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--concurrency', default='1,10,50',
+                        help='comma-separated client concurrency levels')
+    parser.add_argument('--requests', type=int, default=300, help='requests per level')
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='simulated page server latency per request, in seconds')
+    parser.add_argument('--paragraphs', type=int, default=10,
+                        help='page size; larger pages make HTML parsing the bottleneck')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',')]
+
+    page_server = start_server(args.latency, args.paragraphs)
+    page_base = f'http://127.0.0.1:{page_server.server_address[1]}'
+    cookies, headers = login()
+    port = free_port()
+    server = start_uvicorn(port)
+    counter = itertools.count()
+    try:
+        base = f'http://127.0.0.1:{port}'
+        # Warm up (imports, first DB connection, the scraper's client).
+        asyncio.run(run_level(base, page_base, cookies, headers, 1, 3, counter))
+        print(f'page latency {args.latency * 1000:.0f}ms, {args.requests} requests per level')
+        for concurrency in levels:
+            result = asyncio.run(
+                run_level(base, page_base, cookies, headers, concurrency, args.requests, counter)
+            )
+            ideal = concurrency / args.latency
+            print(
+                f"concurrency {concurrency:>4}: {result['rps']:7.1f} req/s "
+                f"(latency-bound ideal {ideal:.0f}), "
+                f"p50 {result['p50'] * 1000:.0f}ms, p95 {result['p95'] * 1000:.0f}ms, "
+                f"{result['failures']} failed"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+        page_server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
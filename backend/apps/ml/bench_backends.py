@@ -0,0 +1,136 @@
+# bench_backends.py
+#
+# Accuracy versus speed of each inference backend, measured against the
+# eager fp32 pipeline. Export artifacts first (python manage.py export_models)
+# so load times reflect production. Run from the backend directory:
+#
+#   python -m apps.ml.bench_backends --task summarization
+#   python -m apps.ml.bench_backends --task classification --images ./sample_images
+import argparse
+import io
+import os
+import statistics
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.backends import BACKENDS, BackendUnavailable, build_pipeline
+from apps.ml.registry import MODEL_SPECS
+
+TEXTS = [
+    "The tower is 324 metres (1,063 ft) tall, about the same height as an 81-storey building, "
+    "and the tallest structure in Paris. Its base is square, measuring 125 metres (410 ft) on "
+    "each side. During its construction, the Eiffel Tower surpassed the Washington Monument to "
+    "become the tallest man-made structure in the world, a title it held for 41 years until the "
+    "Chrysler Building in New York City was finished in 1930.",
+    "The ocean is the body of salt water that covers approximately 70.8% of the Earth. The ocean "
+    "is conventionally divided into large bodies of water, which are also referred to as oceans. "
+    "It is the largest reservoir of water on Earth and holds most of the planet's heat.",
+    "Photosynthesis is a process used by plants and other organisms to convert light energy into "
+    "chemical energy that, through cellular respiration, can later be released to fuel the "
+    "organism's activities. Some of this chemical energy is stored in carbohydrate molecules.",
+]
+IMAGE_URLS = [
+    "http://images.cocodataset.org/val2017/000000039769.jpg",
+    "http://images.cocodataset.org/val2017/000000000139.jpg",
+    "http://images.cocodataset.org/val2017/000000000285.jpg",
+]
+
+
+def rouge_l(reference, candidate):
+    # ROUGE-L F1 on whitespace tokens; enough to rank backends.
+    a, b = reference.split(), candidate.split()
+    if not a or not b:
+        return 0.0
+    prev = [0] * (len(b) + 1)
+    for x in a:
+        cur = [0]
+        for j, y in enumerate(b):
+            cur.append(prev[j] + 1 if x == y else max(prev[j + 1], cur[j]))
+        prev = cur
+    lcs = prev[-1]
+    if lcs == 0:
+        return 0.0
+    precision, recall = lcs / len(b), lcs / len(a)
+    return 2 * precision * recall / (precision + recall)
+
+
+def model_bytes(model):
+    # Serialized size, since quantized weights are packed outside
+    # parameters(). ONNX sessions don't expose a state dict.
+    import torch
+    model = getattr(model, 'traced', model)
+    try:
+        buf = io.BytesIO()
+        torch.save(model.state_dict(), buf)
+    except (AttributeError, RuntimeError, TypeError):
+        return None
+    return buf.tell()
+
+
+def run(pipe, task, inputs, repeats):
+    outputs, latencies = None, []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        if task == 'summarization':
+            outputs = [o['summary_text'] for o in pipe(inputs, max_length=60, min_length=10)]
+        else:
+            outputs = pipe(inputs, top_k=5)
+        latencies.append((time.perf_counter() - started) / len(inputs))
+    return outputs, statistics.median(latencies)
+
+
+def accuracy(task, reference, outputs):
+    if task == 'summarization':
+        return "ROUGE-L vs fp32 {:.3f}".format(
+            statistics.mean(rouge_l(r, o) for r, o in zip(reference, outputs))
+        )
+    top1 = statistics.mean(r[0]['label'] == o[0]['label'] for r, o in zip(reference, outputs))
+    drift = statistics.mean(abs(r[0]['score'] - o[0]['score']) for r, o in zip(reference, outputs))
+    return f"top-1 agreement {top1:.2f}, score drift {drift:.4f}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", choices=sorted(MODEL_SPECS), default="summarization")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--images", help="directory of images to classify instead of the sample URLs")
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    spec = MODEL_SPECS[args.task]
+    if args.task == 'summarization':
+        inputs = TEXTS
+    elif args.images:
+        inputs = sorted(str(p) for p in Path(args.images).iterdir() if p.is_file())
+    else:
+        inputs = IMAGE_URLS
+
+    reference, baseline = None, None
+    for backend in ["eager"] + [b for b in args.backends.split(",") if b != "eager"]:
+        started = time.perf_counter()
+        try:
+            pipe = build_pipeline(spec, backend)
+        except BackendUnavailable as e:
+            print(f"{backend:>12}: skipped ({e})")
+            continue
+        load = time.perf_counter() - started
+        outputs, latency = run(pipe, args.task, inputs, args.repeats)
+        size = model_bytes(pipe.model)
+        if reference is None:
+            reference, baseline = outputs, latency
+        print(
+            f"{backend:>12}: load {load:6.1f}s, {latency * 1000:7.0f} ms/input "
+            f"({baseline / latency:4.2f}x), "
+            + (f"{size / 2**20:7.0f} MB weights, " if size else "")
+            + accuracy(args.task, reference, outputs)
+        )
+        del pipe
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# bench_batching.py
+#
+# Compares the per-call inference path against the micro-batching path under
+# concurrent load. The result cache and single-flight are off and every
+# request (across both passes) gets its own text or image, so each one runs
+# the model. Run from the backend directory:
+#
+#   python -m apps.ml.bench_batching --task summarization --requests 64 --concurrency 16
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.cache import LRUBackend, ResultCache
+from apps.ml.services import MLService
+from apps.ml.registry import registry
+
+TEXT = (
+    "The tower is 324 metres (1,063 ft) tall, about the same height as an 81-storey "
+    "building, and the tallest structure in Paris. Its base is square, measuring 125 "
+    "metres (410 ft) on each side. During its construction, the Eiffel Tower surpassed "
+    "the Washington Monument to become the tallest man-made structure in the world, a "
+    "title it held for 41 years until the Chrysler Building in New York City was "
+    "finished in 1930."
+)
+
+
+def start_image_server():
+    # Serves /image/<n>.png, a different solid colour for every n.
+    from PIL import Image
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            n = int(self.path.rsplit("/", 1)[-1].split(".")[0])
+            buffer = io.BytesIO()
+            color = (n % 256, (n // 256) % 256, (n * 37) % 256)
+            Image.new("RGB", (256, 256), color).save(buffer, format="PNG")
+            body = buffer.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def make_config(task, i, image_base):
+    if task == 'summarization':
+        return {"input_text": f"{TEXT} (sample {i})", "max_length": 60, "min_length": 10}
+    return {"image_url": f"{image_base}/image/{i}.png", "confidence_threshold": 0.0}
+
+
+async def run(task, batching, requests, concurrency, first, image_base):
+    # Measure model compute: no result cache hits, no coalesced calls.
+    service = MLService(batching=batching, cache=ResultCache(LRUBackend(), enabled=False))
+    service.flights = None
+    method = service.summarize_text if task == 'summarization' else service.classify_image
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        config = make_config(task, first + i, image_base)
+        async with semaphore:
+            started = time.perf_counter()
+            if batching:
+                await method(config)
+            else:
+                # The per-call path blocks, so give each request its own thread
+                # the way execute_workflow does.
+                await asyncio.to_thread(asyncio.run, method(config))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {
+        "throughput_rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": p99 * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", choices=["summarization", "classification"], default="summarization")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    registry.warm_up([args.task])
+    server = start_image_server()
+    image_base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    for index, (label, batching) in enumerate((("per-call", False), ("batched", True))):
+        # Each pass gets its own inputs.
+        stats = asyncio.run(run(
+            args.task, batching, args.requests, args.concurrency,
+            index * args.requests, image_base,
+        ))
+        print(
+            f"{label:>9}: {stats['throughput_rps']:.2f} req/s, "
+            f"p50 {stats['p50_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+# bench_email.py
+#
+# Throughput of the old per-message SMTP delivery (connect, STARTTLS/login,
+# send, quit for every email) against the pooled Mailer, both talking to the
+# local debug SMTP server. Run from the backend directory:
+#
+#   python -m apps.ml.bench_email --messages 500 --latency 0.005
+import argparse
+import asyncio
+import os
+import smtplib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.mime.text import MIMEText
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.devsmtp import DebugSMTPServer
+from apps.ml.mailer import Mailer
+
+
+def make_message(i):
+    msg = MIMEText(f"Workflow result {i}\n" + "Lorem ipsum dolor sit amet. " * 20)
+    msg["Subject"] = f"Workflow result {i}"
+    msg["To"] = f"user{i}@example.com"
+    msg["From"] = "workflows@example.com"
+    return msg
+
+
+def send_one(port, msg):
+    # What MLService.send_email used to do for every message.
+    with smtplib.SMTP("127.0.0.1", port) as server:
+        server.login("user", "password")
+        server.send_message(msg)
+
+
+def bench_per_message(port, messages, concurrency):
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(lambda msg: send_one(port, msg), messages))
+
+
+def bench_pooled(port, messages, pool_size, batch_size):
+    mailer = Mailer(
+        "127.0.0.1", port, username="user", password="password", use_tls=False,
+        pool_size=pool_size, batch_size=batch_size, max_latency=0.01,
+    )
+
+    async def send_all():
+        await asyncio.gather(*(mailer.asend(msg) for msg in messages))
+
+    asyncio.run(send_all())
+    mailer.close()
+    return mailer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="seconds the server waits before each reply")
+    parser.add_argument("--concurrency", type=int, default=4,
+                        help="parallel connections for the per-message baseline")
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=20)
+    args = parser.parse_args()
+
+    messages = [make_message(i) for i in range(args.messages)]
+    for name, run in [
+        ("per-message", lambda port: bench_per_message(port, messages, args.concurrency)),
+        ("pooled", lambda port: bench_pooled(port, messages, args.pool_size, args.batch_size)),
+    ]:
+        server = DebugSMTPServer(("127.0.0.1", 0), latency=args.latency).start()
+        started = time.perf_counter()
+        run(server.server_address[1])
+        elapsed = time.perf_counter() - started
+        delivered = len(server.messages)
+        print(
+            f"{name:>12}: {delivered} delivered in {elapsed:6.2f}s "
+            f"({delivered / elapsed:7.1f} msg/s), "
+            f"{server.counts['connections']} connections, {server.counts['logins']} logins"
+        )
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# bench_images.py
+#
+# Classification throughput over a local directory of images: the old path
+# (one pipeline call per image, which decodes and preprocesses inline)
+# against the ingestion stage (pooled decode/resize, then batched model
+# calls), plus a second pass served from the decoded-array cache.
+# --decode-only skips the model and times preprocessing alone. Run from the
+# backend directory:
+#
+#   python -m apps.ml.bench_images --images ./sample_images
+#   python -m apps.ml.bench_images --images ./sample_images --decode-only --pool process
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.images import ImageIngestor, PreprocessSpec, classify_pixels, decode_image
+
+# ViT-base defaults, used when --decode-only leaves the model unloaded.
+VIT_SPEC = PreprocessSpec(
+    height=224, width=224, mean=(0.5, 0.5, 0.5), std=(0.5, 0.5, 0.5),
+    rescale_factor=1 / 255, resample=2,
+)
+
+
+def timed(label, count, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:>28}: {elapsed:7.2f}s ({count / elapsed:7.1f} images/s)")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", required=True, help="directory of images")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--decode-only", action="store_true")
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.is_file())
+    blobs = [p.read_bytes() for p in paths]
+    ingestor = ImageIngestor(
+        workers=args.workers, pool=args.pool, array_cache_entries=len(blobs)
+    )
+    formats = ingestor.formats
+    max_pixels = ingestor.max_pixels
+
+    pipe = None
+    spec = VIT_SPEC
+    if not args.decode_only:
+        from apps.ml.registry import registry
+        pipe = registry.get("classification")
+        spec = PreprocessSpec.from_processor(pipe.image_processor)
+
+    async def ingest_all():
+        return await asyncio.gather(*(ingestor.preprocess(data, spec) for data in blobs))
+
+    def classify_batched(arrays):
+        return [
+            prediction
+            for start in range(0, len(arrays), args.batch_size)
+            for prediction in classify_pixels(pipe, arrays[start:start + args.batch_size], 5)
+        ]
+
+    print(f"{len(paths)} images, {args.pool} pool, {ingestor.workers} workers")
+    timed("serial decode", len(blobs),
+          lambda: [decode_image(data, spec, max_pixels, formats) for data in blobs])
+    arrays = timed("pooled decode", len(blobs), lambda: asyncio.run(ingest_all()))
+    timed("pooled decode (cached)", len(blobs), lambda: asyncio.run(ingest_all()))
+
+    if pipe is not None:
+        # The pipeline accepts local paths and handles loading itself.
+        reference = timed("pipeline, one at a time", len(paths),
+                          lambda: [pipe(str(p), top_k=5) for p in paths])
+        predictions = timed("ingested + batched model", len(arrays),
+                            lambda: classify_batched(arrays))
+        agreement = sum(
+            r[0]["label"] == p[0]["label"] for r, p in zip(reference, predictions)
+        ) / len(paths)
+        print(f"top-1 agreement with pipeline: {agreement:.2f}")
+    ingestor.close()
+
+
+if __name__ == "__main__":
+    main()
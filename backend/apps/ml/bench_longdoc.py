@@ -0,0 +1,108 @@
+# bench_longdoc.py
+#
+# Latency and memory of long-document summarization across input sizes,
+# compared with the single-pass path (which truncates at the model window).
+# Run from the backend directory:
+#
+#   python -m apps.ml.bench_longdoc --sizes 1000,10000,100000
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.cache import LRUBackend, ResultCache
+from apps.ml.longdoc import LongDocumentSummarizer, count_tokens
+from apps.ml.registry import _rss_bytes, registry
+from apps.ml.services import MLService
+
+PARAGRAPHS = [
+    "The tower is 324 metres (1,063 ft) tall, about the same height as an 81-storey "
+    "building, and the tallest structure in Paris. Its base is square, measuring 125 "
+    "metres (410 ft) on each side.",
+    "During its construction, the Eiffel Tower surpassed the Washington Monument to "
+    "become the tallest man-made structure in the world, a title it held for 41 years "
+    "until the Chrysler Building in New York City was finished in 1930.",
+    "Due to the addition of a broadcasting aerial at the top of the tower in 1957, it "
+    "is now taller than the Chrysler Building by 5.2 metres (17 ft). Excluding "
+    "transmitters, the Eiffel Tower is the second tallest free-standing structure in "
+    "France after the Millau Viaduct.",
+]
+
+
+def make_document(tokens, tokenizer):
+    parts = []
+    i = 0
+    per_paragraph = count_tokens(PARAGRAPHS[0], tokenizer)
+    while len(parts) * per_paragraph < tokens:
+        parts.append(f"Section {i}. " + PARAGRAPHS[i % len(PARAGRAPHS)])
+        i += 1
+    return "\n".join(parts)
+
+
+class PeakRSS:
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes() or 0)
+
+    def __enter__(self):
+        self.start = _rss_bytes() or 0
+        self.peak = self.start
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def measure(coro_factory):
+    with PeakRSS() as rss:
+        started = time.perf_counter()
+        await coro_factory()
+        elapsed = time.perf_counter() - started
+    return elapsed, (rss.peak - rss.start) / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="1000,5000,10000,50000,100000",
+                        help="comma separated document sizes in tokens")
+    parser.add_argument("--overlap", type=int, default=None)
+    parser.add_argument("--max-depth", type=int, default=None)
+    args = parser.parse_args()
+
+    registry.warm_up(["summarization"])
+    tokenizer = registry.get("summarization").tokenizer
+    # Measure model compute, not result cache hits.
+    service = MLService(cache=ResultCache(LRUBackend(), enabled=False))
+
+    print(f"{'tokens':>8} {'single (s)':>11} {'long (s)':>9} {'levels':>7} {'chunks':>7} {'peak +MB':>9}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        text = make_document(size, tokenizer)
+        summarizer = LongDocumentSummarizer(overlap=args.overlap, max_depth=args.max_depth)
+        steps = []
+
+        single, _ = asyncio.run(measure(
+            lambda: service.summarize_text({"input_text": text, "mode": "single"})
+        ))
+        long_time, peak_mb = asyncio.run(measure(
+            lambda: summarizer.summarize(text, on_progress=steps.append)
+        ))
+        chunks = steps[0]["chunks"] if steps else 1
+        print(f"{size:>8} {single:>11.2f} {long_time:>9.2f} {len(steps):>7} {chunks:>7} {peak_mb:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# bench_scraping.py
+#
+# Benchmarks the old blocking scrape (requests + html.parser, one URL at a
+# time) against the async scraper, using a local HTTP server as the target.
+# Run from the backend directory:
+#
+#   python -m apps.ml.bench_scraping --pages 200 --latency 0.05
+import argparse
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import django
+import requests
+from bs4 import BeautifulSoup
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.scraping import Scraper
+
+SELECTORS = ["h1", "p", "li a"]
+
+
+def make_page(i, paragraphs=200):
+    body = "".join(
+        f"<p>Paragraph {j} of page {i} with some <b>bold</b> text.</p>"
+        for j in range(paragraphs)
+    )
+    links = "".join(f"<li><a href='/page/{j}'>Link {j}</a></li>" for j in range(50))
+    return f"<html><body><h1>Page {i}</h1>{body}<ul>{links}</ul></body></html>".encode()
+
+
+def start_server(latency, paragraphs=200):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency)
+            body = make_page(self.path, paragraphs)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_scrape(url):
+    response = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
+    response.raise_for_status()
+    soup = BeautifulSoup(response.text, 'html.parser')
+    return {s: [e.get_text(strip=True) for e in soup.select(s)] for s in SELECTORS}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="simulated server latency per request, in seconds")
+    args = parser.parse_args()
+
+    server = start_server(args.latency)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}/page/{i}" for i in range(args.pages)]
+
+    started = time.perf_counter()
+    for url in urls:
+        legacy_scrape(url)
+    legacy = time.perf_counter() - started
+    print(f"legacy (requests + html.parser, sequential): {legacy:.2f}s")
+
+    for parser_name in ("html.parser", "lxml", "selectolax"):
+        scraper = Scraper(parser=parser_name)
+
+        async def run():
+            started = time.perf_counter()
+            await scraper.scrape_many(urls, SELECTORS)
+            cold = time.perf_counter() - started
+            # Second pass revalidates with If-None-Match and gets 304s.
+            started = time.perf_counter()
+            await scraper.scrape_many(urls, SELECTORS)
+            warm = time.perf_counter() - started
+            await scraper.aclose()
+            return cold, warm
+
+        cold, warm = asyncio.run(run())
+        print(
+            f"async ({parser_name}): cold {cold:.2f}s ({legacy / cold:.1f}x), "
+            f"conditional GET {warm:.2f}s ({legacy / warm:.1f}x)"
+        )
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
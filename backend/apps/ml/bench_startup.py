@@ -0,0 +1,114 @@
+# bench_startup.py
+#
+# Measures process startup: each scenario (loading the URL conf, the ASGI
+# application, `manage.py check`) runs several times in a fresh interpreter,
+# reporting time to ready, peak RSS and any heavy ML libraries it imported,
+# plus the slowest imports from `python -X importtime`. Exits non-zero when a
+# scenario goes over the time or memory budget or imports torch,
+# transformers, bs4 and the like, so it can guard against regressions in CI.
+# Run from the backend directory:
+#
+#   python -m apps.ml.bench_startup --runs 5 --budget-ms 1500 --budget-mb 150
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ('torch', 'transformers', 'tensorflow', 'bs4', 'lxml', 'numpy', 'PIL', 'pyarrow')
+
+SCENARIOS = {
+    'urls': 'import core.urls',
+    'asgi': 'import core.asgi',
+    'check': 'from django.core.management import call_command; call_command("check", verbosity=0)',
+}
+
+CHILD = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+{body}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": sorted({{name.split(".")[0] for name in sys.modules}}),
+}}))
+'''
+
+
+def child_env(role):
+    env = os.environ.copy()
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    env['ML_PROCESS_ROLE'] = role
+    return env
+
+
+def run_scenario(body, role):
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD.format(body=body)],
+        env=child_env(role), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(body, role, top):
+    stderr = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import django; django.setup(); {body}'],
+        env=child_env(role), capture_output=True, text=True, check=True,
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented; keep the top-level ones.
+        if name.startswith('  '):
+            continue
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--role', default='api', help='ML_PROCESS_ROLE for the measured processes')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=1500,
+                        help='median time to ready allowed per scenario')
+    parser.add_argument('--budget-mb', type=float, default=150, help='peak RSS allowed')
+    parser.add_argument('--top', type=int, default=10, help='slowest imports to list')
+    args = parser.parse_args()
+
+    failures = []
+    for name in args.scenarios.split(','):
+        body = SCENARIOS[name]
+        results = [run_scenario(body, args.role) for _ in range(args.runs)]
+        median_ms = statistics.median(r['seconds'] for r in results) * 1000
+        rss_mb = max(r['rss_kb'] for r in results) / 1024
+        heavy = sorted(set(HEAVY_MODULES) & set(results[0]['modules']))
+        print(
+            f"{name:>6}: {median_ms:6.0f}ms median "
+            f"(max {max(r['seconds'] for r in results) * 1000:.0f}ms), "
+            f"{rss_mb:.0f}MB peak RSS, heavy imports: {', '.join(heavy) or 'none'}"
+        )
+        if median_ms > args.budget_ms:
+            failures.append(f'{name} took {median_ms:.0f}ms (budget {args.budget_ms:.0f}ms)')
+        if rss_mb > args.budget_mb:
+            failures.append(f'{name} used {rss_mb:.0f}MB (budget {args.budget_mb:.0f}MB)')
+        if heavy:
+            failures.append(f"{name} imported {', '.join(heavy)}")
+
+    first = args.scenarios.split(',')[0]
+    print(f'\nslowest top-level imports ({first}):')
+    for cumulative, module in slowest_imports(SCENARIOS[first], args.role, args.top):
+        print(f'  {cumulative / 1000:7.1f}ms  {module}')
+
+    if failures:
+        print('\nover budget:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
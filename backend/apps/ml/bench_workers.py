@@ -0,0 +1,82 @@
+# bench_workers.py
+#
+# Inference throughput with concurrent callers: threads sharing the models
+# in this process (the old asyncio.to_thread path) against the multi-process
+# worker pool. Run from the backend directory:
+#
+#   python -m apps.ml.bench_workers --task summarization --requests 32 --concurrency 8
+#   python -m apps.ml.bench_workers --task classification --images ./sample_images --workers 4
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+from apps.ml.batching import BATCH_FUNCTIONS
+from apps.ml.bench_backends import TEXTS
+from apps.ml.images import PreprocessSpec, decode_image
+from apps.ml.registry import registry
+from apps.ml.workers import InferencePool
+
+
+def make_inputs(task, images, count):
+    if task == "summarization":
+        return (60, 10), [TEXTS[i % len(TEXTS)] for i in range(count)]
+    spec = PreprocessSpec.from_processor(registry.preprocessor("classification"))
+    paths = sorted(p for p in Path(images).iterdir() if p.is_file())
+    arrays = [
+        decode_image(paths[i % len(paths)].read_bytes(), spec, 10**9, {"JPEG", "PNG", "WEBP", "GIF", "BMP"})
+        for i in range(count)
+    ]
+    return (5,), arrays
+
+
+def drive(call, items, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(call, items))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--task", choices=sorted(BATCH_FUNCTIONS), default="summarization")
+    parser.add_argument("--images", help="directory of images (classification)")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--threads", type=int, default=None, help="torch threads per worker")
+    args = parser.parse_args()
+    if args.task == "classification" and not args.images:
+        parser.error("--images is required for classification")
+
+    key, items = make_inputs(args.task, args.images, args.requests)
+    run_local = BATCH_FUNCTIONS[args.task]
+
+    registry.warm_up([args.task])
+    run_local(key, items[:1])
+    elapsed = drive(lambda item: run_local(key, [item]), items, args.concurrency)
+    print(f"{'in-process threads':>20}: {elapsed:6.2f}s ({len(items) / elapsed:6.2f} req/s)")
+    registry.evict(args.task)
+
+    pool = InferencePool(workers=args.workers, threads_per_worker=args.threads)
+    pool.start()
+    # Load the model in every worker before timing.
+    futures = [pool.submit(args.task, key, items[:1]) for _ in range(pool.size)]
+    for future in futures:
+        future.result()
+    elapsed = drive(lambda item: pool.run(args.task, key, [item]), items, args.concurrency)
+    print(
+        f"{'worker pool':>20}: {elapsed:6.2f}s ({len(items) / elapsed:6.2f} req/s), "
+        f"{pool.size} workers x {pool.threads_per_worker} threads"
+    )
+    pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import hashlib
+import json
+import pickle
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.metrics import CACHE_REQUESTS
+from .executors import run_in
+
+
+def normalize_input(value):
+    if isinstance(value, str):
+        # Whitespace and unicode form don't change what the model sees in any
+        # meaningful way, so they shouldn't split the cache.
+        return " ".join(unicodedata.normalize("NFC", value).split())
+    if isinstance(value, dict):
+        return {k: normalize_input(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_input(v) for v in value]
+    return value
+
+
+def make_key(task_type, model_id, input_value, config=None):
+    payload = json.dumps(
+        {
+            "task": task_type,
+            "model": model_id,
+            "input": normalize_input(input_value),
+            "config": config or {},
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return f"ml:{task_type}:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+class LRUBackend:
+    # In-process; the other backends do I/O and run on the io executor when
+    # used from async code.
+    blocking = False
+
+    def __init__(self, max_entries=1024, **kwargs):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires = entry[1]
+            if expires is not None and expires <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, value, ttl):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    blocking = True
+    GENERATION_KEY = "ml:generation"
+
+    def __init__(self, alias="default", **kwargs):
+        self.cache = caches[alias]
+
+    def _version(self):
+        # Entries are stored under the current generation as their cache
+        # version. The cache is shared with other data (e.g. the workflow
+        # cache generations), so clear() bumps the generation rather than
+        # clearing it; old entries age out through their TTL.
+        version = self.cache.get(self.GENERATION_KEY)
+        if version is None:
+            self.cache.add(self.GENERATION_KEY, 1, timeout=None)
+            version = self.cache.get(self.GENERATION_KEY, 1)
+        return version
+
+    def get(self, key):
+        return self.cache.get(key, version=self._version())
+
+    def set(self, key, value, ttl):
+        self.cache.set(key, (value, None), timeout=ttl or None, version=self._version())
+
+    def delete(self, key):
+        self.cache.delete(key, version=self._version())
+
+    def clear(self):
+        try:
+            self.cache.incr(self.GENERATION_KEY)
+        except ValueError:
+            self.cache.add(self.GENERATION_KEY, 2, timeout=None)
+
+
+class SQLiteBackend:
+    blocking = True
+
+    def __init__(self, path=None, max_entries=100_000, **kwargs):
+        self.path = str(path or settings.BASE_DIR / "ml_cache.sqlite3")
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ml_result_cache ("
+                " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+                " expires REAL, accessed REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ml_result_cache_accessed"
+                " ON ml_result_cache (accessed)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires FROM ml_result_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        with conn:
+            if expires is not None and expires <= time.time():
+                conn.execute("DELETE FROM ml_result_cache WHERE key = ?", (key,))
+                return None
+            conn.execute(
+                "UPDATE ml_result_cache SET accessed = ? WHERE key = ?",
+                (time.time(), key),
+            )
+        return pickle.loads(value), expires
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ml_result_cache (key, value, expires, accessed)"
+                " VALUES (?, ?, ?, ?)",
+                (key, pickle.dumps(value), now + ttl if ttl else None, now),
+            )
+            conn.execute(
+                "DELETE FROM ml_result_cache WHERE key IN ("
+                " SELECT key FROM ml_result_cache ORDER BY accessed DESC"
+                " LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def delete(self, key):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM ml_result_cache WHERE key = ?", (key,))
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM ml_result_cache")
+
+
+BACKENDS = {
+    "memory": LRUBackend,
+    "django": DjangoCacheBackend,
+    "sqlite": SQLiteBackend,
+}
+
+
+class ResultCache:
+    """Content-addressed cache for ML task results.
+
+    Entries are keyed by a hash of the task type, model id, normalized input
+    and the config values that affect the output, so the same text or image
+    URL is only run through a model once per TTL.
+    """
+
+    def __init__(self, backend, ttl=3600, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        if not self.enabled:
+            return False, None
+        entry = self.backend.get(key)
+        # Keys are "ml:<task type>:<digest>".
+        cache_name = key.rsplit(":", 1)[0]
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                CACHE_REQUESTS.inc(cache=cache_name, result="miss")
+                return False, None
+            self.hits += 1
+        CACHE_REQUESTS.inc(cache=cache_name, result="hit")
+        return True, entry[0]
+
+    def set(self, key, value, ttl=None):
+        if self.enabled:
+            self.backend.set(key, value, ttl if ttl is not None else self.ttl)
+
+    async def aget_or_compute(self, key, compute):
+        blocking = self.enabled and getattr(self.backend, "blocking", True)
+        found, value = await run_in("io", self.get, key) if blocking else self.get(key)
+        if found:
+            return value
+        value = await compute()
+        if blocking:
+            await run_in("io", self.set, key, value)
+        else:
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def build_result_cache(config=None):
+    config = dict(config if config is not None else settings.ML_RESULT_CACHE)
+    backend_name = config.pop("BACKEND", "memory")
+    ttl = config.pop("TTL", 3600)
+    enabled = config.pop("ENABLED", True)
+    options = {k.lower(): v for k, v in config.items()}
+    return ResultCache(BACKENDS[backend_name](**options), ttl=ttl, enabled=enabled)
+
+
+result_cache = build_result_cache()
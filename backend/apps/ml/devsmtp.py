@@ -0,0 +1,108 @@
+import socketserver
+import threading
+import time
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    # Just enough SMTP for smtplib: EHLO/HELO, AUTH PLAIN/LOGIN (any
+    # credentials), MAIL, RCPT, DATA, RSET, NOOP and QUIT. No STARTTLS, so
+    # clients need EMAIL_USE_TLS=False.
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.server.record('connections')
+        self.reply("220 localhost debug SMTP ready")
+        mail_from, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode(errors='replace').strip().partition(' ')
+            command = command.upper()
+            if command == 'EHLO':
+                self.reply("250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+            elif command == 'HELO':
+                self.reply("250 localhost")
+            elif command == 'AUTH':
+                mechanism, _, initial = argument.partition(' ')
+                if mechanism.upper() == 'LOGIN':
+                    self.reply("334 VXNlcm5hbWU6")
+                    self.rfile.readline()
+                    self.reply("334 UGFzc3dvcmQ6")
+                    self.rfile.readline()
+                elif not initial:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                self.server.record('logins')
+                self.reply("235 Authentication successful")
+            elif command == 'MAIL':
+                mail_from, recipients = argument, []
+                self.reply("250 OK")
+            elif command == 'RCPT':
+                recipients.append(argument)
+                self.reply("250 OK")
+            elif command == 'DATA':
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data in (b".\r\n", b".\n"):
+                        break
+                    lines.append(data[1:] if data.startswith(b"..") else data)
+                self.server.deliver(mail_from, recipients, b"".join(lines))
+                mail_from, recipients = None, []
+                self.reply("250 OK: queued")
+            elif command == 'RSET':
+                mail_from, recipients = None, []
+                self.reply("250 OK")
+            elif command == 'NOOP':
+                self.reply("250 OK")
+            elif command == 'QUIT':
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class DebugSMTPServer(socketserver.ThreadingTCPServer):
+    """Local SMTP server that accepts and keeps every message.
+
+    ``latency`` delays each reply to stand in for a remote server's round
+    trips. Port 0 picks a free port; read it back from ``server_address``.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 1025), latency=0.0, on_message=None):
+        super().__init__(address, _SMTPHandler)
+        self.latency = latency
+        self.on_message = on_message
+        self.messages = []
+        self.counts = {'connections': 0, 'logins': 0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def record(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def deliver(self, mail_from, recipients, data):
+        with self._lock:
+            self.messages.append((mail_from, recipients, data))
+        if self.on_message is not None:
+            self.on_message(mail_from, recipients, data)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='devsmtp', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
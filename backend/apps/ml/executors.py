@@ -0,0 +1,69 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+def default_sizes():
+    # "inference": unbatched model calls (one thread per forward pass the
+    # scheduler lets through); "cpu": parsing and tokenizing; "io": disk
+    # reads and writes and loading tokenizers and processors.
+    limits = settings.TASK_SCHEDULER['LIMITS']
+    return {
+        'inference': limits.get('summarization', 1) + limits.get('classification', 1),
+        'cpu': os.cpu_count() or 1,
+        'io': 16,
+    }
+
+
+class Executors:
+    """Named, separately sized thread pools for blocking work.
+
+    Services hand blocking calls to the pool for their kind of work instead
+    of the loop's default executor, so slow model calls can't use up the
+    threads that HTML parsing or disk reads need, and the number of threads
+    per kind is a deliberate setting.
+    """
+
+    def __init__(self, sizes=None):
+        self.sizes = {**default_sizes(), **{k: v for k, v in (sizes or {}).items() if v}}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        pool = self._pools.get(name)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(name)
+                if pool is None:
+                    pool = self._pools[name] = ThreadPoolExecutor(
+                        max_workers=self.sizes[name], thread_name_prefix=f'ml-{name}'
+                    )
+        return pool
+
+    async def run(self, name, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.get(name), functools.partial(fn, *args, **kwargs))
+
+    def size(self, name):
+        return self.sizes[name]
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {'size': self.sizes[name], 'queued': pool._work_queue.qsize()}
+                for name, pool in self._pools.items()
+            }
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown()
+
+
+executors = Executors({name.lower(): size for name, size in settings.ML_EXECUTORS.items()})
+run_in = executors.run
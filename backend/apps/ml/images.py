@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import io
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .executors import run_in
+from .scraping import DEFAULT_HEADERS
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class PreprocessSpec:
+    height: int
+    width: int
+    mean: tuple
+    std: tuple
+    rescale_factor: float
+    resample: int
+
+    @classmethod
+    def from_processor(cls, processor):
+        size = processor.size
+        height = size.get('height') or size['shortest_edge']
+        width = size.get('width') or height
+        channels = len(processor.image_mean)
+        return cls(
+            height=height,
+            width=width,
+            mean=tuple(processor.image_mean) if processor.do_normalize else (0.0,) * channels,
+            std=tuple(processor.image_std) if processor.do_normalize else (1.0,) * channels,
+            rescale_factor=processor.rescale_factor if processor.do_rescale else 1.0,
+            resample=int(processor.resample),
+        )
+
+
+def decode_image(data, spec, max_pixels, formats):
+    """Decodes, resizes and normalizes one image into a CHW float32 array.
+
+    Module-level so it can run in a process pool.
+    """
+    import numpy as np
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        source = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError as e:
+        raise ImageRejected("Not a recognised image") from e
+    with source:
+        # Only the header has been read so far: reject before decoding.
+        if source.format not in formats:
+            raise ImageRejected(f"Unsupported image format: {source.format}")
+        if source.width * source.height > max_pixels:
+            raise ImageRejected(f"Image too large: {source.width}x{source.height}")
+        # JPEGs can decode straight at a reduced scale that is still at least
+        # the target size, which skips most of the IDCT work.
+        source.draft('RGB', (spec.width, spec.height))
+        image = source.convert('RGB').resize((spec.width, spec.height), resample=spec.resample)
+    array = np.asarray(image, dtype=np.float32) * spec.rescale_factor
+    array = (array - np.asarray(spec.mean, dtype=np.float32)) / np.asarray(spec.std, dtype=np.float32)
+    return np.ascontiguousarray(array.transpose(2, 0, 1))
+
+
+def classify_pixels(pipe, arrays, top_k):
+    # Runs the pipeline's model on already-preprocessed inputs and returns
+    # predictions in the pipeline's [{'label', 'score'}, ...] format.
+    import numpy as np
+    import torch
+
+    # A batch that arrived through shared memory is already stacked.
+    batch = torch.from_numpy(arrays if isinstance(arrays, np.ndarray) else np.stack(arrays))
+    with torch.inference_mode():
+        logits = pipe.model(pixel_values=batch).logits
+    probabilities = logits.float().softmax(-1)
+    scores, ids = probabilities.topk(min(top_k, probabilities.shape[-1]), dim=-1)
+    id2label = pipe.model.config.id2label
+    return [
+        [{'label': id2label[i], 'score': score} for score, i in zip(row_scores, row_ids)]
+        for row_scores, row_ids in zip(scores.tolist(), ids.tolist())
+    ]
+
+
+class ImageStore:
+    """Content-addressed image bytes on disk.
+
+    Blobs live under ``blobs/`` named by their sha256; ``urls/`` maps a URL
+    to the blob it last returned, so repeat URLs skip the download for
+    ``url_ttl`` seconds and identical images fetched from different URLs are
+    stored once.
+    """
+
+    def __init__(self, root, url_ttl=3600):
+        self.root = Path(root)
+        self.url_ttl = url_ttl
+
+    def _blob_path(self, digest):
+        return self.root / 'blobs' / digest[:2] / digest
+
+    def _url_path(self, url):
+        return self.root / 'urls' / hashlib.sha256(url.encode()).hexdigest()
+
+    def _write(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'.{path.name}.{os.getpid()}.{threading.get_ident()}')
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def lookup(self, url):
+        path = self._url_path(url)
+        try:
+            if time.time() - path.stat().st_mtime > self.url_ttl:
+                return None
+            digest = path.read_text().strip()
+            return digest, self._blob_path(digest).read_bytes()
+        except OSError:
+            return None
+
+    def put(self, url, data):
+        digest = hashlib.sha256(data).hexdigest()
+        blob = self._blob_path(digest)
+        if not blob.exists():
+            self._write(blob, data)
+        if url is not None:
+            self._write(self._url_path(url), digest.encode())
+        return digest
+
+
+class ImageIngestor:
+    """Turns image URLs into classifier-ready arrays.
+
+    Downloads are async and size-capped, bytes are cached on disk by
+    content, decoding and resizing run in a thread or process pool, and the
+    resulting arrays are kept in a small in-memory LRU keyed by content and
+    preprocessing spec.
+    """
+
+    def __init__(self, store=None, max_bytes=None, max_pixels=None, formats=None, timeout=None,
+                 workers=None, pool=None, array_cache_entries=None):
+        config = settings.IMAGE_INGEST
+        self.store = store or ImageStore(config['CACHE_DIR'], url_ttl=config['URL_TTL'])
+        self.max_bytes = max_bytes or config['MAX_BYTES']
+        self.max_pixels = max_pixels or config['MAX_PIXELS']
+        self.formats = frozenset(formats or config['FORMATS'])
+        self.timeout = timeout or config['TIMEOUT']
+        self.workers = workers or config['DECODE_WORKERS'] or os.cpu_count() or 1
+        self.pool = pool or config['DECODE_POOL']
+        self.array_cache_entries = (
+            array_cache_entries if array_cache_entries is not None else config['ARRAY_CACHE_ENTRIES']
+        )
+        self._arrays = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _client(self):
+        # httpx clients belong to one event loop.
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                headers=DEFAULT_HEADERS,
+                timeout=httpx.Timeout(self.timeout),
+                follow_redirects=True,
+            )
+        return client
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                executor_class = ProcessPoolExecutor if self.pool == 'process' else ThreadPoolExecutor
+                self._executor = executor_class(max_workers=self.workers)
+            return self._executor
+
+    async def fetch(self, url):
+        if urlsplit(url).scheme not in ('http', 'https'):
+            raise ImageRejected(f"Only http(s) image URLs are supported: {url}")
+        cached = await run_in("io", self.store.lookup, url)
+        if cached is not None:
+            return cached
+
+        try:
+            async with self._client().stream('GET', url) as response:
+                response.raise_for_status()
+                length = response.headers.get('Content-Length')
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise ImageRejected(f"Image larger than {self.max_bytes} bytes: {url}")
+                chunks, size = [], 0
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageRejected(f"Image larger than {self.max_bytes} bytes: {url}")
+                    chunks.append(chunk)
+        except httpx.HTTPError as e:
+            raise ImageRejected(f"Could not fetch {url}: {e}") from e
+        data = b''.join(chunks)
+        digest = await run_in("io", self.store.put, url, data)
+        return digest, data
+
+    async def load(self, url, spec):
+        digest, data = await self.fetch(url)
+        return await self.preprocess(data, spec, digest=digest)
+
+    async def preprocess(self, data, spec, digest=None):
+        digest = digest or hashlib.sha256(data).hexdigest()
+        key = (digest, spec)
+        with self._lock:
+            array = self._arrays.get(key)
+            if array is not None:
+                self._arrays.move_to_end(key)
+                return array
+        loop = asyncio.get_running_loop()
+        array = await loop.run_in_executor(
+            self._get_executor(), decode_image, data, spec, self.max_pixels, self.formats
+        )
+        if self.array_cache_entries:
+            with self._lock:
+                self._arrays[key] = array
+                while len(self._arrays) > self.array_cache_entries:
+                    self._arrays.popitem(last=False)
+        return array
+
+    async def aclose(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+image_ingestor = ImageIngestor()
@@ -0,0 +1,108 @@
+import asyncio
+import inspect
+
+from django.conf import settings
+
+from .batching import summarization_batcher
+from .executors import run_in
+from .registry import registry
+
+
+def chunk_tokens(token_ids, size, overlap):
+    if overlap >= size:
+        raise ValueError("chunk_overlap must be smaller than chunk_tokens")
+    if len(token_ids) <= size:
+        return [token_ids]
+    step = size - overlap
+    chunks = []
+    for start in range(0, len(token_ids), step):
+        chunks.append(token_ids[start:start + size])
+        if start + size >= len(token_ids):
+            break
+    return chunks
+
+
+def split_text(text, tokenizer, size, overlap):
+    token_ids = tokenizer(text, add_special_tokens=False)["input_ids"]
+    return [
+        tokenizer.decode(chunk, skip_special_tokens=True)
+        for chunk in chunk_tokens(token_ids, size, overlap)
+    ]
+
+
+def count_tokens(text, tokenizer):
+    return len(tokenizer(text, add_special_tokens=False)["input_ids"])
+
+
+async def _batched_summary(text, max_length, min_length):
+    return await summarization_batcher.asubmit((max_length, min_length), text)
+
+
+class LongDocumentSummarizer:
+    """Map-reduce summarization for inputs longer than the model window.
+
+    The text is split into overlapping token windows that are summarized
+    concurrently through ``generate`` (by default the batcher, which turns
+    them into batched forward passes; MLService passes its own path so
+    ``batching=False`` holds here too). The partial summaries are joined
+    and, while they still don't fit in one window, chunked and summarized
+    again, up to ``max_depth`` levels. The last level is summarized once
+    more into the final result. ``on_progress`` may be a plain or async
+    callable.
+    """
+
+    def __init__(self, chunk_size=None, overlap=None, max_depth=None,
+                 max_length=130, min_length=30, chunk_max_length=None, generate=None,
+                 model_registry=None):
+        config = settings.LONG_DOCUMENT
+        self.chunk_size = chunk_size or config['CHUNK_TOKENS']
+        self.overlap = overlap if overlap is not None else config['CHUNK_OVERLAP']
+        self.max_depth = max_depth or config['MAX_DEPTH']
+        self.max_length = max_length
+        self.min_length = min_length
+        self.chunk_max_length = chunk_max_length or config['CHUNK_SUMMARY_MAX_LENGTH']
+        self.generate = generate or _batched_summary
+        self.registry = model_registry or registry
+
+    async def _summarize_all(self, texts, max_length, min_length):
+        min_length = min(min_length, max_length)
+        return await asyncio.gather(
+            *(self.generate(text, max_length, min_length) for text in texts)
+        )
+
+    async def iter_summarize(self, text):
+        """Yields progress dicts per level, ending with a ``final`` one."""
+        tokenizer = await self.registry.apreprocessor("summarization")
+        chunks = await run_in("cpu", split_text, text, tokenizer, self.chunk_size, self.overlap)
+        depth = 0
+        while len(chunks) > 1 and depth < self.max_depth:
+            summaries = await self._summarize_all(
+                chunks, self.chunk_max_length, min(self.min_length, self.chunk_max_length)
+            )
+            yield {
+                "stage": "map" if depth == 0 else "reduce",
+                "depth": depth,
+                "chunks": len(chunks),
+                "summaries": summaries,
+            }
+            depth += 1
+            chunks = await run_in(
+                "cpu",
+                split_text, "\n".join(summaries), tokenizer, self.chunk_size, self.overlap
+            )
+
+        # Past max_depth whatever is left is joined and truncated to one
+        # window by the pipeline.
+        (summary,) = await self._summarize_all(
+            ["\n".join(chunks)], self.max_length, self.min_length
+        )
+        yield {"stage": "final", "depth": depth, "summary": summary}
+
+    async def summarize(self, text, on_progress=None):
+        async for step in self.iter_summarize(text):
+            if step["stage"] == "final":
+                return step["summary"]
+            if on_progress is not None:
+                result = on_progress(step)
+                if inspect.isawaitable(result):
+                    await result
@@ -0,0 +1,219 @@
+import asyncio
+import smtplib
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from django.conf import settings
+
+
+class _Outgoing:
+    def __init__(self, message):
+        self.message = message
+        self.future = Future()
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+
+def is_permanent(error):
+    # 5xx replies and bad credentials won't succeed on retry; dropped
+    # connections, timeouts and 4xx replies might.
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPNotSupportedError)):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return not isinstance(error, OSError)
+
+
+class Mailer:
+    """Sends email over a small pool of long-lived SMTP sessions.
+
+    Each of ``pool_size`` sender threads owns one authenticated session and
+    sends queued messages in batches of up to ``batch_size``, so STARTTLS
+    and login happen once per session instead of once per message. Sessions
+    idle for ``idle_timeout`` seconds are closed. Transient failures
+    reconnect and retry with exponential backoff.
+    """
+
+    def __init__(self, host, port, username='', password='', use_tls=True, use_ssl=False,
+                 timeout=30, pool_size=2, batch_size=20, max_latency=0.05,
+                 max_retries=3, retry_backoff=1.0, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._senders = []
+        # Senders that haven't committed to exiting; see _run().
+        self._live = 0
+        self._closing = False
+        self._stats = {'sent': 0, 'failed': 0, 'retries': 0, 'connections': 0}
+
+    def submit(self, message):
+        item = _Outgoing(message)
+        with self._cond:
+            self._queue.append(item)
+            self._ensure_senders()
+            self._cond.notify()
+        return item.future
+
+    def send(self, message):
+        return self.submit(message).result()
+
+    async def asend(self, message):
+        return await asyncio.wrap_future(self.submit(message))
+
+    def close(self):
+        # Lets the senders finish queued mail, then closes their sessions.
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            senders, self._senders = self._senders, []
+        for sender in senders:
+            sender.join()
+        with self._cond:
+            self._closing = False
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, queued=len(self._queue))
+
+    def _ensure_senders(self):
+        # Called with the condition held. A sender that has decided to exit
+        # can still be alive, so count live senders rather than threads.
+        self._senders = [s for s in self._senders if s.is_alive()]
+        while self._live < self.pool_size:
+            sender = threading.Thread(
+                target=self._run, name=f'mailer-{len(self._senders)}', daemon=True
+            )
+            self._live += 1
+            sender.start()
+            self._senders.append(sender)
+
+    def _next_batch(self):
+        # Returns up to batch_size messages once the batch is full or its
+        # oldest message has waited max_latency; None after idle_timeout
+        # without mail, or when closing with nothing left.
+        with self._cond:
+            idle_deadline = time.monotonic() + self.idle_timeout
+            while True:
+                now = time.monotonic()
+                if self._queue:
+                    ready_at = self._queue[0].queued_at + self.max_latency
+                    if len(self._queue) >= self.batch_size or ready_at <= now or self._closing:
+                        return [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                    self._cond.wait(ready_at - now)
+                elif self._closing or now >= idle_deadline:
+                    return None
+                else:
+                    self._cond.wait(idle_deadline - now)
+
+    def _run(self):
+        server = None
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    self._disconnect(server)
+                    server = None
+                    with self._cond:
+                        if self._closing or not self._queue:
+                            self._live -= 1
+                            return
+                    continue
+                for item in batch:
+                    server = self._deliver(server, item)
+        except BaseException:
+            with self._cond:
+                self._live -= 1
+            raise
+
+    def _connect(self):
+        smtp_class = smtplib.SMTP_SSL if self.use_ssl else smtplib.SMTP
+        server = smtp_class(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls and not self.use_ssl:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._disconnect(server)
+            raise
+        with self._cond:
+            self._stats['connections'] += 1
+        return server
+
+    def _disconnect(self, server):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def _deliver(self, server, item):
+        while True:
+            try:
+                if server is None:
+                    server = self._connect()
+                refused = server.send_message(item.message)
+            except Exception as e:
+                if is_permanent(e):
+                    if server is not None:
+                        try:
+                            server.rset()
+                        except (smtplib.SMTPException, OSError):
+                            self._disconnect(server)
+                            server = None
+                    self._finish(item, error=e)
+                    return server
+                self._disconnect(server)
+                server = None
+                item.attempts += 1
+                if item.attempts > self.max_retries:
+                    self._finish(item, error=e)
+                    return server
+                with self._cond:
+                    self._stats['retries'] += 1
+                time.sleep(self.retry_backoff * 2 ** (item.attempts - 1))
+                continue
+            self._finish(item, result=refused)
+            return server
+
+    def _finish(self, item, result=None, error=None):
+        with self._cond:
+            self._stats['failed' if error else 'sent'] += 1
+        if error is not None:
+            item.future.set_exception(error)
+        else:
+            item.future.set_result(result)
+
+
+mailer = Mailer(
+    settings.EMAIL_HOST,
+    settings.EMAIL_PORT,
+    username=settings.EMAIL_HOST_USER,
+    password=settings.EMAIL_HOST_PASSWORD,
+    use_tls=settings.EMAIL_USE_TLS,
+    use_ssl=settings.EMAIL_USE_SSL,
+    timeout=settings.EMAIL_TIMEOUT,
+    pool_size=settings.MAILER['POOL_SIZE'],
+    batch_size=settings.MAILER['BATCH_SIZE'],
+    max_latency=settings.MAILER['BATCH_MAX_LATENCY'],
+    max_retries=settings.MAILER['MAX_RETRIES'],
+    retry_backoff=settings.MAILER['RETRY_BACKOFF'],
+    idle_timeout=settings.MAILER['IDLE_TIMEOUT'],
+)
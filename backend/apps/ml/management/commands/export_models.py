@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.ml.backends import BACKENDS, BackendUnavailable, artifact_dir, build_pipeline
+from apps.ml.registry import MODEL_SPECS
+
+
+class Command(BaseCommand):
+    help = 'Convert models for the int8/onnx/torchscript backends and cache them on disk.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--task', action='append', choices=sorted(MODEL_SPECS),
+            help='Task type to export (repeatable). Defaults to all.',
+        )
+        parser.add_argument(
+            '--backend', action='append', choices=sorted(set(BACKENDS) - {'eager'}),
+            help='Backend to build (repeatable). Defaults to all.',
+        )
+
+    def handle(self, *args, **options):
+        tasks = options['task'] or sorted(MODEL_SPECS)
+        backends = options['backend'] or sorted(set(BACKENDS) - {'eager'})
+        failures = 0
+        for task in tasks:
+            spec = MODEL_SPECS[task]
+            for backend in backends:
+                started = time.perf_counter()
+                try:
+                    build_pipeline(spec, backend, export=True)
+                except BackendUnavailable as e:
+                    self.stdout.write(self.style.WARNING(f'{task}/{backend}: skipped ({e})'))
+                    continue
+                except Exception as e:
+                    failures += 1
+                    self.stderr.write(f'{task}/{backend}: failed: {e}')
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f'{task}/{backend}: {artifact_dir(spec, backend)} '
+                    f'({time.perf_counter() - started:.1f}s)'
+                ))
+        if failures:
+            raise CommandError(f'{failures} export(s) failed')
@@ -0,0 +1,35 @@
+from email import message_from_bytes
+
+from django.core.management.base import BaseCommand
+
+from apps.ml.devsmtp import DebugSMTPServer
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP server that accepts any login and prints what it receives.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=1025)
+        parser.add_argument(
+            '--latency', type=float, default=0.0,
+            help='Seconds to delay each reply, to mimic a remote server.',
+        )
+
+    def handle(self, *args, **options):
+        def on_message(mail_from, recipients, data):
+            message = message_from_bytes(data)
+            self.stdout.write(
+                f"{mail_from} -> {', '.join(recipients)}: {message.get('Subject', '')}"
+            )
+
+        server = DebugSMTPServer(
+            (options['host'], options['port']), latency=options['latency'], on_message=on_message
+        )
+        self.stdout.write(f"Debug SMTP server on {options['host']}:{options['port']}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,324 @@
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from core.metrics import metrics
+from .backends import build_pipeline
+from .executors import executors
+
+MODEL_LOAD_SECONDS = metrics.histogram(
+    'ml_model_load_seconds', 'Model load time', ['task_type', 'backend'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+
+
+class ModelsUnavailable(RuntimeError):
+    pass
+
+
+def serves_models():
+    # API-only processes never load models (nor import torch/transformers).
+    return settings.ML_PROCESS_ROLE != 'api'
+
+
+def _require_models(name):
+    if not serves_models():
+        raise ModelsUnavailable(
+            f"The {name} model isn't available in an API-only process (ML_PROCESS_ROLE=api)"
+        )
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    task: str
+    model: str
+    kwargs: dict = field(default_factory=dict)
+
+
+# Keyed by workflow task type, so a model is only loaded once a task of that
+# type actually runs.
+MODEL_SPECS = {
+    'summarization': ModelSpec(
+        task='summarization',
+        model='facebook/bart-large-cnn',
+        kwargs={'max_length': 130, 'min_length': 30},
+    ),
+    'classification': ModelSpec(
+        task='image-classification',
+        model='google/vit-base-patch16-224',
+        kwargs={'top_k': 5},
+    ),
+}
+
+
+def _rss_bytes():
+    # Linux only; other platforms just don't report the RSS delta.
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    import resource
+    return pages * resource.getpagesize()
+
+
+def torch_thread_budget():
+    if settings.ML_TORCH_THREADS:
+        return settings.ML_TORCH_THREADS
+    # Batched inference runs one forward pass per model at a time; unbatched
+    # runs one per thread of the inference executor.
+    if settings.ML_BATCHING_ENABLED:
+        workers = len(MODEL_SPECS)
+    else:
+        workers = executors.size('inference')
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+_torch_configured = False
+
+
+def configure_torch_threads(threads=None):
+    # Torch's thread pool is process-wide; without a budget every concurrent
+    # forward pass grabs all cores and they thrash each other.
+    global _torch_configured
+    if _torch_configured:
+        return
+    import torch
+    torch.set_num_threads(threads or torch_thread_budget())
+    _torch_configured = True
+
+
+def _param_bytes(model):
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+    except AttributeError:
+        return None
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+@dataclass
+class LoadedModel:
+    name: str
+    spec: ModelSpec
+    backend: str
+    pipeline: object
+    load_seconds: float
+    param_bytes: int | None
+    rss_delta_bytes: int | None
+    loaded_at: float
+    last_used: float
+    uses: int = 0
+
+    def stats(self):
+        return {
+            'model': self.spec.model,
+            'backend': self.backend,
+            'load_seconds': round(self.load_seconds, 3),
+            'param_bytes': self.param_bytes,
+            'rss_delta_bytes': self.rss_delta_bytes,
+            'loaded_at': self.loaded_at,
+            'idle_seconds': round(time.time() - self.last_used, 3),
+            'uses': self.uses,
+        }
+
+
+class ModelRegistry:
+    """Process-wide cache of transformers pipelines.
+
+    Each pipeline is loaded on first use and then shared by every MLService
+    in the process. Models that go unused for ``idle_timeout`` seconds are
+    dropped so their memory can be reclaimed.
+    """
+
+    def __init__(self, specs=None, idle_timeout=None, backends=None):
+        self.specs = dict(specs if specs is not None else MODEL_SPECS)
+        self.idle_timeout = idle_timeout
+        self.backends = dict(backends or {})
+        self._models = {}
+        self._preprocessors = {}
+        self._lock = threading.Lock()
+        self._load_locks = {name: threading.Lock() for name in self.specs}
+        self._reaper = None
+
+    def get(self, name):
+        loaded = self._models.get(name)
+        if loaded is None:
+            loaded = self._load(name)
+        loaded.last_used = time.time()
+        loaded.uses += 1
+        return loaded.pipeline
+
+    def _load(self, name):
+        if name not in self.specs:
+            raise KeyError(f"No model registered for task type: {name}")
+        _require_models(name)
+        # One lock per model so a slow BART load doesn't block ViT callers.
+        with self._load_locks[name]:
+            loaded = self._models.get(name)
+            if loaded is not None:
+                return loaded
+
+            configure_torch_threads()
+            spec = self.specs[name]
+            backend = self.backend(name)
+            rss_before = _rss_bytes()
+            started = time.perf_counter()
+            pipe = build_pipeline(spec, backend)
+            load_seconds = time.perf_counter() - started
+            MODEL_LOAD_SECONDS.observe(load_seconds, task_type=name, backend=backend)
+            rss_after = _rss_bytes()
+
+            now = time.time()
+            loaded = LoadedModel(
+                name=name,
+                spec=spec,
+                backend=backend,
+                pipeline=pipe,
+                load_seconds=load_seconds,
+                param_bytes=_param_bytes(getattr(pipe, 'model', None)),
+                rss_delta_bytes=(
+                    rss_after - rss_before
+                    if rss_before is not None and rss_after is not None
+                    else None
+                ),
+                loaded_at=now,
+                last_used=now,
+            )
+            with self._lock:
+                self._models[name] = loaded
+            self._ensure_reaper()
+            return loaded
+
+    def preprocessor(self, name):
+        # The tokenizer or image processor alone, so callers that only need
+        # to count tokens or prepare images don't load the model weights
+        # (which may live in worker processes instead).
+        loaded = self._models.get(name)
+        if loaded is not None:
+            pipe = loaded.pipeline
+            return pipe.tokenizer if pipe.tokenizer is not None else pipe.image_processor
+        with self._lock:
+            preprocessor = self._preprocessors.get(name)
+        if preprocessor is None:
+            _require_models(name)
+            from transformers import AutoImageProcessor, AutoTokenizer
+
+            spec = self.specs[name]
+            loader = AutoImageProcessor if spec.task == 'image-classification' else AutoTokenizer
+            preprocessor = loader.from_pretrained(spec.model)
+            with self._lock:
+                self._preprocessors.setdefault(name, preprocessor)
+        return preprocessor
+
+    async def apreprocessor(self, name):
+        # Loading reads tokenizer files from disk (or the hub); only that
+        # goes to a thread.
+        loaded = self._models.get(name)
+        if loaded is None and name not in self._preprocessors:
+            return await executors.run('io', self.preprocessor, name)
+        return self.preprocessor(name)
+
+    def backend(self, name):
+        return self.backends.get(name, 'eager')
+
+    def model_id(self, name):
+        # Quantized and exported backends don't produce bit-identical
+        # outputs, so anything keyed on the model includes the backend.
+        return f"{self.specs[name].model}@{self.backend(name)}"
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def warm_up(self, names=None):
+        for name in names if names is not None else self.specs:
+            self._load(name)
+
+    def evict(self, name):
+        # Only drop the registry's reference: a caller that got the pipeline
+        # from get() just before keeps using it, and it is freed once the
+        # last reference goes.
+        with self._lock:
+            evicted = self._models.pop(name, None) is not None
+        if evicted:
+            self._release_memory()
+        return evicted
+
+    def evict_idle(self, now=None):
+        if not self.idle_timeout:
+            return []
+        now = now if now is not None else time.time()
+        evicted = []
+        for name in list(self._models):
+            with self._lock:
+                # get() may have used the model since the loop started.
+                loaded = self._models.get(name)
+                if loaded is None or now - loaded.last_used < self.idle_timeout:
+                    continue
+                del self._models[name]
+            evicted.append(name)
+        if evicted:
+            self._release_memory()
+        return evicted
+
+    def clear(self):
+        for name in list(self._models):
+            self.evict(name)
+
+    def stats(self):
+        return {name: loaded.stats() for name, loaded in list(self._models.items())}
+
+    def _release_memory(self):
+        import gc
+        gc.collect()
+        try:
+            import torch
+            if torch.cuda.is_available():
+                torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+    def _ensure_reaper(self):
+        if not self.idle_timeout or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(
+                target=self._reap, name='ml-model-reaper', daemon=True
+            )
+            self._reaper.start()
+
+    def _reap(self):
+        interval = max(1.0, self.idle_timeout / 4)
+        while True:
+            time.sleep(interval)
+            self.evict_idle()
+
+
+registry = ModelRegistry(
+    idle_timeout=settings.ML_MODEL_IDLE_TIMEOUT,
+    backends=settings.ML_INFERENCE_BACKENDS,
+)
+
+metrics.gauge(
+    'ml_models_loaded', 'Models loaded in this process', ['task_type'],
+    collect=lambda: [((name,), 1 if registry.is_loaded(name) else 0) for name in registry.specs],
+)
+
+
+def warm_up():
+    if not serves_models():
+        return
+    if settings.ML_WORKER_POOL['ENABLED']:
+        # Models load in the worker processes, which warm up on start.
+        from .workers import inference_pool
+        inference_pool.start()
+        return
+    names = settings.ML_WARMUP_MODELS
+    if not names and settings.ML_PROCESS_ROLE == 'inference':
+        names = list(registry.specs)
+    if names:
+        registry.warm_up(names)
@@ -0,0 +1,195 @@
+import asyncio
+import importlib.util
+import threading
+import weakref
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import httpx
+from django.conf import settings
+
+from .executors import run_in
+
+DEFAULT_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+
+class ScrapingError(Exception):
+    pass
+
+
+def _bs4_parser(features):
+    def select(html, selectors):
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html, features)
+        return {
+            selector: [e.get_text(strip=True) for e in soup.select(selector)]
+            for selector in selectors
+        }
+    return select
+
+
+def _selectolax_select(html, selectors):
+    from selectolax.parser import HTMLParser
+    tree = HTMLParser(html)
+    return {
+        selector: [node.text(strip=True) for node in tree.css(selector)]
+        for selector in selectors
+    }
+
+
+PARSERS = {
+    'lxml': _bs4_parser('lxml'),
+    'html.parser': _bs4_parser('html.parser'),
+    'selectolax': _selectolax_select,
+}
+
+
+def get_parser(name=None):
+    name = name or settings.SCRAPER['PARSER']
+    # Optional backends fall back to the stdlib parser when not installed.
+    if name != 'html.parser' and importlib.util.find_spec(name) is None:
+        name = 'html.parser'
+    return PARSERS[name]
+
+
+class ConditionalCache:
+    """Remembers validators and bodies so repeat fetches can use 304s."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            entry = self._data.get(url)
+            if entry is not None:
+                self._data.move_to_end(url)
+            return entry
+
+    def set(self, url, etag, last_modified, text):
+        if not etag and not last_modified:
+            return
+        with self._lock:
+            # The last dict holds parsed results per selector list, valid for
+            # as long as the server keeps answering 304.
+            self._data[url] = (etag, last_modified, text, {})
+            self._data.move_to_end(url)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class _LoopState:
+    def __init__(self, scraper):
+        self.client = httpx.AsyncClient(
+            headers=DEFAULT_HEADERS,
+            timeout=httpx.Timeout(scraper.timeout),
+            limits=httpx.Limits(
+                max_connections=scraper.max_connections,
+                max_keepalive_connections=scraper.max_connections,
+            ),
+            follow_redirects=True,
+        )
+        self.host_limits = {}
+
+    def host_limit(self, host, limit):
+        semaphore = self.host_limits.get(host)
+        if semaphore is None:
+            semaphore = self.host_limits[host] = asyncio.Semaphore(limit)
+        return semaphore
+
+
+class Scraper:
+    """Async page fetcher with a pooled HTTP client.
+
+    httpx clients and asyncio semaphores belong to one event loop, so each
+    running loop gets its own client and per-host limits; the conditional GET
+    cache is shared by all of them.
+    """
+
+    def __init__(self, timeout=None, max_connections=None, per_host=None,
+                 parser=None, cache_entries=None):
+        config = settings.SCRAPER
+        self.timeout = timeout or config['TIMEOUT']
+        self.max_connections = max_connections or config['MAX_CONNECTIONS']
+        self.per_host = per_host or config['MAX_CONNECTIONS_PER_HOST']
+        self.parse = get_parser(parser)
+        self.conditional_cache = ConditionalCache(cache_entries or config['CONDITIONAL_CACHE_ENTRIES'])
+        self._states = weakref.WeakKeyDictionary()
+
+    def _state(self):
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self)
+        return state
+
+    async def fetch(self, url):
+        text, _ = await self._fetch(url)
+        return text
+
+    async def _fetch(self, url):
+        state = self._state()
+        headers = {}
+        cached = self.conditional_cache.get(url)
+        if cached is not None:
+            etag, last_modified = cached[:2]
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+
+        async with state.host_limit(urlsplit(url).netloc, self.per_host):
+            try:
+                response = await state.client.get(url, headers=headers)
+            except httpx.HTTPError as e:
+                raise ScrapingError(f"{url}: {e}") from e
+
+        if response.status_code == 304 and cached is not None:
+            return cached[2], cached[3]
+        try:
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            raise ScrapingError(str(e)) from e
+        self.conditional_cache.set(
+            url,
+            response.headers.get('ETag'),
+            response.headers.get('Last-Modified'),
+            response.text,
+        )
+        return response.text, None
+
+    async def scrape(self, url, selectors):
+        html, parsed = await self._fetch(url)
+        key = tuple(selectors)
+        if parsed is not None and key in parsed:
+            return parsed[key]
+        # Parsing is CPU-bound; keep it off the event loop for large pages.
+        result = await run_in('cpu', self.parse, html, selectors)
+        entry = self.conditional_cache.get(url)
+        if entry is not None and entry[2] is html:
+            entry[3][key] = result
+        return result
+
+    async def scrape_many(self, urls, selectors):
+        results = await asyncio.gather(
+            *(self.scrape(url, selectors) for url in urls),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+        return {
+            url: (
+                {'error': str(result)} if isinstance(result, Exception) else result
+            )
+            for url, result in zip(urls, results)
+        }
+
+    async def aclose(self):
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+
+scraper = Scraper()
@@ -1,60 +1,163 @@
-from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer, AutoImageProcessor, AutoModelForImageClassification
-import requests
-from bs4 import BeautifulSoup
-import smtplib
 from email.mime.text import MIMEText
 from .models import TaskConfig
-import os
+from .registry import registry
+from .batching import summarization_batcher, classification_batcher, summarize_kwargs
+from .cache import make_key, result_cache
+from .scraping import ScrapingError, scraper
+from .longdoc import LongDocumentSummarizer, count_tokens
+from .mailer import mailer
+from .images import PreprocessSpec, classify_pixels, image_ingestor
+from .singleflight import coalesced, single_flight
+from .executors import run_in
+from django.conf import settings
+from core.metrics import metrics
+
+INFERENCE_SECONDS = metrics.histogram(
+    'ml_inference_seconds',
+    'Model inference time per request, including time queued for a batch',
+    ['task_type', 'path'],
+)
+
+
+async def aclose_for_loop():
+    # HTTP clients are kept per event loop; call this before a short-lived
+    # loop (a queued job's asyncio.run, an async view under WSGI) finishes
+    # so its connections close.
+    await scraper.aclose()
+    await image_ingestor.aclose()
+
 
 class MLService:
-    def __init__(self):
-        self.summarizer = pipeline(
-            "summarization",
-            model="facebook/bart-large-cnn",
-            max_length=130,
-            min_length=30
-        )
-        self.classifier = pipeline(
-            "image-classification",
-            model="google/vit-base-patch16-224",
-            top_k=5
-        )
+    # Pipelines live in the process-wide registry; constructing an MLService
+    # is cheap and models load the first time a task of their type runs.
+    def __init__(self, model_registry=None, batching=None, cache=None, flights=None):
+        self.registry = model_registry or registry
+        self.batching = settings.ML_BATCHING_ENABLED if batching is None else batching
+        # Worker processes are only reached through the batchers.
+        if settings.ML_WORKER_POOL['ENABLED']:
+            self.batching = True
+        self.cache = cache or result_cache
+        # Identical concurrent calls (same task type and config) share one
+        # computation, across threads and event loops.
+        self.flights = flights or single_flight
 
+    @property
+    def summarizer(self):
+        return self.registry.get("summarization")
+
+    @property
+    def classifier(self):
+        return self.registry.get("classification")
+
+    @coalesced("scraping")
     async def scrape_web(self, config):
+        # "url" may be a single URL or a list; a list (or "urls") fans out
+        # concurrently and returns results keyed by URL.
+        urls = config.get("urls") or config["url"]
         try:
-            headers = {'User-Agent': 'Mozilla/5.0'} 
-            response = requests.get(config["url"], headers=headers)
-            response.raise_for_status()  # Raise exception for bad status codes
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            results = {}
-            for selector in config["selectors"]:
-                elements = soup.select(selector)
-                results[selector] = [e.get_text(strip=True) for e in elements]
-            return results
-        except requests.RequestException as e:
+            if isinstance(urls, (list, tuple)):
+                return await scraper.scrape_many(list(urls), config["selectors"])
+            return await scraper.scrape(urls, config["selectors"])
+        except ScrapingError as e:
             raise Exception(f"Scraping failed: {str(e)}")
 
-    async def summarize_text(self, config):
+    @coalesced("summarization")
+    async def summarize_text(self, config, on_progress=None):
         try:
             if not config.get("input_text"):
                 raise ValueError("Input text is required")
                 
-            summary = self.summarizer(
+            max_length = config.get("max_length", 130)
+            min_length = config.get("min_length", 30)
+            long_document = await self._is_long_document(config)
+            cache_config = {"max_length": max_length, "min_length": min_length}
+            if long_document:
+                long_summarizer = self._long_summarizer(config)
+                cache_config.update(
+                    mode="long",
+                    chunk_tokens=long_summarizer.chunk_size,
+                    chunk_overlap=long_summarizer.overlap,
+                    max_depth=long_summarizer.max_depth,
+                )
+                compute = lambda: self._summarize_long(long_summarizer, config["input_text"], on_progress)
+            else:
+                compute = lambda: self._summarize(config["input_text"], max_length, min_length)
+
+            key = make_key(
+                "summarization",
+                self.registry.model_id("summarization"),
                 config["input_text"],
-                max_length=config.get("max_length", 130),
-                min_length=config.get("min_length", 30)
+                cache_config
             )
-            return summary[0]['summary_text']
+            return await self.cache.aget_or_compute(key, compute)
         except Exception as e:
             raise Exception(f"Summarization failed: {str(e)}")
 
+    async def _is_long_document(self, config):
+        # "auto" (the default) switches to map-reduce only when the text
+        # doesn't fit in one chunk; "long" and "single" force a mode.
+        mode = config.get("mode", settings.LONG_DOCUMENT["MODE"])
+        if mode != "auto":
+            return mode == "long"
+        text = config["input_text"]
+        chunk_size = config.get("chunk_tokens", settings.LONG_DOCUMENT["CHUNK_TOKENS"])
+        # Fewer characters than tokens is impossible, so skip tokenizing
+        # short inputs.
+        if len(text) <= chunk_size:
+            return False
+        tokenizer = await self.registry.apreprocessor("summarization")
+        return await run_in("cpu", count_tokens, text, tokenizer) > chunk_size
+
+    def _long_summarizer(self, config):
+        return LongDocumentSummarizer(
+            chunk_size=config.get("chunk_tokens"),
+            overlap=config.get("chunk_overlap"),
+            max_depth=config.get("max_depth"),
+            max_length=config.get("max_length", 130),
+            min_length=config.get("min_length", 30),
+            generate=self._generate,
+            model_registry=self.registry,
+        )
+
+    async def _summarize_long(self, long_summarizer, text, on_progress):
+        with INFERENCE_SECONDS.time(task_type="summarization", path="long"):
+            return await long_summarizer.summarize(text, on_progress)
+
+    async def _summarize(self, text, max_length, min_length):
+        path = "batched" if self.batching else "direct"
+        with INFERENCE_SECONDS.time(task_type="summarization", path=path):
+            return await self._generate(text, max_length, min_length)
+
+    async def _generate(self, text, max_length, min_length):
+        if self.batching:
+            return await summarization_batcher.asubmit((max_length, min_length), text)
+
+        # Unbatched: the pipeline call (and a first-use model load) runs on
+        # the inference executor, not the event loop.
+        summary = await run_in(
+            "inference",
+            lambda: self.summarizer(text, **summarize_kwargs(max_length, min_length))
+        )
+        return summary[0]['summary_text']
+
+    @coalesced("classification")
     async def classify_image(self, config):
         try:
             if not config.get("image_url"):
                 raise ValueError("Image URL is required")
                 
-            predictions = self.classifier(config["image_url"])
+            top_k = config.get("top_k", 5)
+            # Cache the raw predictions so callers with different thresholds
+            # share an entry.
+            key = make_key(
+                "classification",
+                self.registry.model_id("classification"),
+                config["image_url"],
+                {"top_k": top_k}
+            )
+            predictions = await self.cache.aget_or_compute(
+                key, lambda: self._classify(config["image_url"], top_k)
+            )
             threshold = config.get("confidence_threshold", 0.5)
             
             return [
@@ -68,19 +171,25 @@ class MLService:
         except Exception as e:
             raise Exception(f"Classification failed: {str(e)}")
 
+    async def _classify(self, image_url, top_k):
+        processor = await self.registry.apreprocessor("classification")
+        pixel_values = await image_ingestor.load(image_url, PreprocessSpec.from_processor(processor))
+        if self.batching:
+            with INFERENCE_SECONDS.time(task_type="classification", path="batched"):
+                return await classification_batcher.asubmit((top_k,), pixel_values)
+        with INFERENCE_SECONDS.time(task_type="classification", path="direct"):
+            predictions = await run_in(
+                "inference", lambda: classify_pixels(self.classifier, [pixel_values], top_k)
+            )
+        return predictions[0]
 
     async def send_email(self, config):
-       msg = MIMEText(config["body"])
-       msg["Subject"] = config["subject"]
-       msg["To"] = config["recipient"]
-       msg["From"] = os.getenv("EMAIL_USER")
-
-       with smtplib.SMTP("smtp.gmail.com", 587) as server:
-           server.starttls()
-        #    server.login(
-        #        os.getenv("EMAIL_USER"),
-        #        os.getenv("EMAIL_PASSWORD")
-        #    )
-           server.login("xx@gmail.com", "xxx")
-           server.send_message(msg)
-           return {"status": "sent"}
\ No newline at end of file
+        msg = MIMEText(config["body"])
+        msg["Subject"] = config["subject"]
+        msg["To"] = config["recipient"]
+        msg["From"] = settings.DEFAULT_FROM_EMAIL
+
+        refused = await mailer.asend(msg)
+        if refused:
+            return {"status": "sent", "refused": sorted(refused)}
+        return {"status": "sent"}
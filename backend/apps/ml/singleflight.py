@@ -0,0 +1,170 @@
+import asyncio
+import functools
+import hashlib
+import json
+import threading
+import uuid
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.metrics import metrics
+from .cache import normalize_input
+
+FLIGHTS = metrics.counter(
+    'ml_single_flight_calls_total',
+    "Task calls by whether they ran the work or shared another call's",
+    ['task_type', 'role'],
+)
+
+
+class _Abandoned(Exception):
+    # The call doing the work was cancelled; whoever was waiting on it
+    # starts over instead of failing.
+    pass
+
+
+def flight_key(task_type, config):
+    payload = json.dumps(
+        {"task": task_type, "config": normalize_input(config)}, sort_keys=True, default=str
+    )
+    return f"singleflight:{task_type}:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls onto one computation.
+
+    The first call for a key (the leader) runs ``compute()``; calls for the
+    same key that arrive while it runs wait for it and get the same result
+    or exception, from any thread or event loop. Nothing is kept once the
+    call finishes, so this is not a cache.
+
+    With ``shared`` (a Django cache alias), leaders in different processes
+    also coordinate: a lock entry in the cache names the running flight and
+    the other processes poll for its result. A shared cache (Redis, the
+    database cache) is needed for this to reach beyond one process.
+    """
+
+    def __init__(self, shared=None, lock_timeout=300, poll_interval=0.05, result_ttl=30):
+        self.shared = shared
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.result_ttl = result_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    async def run(self, key, compute, label=None):
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = self._calls[key] = Future()
+            FLIGHTS.inc(task_type=label or 'other', role='leader' if leader else 'follower')
+            if leader:
+                return await self._lead(key, future, compute)
+            try:
+                # shield(): a cancelled waiter must not cancel the shared call.
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                continue
+
+    async def _lead(self, key, future, compute):
+        try:
+            if self.shared is not None:
+                result = await self._run_shared(key, compute)
+            else:
+                result = await compute()
+        except asyncio.CancelledError:
+            self._finish(key, future, error=_Abandoned())
+            raise
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result=result)
+        return result
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def _run_shared(self, key, compute):
+        cache = caches[self.shared]
+        lock_key = f"{key}:lock"
+        while True:
+            token = uuid.uuid4().hex
+            if await cache.aadd(lock_key, token, timeout=self.lock_timeout):
+                try:
+                    result = await compute()
+                except Exception as e:
+                    await cache.aset(f"{key}:{token}", ("error", str(e)), timeout=self.result_ttl)
+                    raise
+                else:
+                    await cache.aset(f"{key}:{token}", ("ok", result), timeout=self.result_ttl)
+                    return result
+                finally:
+                    await cache.adelete(lock_key)
+
+            # Another process is running it: wait for that flight's result.
+            # The lock is read before the result because the leader stores
+            # its result before releasing the lock; a lock that went away
+            # with no result means the leader died, so try to take over.
+            running = await cache.aget(lock_key)
+            delay = self.poll_interval
+            while running is not None:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+                current = await cache.aget(lock_key)
+                outcome = await cache.aget(f"{key}:{running}")
+                if outcome is not None:
+                    status, value = outcome
+                    if status == "error":
+                        raise Exception(value)
+                    return value
+                running = current
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+def coalesced(task_type):
+    """Runs an MLService method through the service's single-flight group.
+
+    Calls are keyed on the task type and normalized config; extra arguments
+    (progress callbacks) only take effect for the call that does the work.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, config, *args, **kwargs):
+            flights = self.flights
+            if flights is None or task_type not in settings.ML_SINGLE_FLIGHT['TASKS']:
+                return await method(self, config, *args, **kwargs)
+            return await flights.run(
+                flight_key(task_type, config),
+                lambda: method(self, config, *args, **kwargs),
+                label=task_type,
+            )
+        return wrapper
+    return decorator
+
+
+def build_single_flight(config=None):
+    config = config if config is not None else settings.ML_SINGLE_FLIGHT
+    if not config['ENABLED']:
+        return None
+    return SingleFlight(
+        shared=config['CACHE'] or None,
+        lock_timeout=config['LOCK_TIMEOUT'],
+        poll_interval=config['POLL_INTERVAL'],
+        result_ttl=config['RESULT_TTL'],
+    )
+
+
+single_flight = build_single_flight()
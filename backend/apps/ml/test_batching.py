@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from .batching import InferenceBatcher
+
+
+class FakePipeline:
+    # Upper-cases its inputs, failing the whole batch on "bad" like a model
+    # call that raises on one input.
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, key, items):
+        with self._lock:
+            self.calls.append((key, list(items)))
+        time.sleep(self.delay)
+        if 'bad' in items:
+            raise ValueError('bad input')
+        return [f'{key}:{item.upper()}' for item in items]
+
+
+class InferenceBatcherTests(SimpleTestCase):
+    def test_full_batches_run_without_waiting_for_the_deadline(self):
+        pipeline = FakePipeline()
+        batcher = InferenceBatcher(pipeline, max_batch_size=4, max_latency=30)
+        started = time.monotonic()
+        futures = [batcher.submit('k', f'item{i}') for i in range(8)]
+        results = [future.result(timeout=5) for future in futures]
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(results, [f'k:ITEM{i}' for i in range(8)])
+        self.assertEqual([len(items) for _, items in pipeline.calls], [4, 4])
+
+    def test_partial_batch_flushes_after_max_latency(self):
+        pipeline = FakePipeline()
+        batcher = InferenceBatcher(pipeline, max_batch_size=100, max_latency=0.05)
+        futures = [batcher.submit('k', item) for item in ('a', 'b', 'c')]
+        self.assertEqual([f.result(timeout=5) for f in futures], ['k:A', 'k:B', 'k:C'])
+        self.assertEqual(pipeline.calls, [('k', ['a', 'b', 'c'])])
+
+    def test_inputs_are_batched_per_key(self):
+        pipeline = FakePipeline()
+        batcher = InferenceBatcher(pipeline, max_batch_size=10, max_latency=0.05)
+        futures = [batcher.submit(key, item) for key, item in (('x', 'a'), ('y', 'b'), ('x', 'c'))]
+        self.assertEqual([f.result(timeout=5) for f in futures], ['x:A', 'y:B', 'x:C'])
+        self.assertEqual(sorted(pipeline.calls), [('x', ['a', 'c']), ('y', ['b'])])
+
+    def test_failing_input_only_fails_its_own_caller(self):
+        pipeline = FakePipeline()
+        batcher = InferenceBatcher(pipeline, max_batch_size=3, max_latency=30)
+        futures = [batcher.submit('k', item) for item in ('a', 'bad', 'c')]
+        self.assertEqual(futures[0].result(timeout=5), 'k:A')
+        with self.assertRaisesMessage(ValueError, 'bad input'):
+            futures[1].result(timeout=5)
+        self.assertEqual(futures[2].result(timeout=5), 'k:C')
+        # The batch, then each input on its own.
+        self.assertEqual(
+            [items for _, items in pipeline.calls], [['a', 'bad', 'c'], ['a'], ['bad'], ['c']]
+        )
+
+    def test_wrong_result_count_fails_the_callers(self):
+        batcher = InferenceBatcher(lambda key, items: [], max_batch_size=1, max_latency=0)
+        with self.assertRaises(RuntimeError):
+            batcher.submit('k', 'a').result(timeout=5)
+
+    def test_concurrent_async_callers_share_batches(self):
+        pipeline = FakePipeline(delay=0.05)
+        batcher = InferenceBatcher(pipeline, max_batch_size=8, max_latency=0.02)
+
+        async def main():
+            return await asyncio.gather(*(batcher.asubmit('k', f'{i}') for i in range(16)))
+
+        self.assertEqual(asyncio.run(main()), [f'k:{i}' for i in range(16)])
+        self.assertLess(len(pipeline.calls), 16)
+        self.assertEqual(sum(len(items) for _, items in pipeline.calls), 16)
@@ -0,0 +1,57 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from .cache import LRUBackend, ResultCache
+from .services import MLService
+
+
+class WordTokenizer:
+    def __call__(self, text, add_special_tokens=False):
+        return {'input_ids': text.split()}
+
+    def decode(self, ids, skip_special_tokens=True):
+        return ' '.join(ids)
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.calls = []
+
+    def get(self, name):
+        return self.summarize
+
+    def summarize(self, text, **kwargs):
+        self.calls.append(text)
+        return [{'summary_text': text.split()[0]}]
+
+    async def apreprocessor(self, name):
+        return WordTokenizer()
+
+    def model_id(self, name):
+        return 'fake'
+
+
+class LongDocumentServiceTests(SimpleTestCase):
+    def test_unbatched_service_summarizes_chunks_directly(self):
+        registry = FakeRegistry()
+        service = MLService(
+            model_registry=registry, batching=False,
+            cache=ResultCache(LRUBackend(), enabled=False),
+        )
+        service.flights = None
+        steps = []
+        config = {
+            'input_text': 'a b c d e f g h', 'mode': 'long',
+            'chunk_tokens': 4, 'chunk_overlap': 0, 'max_depth': 1,
+        }
+        with mock.patch('apps.ml.services.summarization_batcher') as batcher, \
+                mock.patch('apps.ml.longdoc.summarization_batcher', batcher):
+            summary = asyncio.run(service.summarize_text(config, on_progress=steps.append))
+        batcher.asubmit.assert_not_called()
+        self.assertEqual(registry.calls, ['a b c d', 'e f g h', 'a e'])
+        self.assertEqual(summary, 'a')
+        self.assertEqual(
+            steps, [{'stage': 'map', 'depth': 0, 'chunks': 2, 'summaries': ['a', 'e']}]
+        )
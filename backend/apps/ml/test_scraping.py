@@ -0,0 +1,56 @@
+import asyncio
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from .scraping import Scraper, ScrapingError
+from .services import scraper
+
+
+class ScrapeManyTests(SimpleTestCase):
+    def test_errors_are_returned_per_url(self):
+        async def scrape(url, selectors):
+            if url == 'bad':
+                raise ScrapingError('bad: 404')
+            return {'p': [url]}
+
+        instance = Scraper()
+        with mock.patch.object(instance, 'scrape', scrape):
+            results = asyncio.run(instance.scrape_many(['a', 'bad'], ['p']))
+        self.assertEqual(results, {'a': {'p': ['a']}, 'bad': {'error': 'bad: 404'}})
+
+    def test_cancellation_is_raised(self):
+        async def scrape(url, selectors):
+            if url == 'cancelled':
+                raise asyncio.CancelledError()
+            return {'p': [url]}
+
+        instance = Scraper()
+        with mock.patch.object(instance, 'scrape', scrape):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(instance.scrape_many(['a', 'cancelled'], ['p']))
+
+
+class ExecuteTaskClientTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create(username='scraper'))
+
+    def test_wsgi_request_closes_its_http_client(self):
+        clients = []
+
+        async def scrape(url, selectors):
+            clients.append(scraper._state().client)
+            return {'p': ['text']}
+
+        with mock.patch.object(scraper, 'scrape', scrape):
+            response = self.client.post(
+                '/api/workflows/execute-task/',
+                {'nodeId': 'n1', 'type': 'scraping',
+                 'config': {'url': 'http://example.com', 'selectors': ['p']}},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['result'], {'p': ['text']})
+        self.assertEqual(len(clients), 1)
+        self.assertTrue(clients[0].is_closed)
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from .workers import InferencePool, InferenceWorkerError, _Worker
+
+
+def dead_worker(index):
+    process = SimpleNamespace(join=lambda timeout=None: None, exitcode=3, pid=None)
+    return _Worker(index, process, SimpleNamespace(close=lambda: None))
+
+
+class InferencePoolTests(SimpleTestCase):
+    def test_submit_after_close_raises(self):
+        pool = InferencePool(workers=1)
+        pool.close()
+        with self.assertRaisesMessage(InferenceWorkerError, "Inference pool closed"):
+            pool.submit('summarization', (130, 30), ['text'])
+        with self.assertRaisesMessage(InferenceWorkerError, "Inference pool closed"):
+            pool.start()
+
+    def test_replace_schedules_a_restart_without_blocking(self):
+        pool = InferencePool(workers=2)
+        worker, other = dead_worker(0), dead_worker(1)
+        future = Future()
+        worker.inflight[7] = (future, None)
+        pool._workers = [worker, other]
+
+        started = time.monotonic()
+        pool._replace(worker)
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        self.assertEqual(pool._workers, [other])
+        self.assertEqual(pool.restarts, 1)
+        # It died straight after starting, so its respawn is backed off.
+        (due, index), = pool._respawns
+        self.assertEqual(index, 0)
+        self.assertGreater(due, started + 0.5)
+        with self.assertRaisesMessage(InferenceWorkerError, "exited with code 3"):
+            future.result(timeout=0)
+
+    def test_replace_ignores_workers_already_replaced(self):
+        pool = InferencePool(workers=1)
+        pool._workers = [dead_worker(0)]
+        pool._replace(dead_worker(0))
+        self.assertEqual(pool.restarts, 0)
+        self.assertEqual(pool._respawns, [])
@@ -0,0 +1,23 @@
+from django.conf import settings
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+from .registry import registry
+from .cache import result_cache
+from .executors import executors
+from .singleflight import single_flight
+
+
+@api_view(['GET'])
+def ml_stats(request):
+    stats = {
+        'models': registry.stats(),
+        'result_cache': result_cache.stats(),
+        'executors': executors.stats(),
+    }
+    if single_flight is not None:
+        stats['single_flight'] = {'in_flight': single_flight.in_flight()}
+    if settings.ML_WORKER_POOL['ENABLED']:
+        # Models live in the workers, so `models` above stays empty.
+        from .workers import inference_pool
+        stats['worker_pool'] = inference_pool.stats()
+    return Response(stats)
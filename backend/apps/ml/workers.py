@@ -0,0 +1,309 @@
+import heapq
+import importlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import Future, InvalidStateError
+from multiprocessing.connection import wait
+
+from django.conf import settings
+
+DEFAULT_HANDLERS = 'apps.ml.batching:BATCH_FUNCTIONS'
+
+
+class InferenceWorkerError(RuntimeError):
+    pass
+
+
+def _pack(items):
+    # Arrays (preprocessed images) travel through one shared-memory segment
+    # per batch instead of being pickled through the pipe.
+    if items and hasattr(items[0], '__array_interface__'):
+        import numpy as np
+        from multiprocessing.shared_memory import SharedMemory
+
+        batch = np.stack(items)
+        shm = SharedMemory(create=True, size=max(batch.nbytes, 1))
+        np.ndarray(batch.shape, batch.dtype, buffer=shm.buf)[...] = batch
+        return ('shm', shm.name, batch.shape, batch.dtype.str), shm
+    return ('pickle', items), None
+
+
+def _release(shm):
+    if shm is not None:
+        shm.close()
+        shm.unlink()
+
+
+def _settle(future, ok, value):
+    # The caller may have cancelled the future; the reply is dropped then.
+    try:
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+    except InvalidStateError:
+        pass
+
+
+def _load_handlers(path):
+    module, _, name = path.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def _worker_main(index, conn, threads, cores, handlers_path):
+    # Runs in a fresh (spawned) interpreter. Thread limits must be set
+    # before torch is imported.
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    if cores and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+    import django
+    django.setup()
+
+    from multiprocessing.shared_memory import SharedMemory
+    from apps.ml.registry import configure_torch_threads, registry
+
+    configure_torch_threads(threads)
+    handlers = _load_handlers(handlers_path)
+    if settings.ML_WARMUP_MODELS:
+        registry.warm_up([name for name in settings.ML_WARMUP_MODELS if name in handlers])
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        request_id, task, key, payload = message
+        shm = items = None
+        try:
+            if payload[0] == 'shm':
+                import numpy as np
+
+                _, name, shape, dtype = payload
+                # Spawned workers share the parent's resource tracker, and
+                # the parent unlinks the segment once the reply arrives.
+                shm = SharedMemory(name=name)
+                items = np.ndarray(shape, dtype, buffer=shm.buf)
+            else:
+                items = payload[1]
+            conn.send((request_id, True, handlers[task](key, items)))
+        except Exception as e:
+            conn.send((request_id, False, f"{type(e).__name__}: {e}"))
+        finally:
+            # Views into the segment must be gone before it can close.
+            items = None
+            if shm is not None:
+                shm.close()
+
+
+class _Worker:
+    def __init__(self, index, process, conn):
+        self.index = index
+        self.process = process
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        # request id -> (future, shared memory segment or None)
+        self.inflight = {}
+        self.started_at = time.time()
+
+
+class InferencePool:
+    """Model inference in separate processes, each with its own models.
+
+    Calls are ``run(task, key, items)`` with the same arguments as the batch
+    functions in ``handlers`` and go to the least busy worker over a pipe.
+    Each worker is pinned to its own ``threads_per_worker`` cores, so the
+    workers don't share a GIL or fight over one torch thread pool. A monitor
+    thread restarts workers that die and fails their in-flight calls. A
+    closed pool stays closed.
+    """
+
+    def __init__(self, workers=None, threads_per_worker=None, pin=True, handlers=DEFAULT_HANDLERS):
+        cores = os.cpu_count() or 1
+        self.threads_per_worker = threads_per_worker or 1
+        self.size = workers or max(1, cores // self.threads_per_worker)
+        self.pin = pin
+        self.handlers = handlers
+        self.restarts = 0
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = []
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._monitor = None
+        self._closing = False
+        # (due time, worker index) of dead workers waiting to be respawned.
+        self._respawns = []
+
+    def _cores(self, index):
+        if not self.pin or not hasattr(os, 'sched_getaffinity'):
+            return None
+        available = sorted(os.sched_getaffinity(0))
+        start = index * self.threads_per_worker
+        return {available[(start + i) % len(available)] for i in range(self.threads_per_worker)}
+
+    def _spawn(self, index):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, child_conn, self.threads_per_worker, self._cores(index), self.handlers),
+            name=f'ml-worker-{index}',
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        return _Worker(index, process, parent_conn)
+
+    def start(self):
+        with self._lock:
+            if self._closing:
+                raise InferenceWorkerError("Inference pool closed")
+            if self._monitor is not None:
+                return
+            self._workers = [self._spawn(index) for index in range(self.size)]
+            self._monitor = threading.Thread(target=self._watch, name='ml-worker-monitor', daemon=True)
+            self._monitor.start()
+
+    def submit(self, task, key, items):
+        self.start()
+        future = Future()
+        payload, shm = _pack(items)
+        with self._lock:
+            if self._closing or not self._workers:
+                _release(shm)
+                raise InferenceWorkerError(
+                    "Inference pool closed" if self._closing else "No inference workers running"
+                )
+            worker = min(self._workers, key=lambda w: len(w.inflight))
+            request_id = next(self._ids)
+            worker.inflight[request_id] = (future, shm)
+        try:
+            with worker.send_lock:
+                worker.conn.send((request_id, task, key, payload))
+        except (OSError, ValueError) as e:
+            # If the worker died meanwhile, _replace() already took (and
+            # failed) the call; only the side that removes it settles it.
+            with self._lock:
+                owned = worker.inflight.pop(request_id, None) is not None
+            if owned:
+                _release(shm)
+                _settle(future, False, InferenceWorkerError(
+                    f"ml-worker-{worker.index} unavailable: {e}"
+                ))
+        return future
+
+    def run(self, task, key, items):
+        return self.submit(task, key, items).result()
+
+    def _watch(self):
+        while True:
+            with self._lock:
+                if self._closing:
+                    return
+                now = time.monotonic()
+                while self._respawns and self._respawns[0][0] <= now:
+                    _, index = heapq.heappop(self._respawns)
+                    self._workers.append(self._spawn(index))
+                workers = list(self._workers)
+                timeout = min([0.5] + [due - now for due, _ in self._respawns[:1]])
+            by_conn = {w.conn: w for w in workers}
+            by_sentinel = {w.process.sentinel: w for w in workers}
+            for ready in wait(list(by_conn) + list(by_sentinel), timeout=timeout):
+                # One bad reply or restart must not stop the monitor, or no
+                # later reply would ever be delivered.
+                try:
+                    self._handle(ready, by_conn, by_sentinel)
+                except Exception:
+                    traceback.print_exc()
+
+    def _handle(self, ready, by_conn, by_sentinel):
+        worker = by_conn.get(ready)
+        if worker is None:
+            self._replace(by_sentinel[ready])
+            return
+        try:
+            request_id, ok, value = ready.recv()
+        except (EOFError, OSError):
+            self._replace(worker)
+            return
+        with self._lock:
+            future, shm = worker.inflight.pop(request_id, (None, None))
+        _release(shm)
+        if future is not None:
+            _settle(future, ok, value if ok else InferenceWorkerError(value))
+
+    def _replace(self, worker):
+        with self._lock:
+            if self._closing or worker not in self._workers:
+                return
+            self._workers.remove(worker)
+            # Pop the calls under the lock so a failing submit() can't fail
+            # the same future again.
+            inflight = [worker.inflight.pop(request_id) for request_id in list(worker.inflight)]
+            # Back off when a worker dies straight after starting (bad
+            # settings, a model that can't load) instead of respawning in a
+            # tight loop. _watch() spawns it when due and keeps serving the
+            # other workers meanwhile.
+            delay = 1 if time.time() - worker.started_at < 5 else 0
+            heapq.heappush(self._respawns, (time.monotonic() + delay, worker.index))
+            self.restarts += 1
+        worker.process.join(timeout=1)
+        worker.conn.close()
+        error = InferenceWorkerError(
+            f"ml-worker-{worker.index} exited with code {worker.process.exitcode}"
+        )
+        for future, shm in inflight:
+            _release(shm)
+            _settle(future, False, error)
+
+    def close(self, timeout=10):
+        with self._lock:
+            self._closing = True
+            workers, self._workers = self._workers, []
+            self._respawns = []
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        if self._monitor is not None:
+            self._monitor.join()
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            for future, shm in worker.inflight.values():
+                _release(shm)
+                _settle(future, False, InferenceWorkerError("Inference pool closed"))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'threads_per_worker': self.threads_per_worker,
+                'restarts': self.restarts,
+                'restarting': len(self._respawns),
+                'workers': [
+                    {
+                        'pid': w.process.pid,
+                        'alive': w.process.is_alive(),
+                        'inflight': len(w.inflight),
+                        'started_at': w.started_at,
+                    }
+                    for w in self._workers
+                ],
+            }
+
+
+inference_pool = InferencePool(
+    workers=settings.ML_WORKER_POOL['WORKERS'],
+    threads_per_worker=settings.ML_WORKER_POOL['THREADS_PER_WORKER'],
+    pin=settings.ML_WORKER_POOL['PIN_THREADS'],
+)
@@ -0,0 +1,89 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.metrics import CACHE_INVALIDATIONS, CACHE_REQUESTS
+
+LIST_GENERATION_KEY = 'workflows:generation'
+
+
+def _generation(key):
+    generation = cache.get(key)
+    if generation is None:
+        # add() so concurrent first readers agree on the starting value.
+        cache.add(key, 1, timeout=None)
+        generation = cache.get(key, 1)
+    return generation
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, timeout=None)
+
+
+def detail_generation_key(pk):
+    return f'workflows:generation:{pk}'
+
+
+def invalidate_workflow(pk):
+    # Old keys are never deleted; bumping the generation makes every key
+    # built from it unreachable and they age out through CACHE_TTL.
+    _bump(LIST_GENERATION_KEY)
+    _bump(detail_generation_key(pk))
+    CACHE_INVALIDATIONS.inc(cache='workflows')
+
+
+def list_key(query_params):
+    params = sorted(
+        (key, value) for key in query_params for value in query_params.getlist(key)
+    )
+    digest = hashlib.sha1(urlencode(params).encode()).hexdigest()
+    return f'workflows:list:{_generation(LIST_GENERATION_KEY)}:{digest}'
+
+
+def detail_key(pk, fields=None):
+    # ?fields= trims the payload, so each field set is cached separately.
+    suffix = ','.join(sorted(fields)) if fields else 'all'
+    return f'workflows:detail:{pk}:{_generation(detail_generation_key(pk))}:{suffix}'
+
+
+def get_or_build(key, build, timeout=None):
+    """Read-through cache with stampede protection.
+
+    On a miss only the caller that wins the lock runs ``build()``; the rest
+    wait briefly for its result instead of all hitting the database at once.
+    """
+    timeout = timeout or settings.CACHE_TTL
+    value = cache.get(key)
+    if value is not None:
+        CACHE_REQUESTS.inc(cache='workflows', result='hit')
+        return value
+
+    lock_key = f'{key}:lock'
+    lock_timeout = settings.WORKFLOW_CACHE_LOCK_TIMEOUT
+    if cache.add(lock_key, 1, timeout=lock_timeout):
+        CACHE_REQUESTS.inc(cache='workflows', result='miss')
+        try:
+            value = build()
+            cache.set(key, value, timeout=timeout)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + lock_timeout
+    delay = 0.01
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        value = cache.get(key)
+        if value is not None:
+            CACHE_REQUESTS.inc(cache='workflows', result='waited')
+            return value
+        delay = min(delay * 2, 0.2)
+    # The lock holder died or is too slow; build without caching.
+    CACHE_REQUESTS.inc(cache='workflows', result='miss')
+    return build()
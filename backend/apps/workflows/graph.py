@@ -0,0 +1,312 @@
+import uuid
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .constants import VALID_TASK_CONNECTIONS
+from .models import Workflow, Task, Connection
+
+
+class GraphConflict(Exception):
+    def __init__(self, current_version):
+        super().__init__(f"Graph changed since version given (now {current_version})")
+        self.current_version = current_version
+
+
+class GraphTaskSerializer(serializers.Serializer):
+    id = serializers.UUIDField(required=False)
+    type = serializers.ChoiceField(choices=list(VALID_TASK_CONNECTIONS))
+    name = serializers.CharField(max_length=200)
+    config = serializers.JSONField(required=False, default=dict)
+    position_x = serializers.IntegerField()
+    position_y = serializers.IntegerField()
+
+
+class GraphConnectionSerializer(serializers.Serializer):
+    id = serializers.UUIDField(required=False)
+    source = serializers.UUIDField()
+    target = serializers.UUIDField()
+
+
+class GraphChangesSerializer(serializers.Serializer):
+    upsert = serializers.ListField(child=serializers.DictField(), required=False, default=list)
+    delete = serializers.ListField(child=serializers.UUIDField(), required=False, default=list)
+
+
+class GraphDiffSerializer(serializers.Serializer):
+    base_version = serializers.IntegerField(required=False)
+    tasks = GraphChangesSerializer(required=False, default=dict)
+    connections = GraphChangesSerializer(required=False, default=dict)
+
+    def validate(self, attrs):
+        for key, item_serializer in (('tasks', GraphTaskSerializer), ('connections', GraphConnectionSerializer)):
+            changes = attrs.get(key) or {}
+            items = item_serializer(data=changes.get('upsert', []), many=True)
+            if not items.is_valid():
+                raise serializers.ValidationError({key: items.errors})
+            attrs[key] = {'upsert': items.validated_data, 'delete': changes.get('delete', [])}
+        return attrs
+
+
+def _upsert(model, workflow, items, update_fields):
+    existing = set(
+        model.objects.filter(workflow=workflow, id__in=[i['id'] for i in items if 'id' in i])
+        .values_list('id', flat=True)
+    )
+    to_create, to_update = [], []
+    for item in items:
+        fields = {name: item[name] for name in update_fields}
+        if item.get('id') in existing:
+            to_update.append(model(id=item['id'], workflow=workflow, **fields))
+        else:
+            # Clients may choose ids for new nodes so connections in the same
+            # diff can refer to them.
+            kwargs = {'id': item['id']} if 'id' in item else {}
+            to_create.append(model(workflow=workflow, **kwargs, **fields))
+    model.objects.bulk_create(to_create)
+    if to_update:
+        model.objects.bulk_update(to_update, update_fields)
+    return len(to_create), len(to_update)
+
+
+def _valid_targets(task_type):
+    # Tasks saved as JSON may have types this version doesn't know.
+    return VALID_TASK_CONNECTIONS.get(task_type, {}).get('valid_targets', [])
+
+
+def _validate_connections(workflow, connections, deleted_task_ids):
+    if not connections:
+        return
+    task_types = dict(
+        Task.objects.filter(workflow=workflow)
+        .exclude(id__in=deleted_task_ids)
+        .values_list('id', 'type')
+    )
+    errors = []
+    for index, connection in enumerate(connections):
+        source_type = task_types.get(connection['source'])
+        target_type = task_types.get(connection['target'])
+        if source_type is None or target_type is None:
+            errors.append({index: "Connection references a task that is not in this workflow"})
+        elif target_type not in _valid_targets(source_type):
+            errors.append({index: f"Cannot connect {source_type} to {target_type}"})
+    if errors:
+        raise serializers.ValidationError({'connections': errors})
+
+
+def _row_ids(workflow, entries):
+    """Maps the ids a client gave tasks or connections to row ids.
+
+    UUIDs are used as they are; other ids (e.g. "node-1"), and UUIDs another
+    workflow's rows already use (a copied graph), map to stable UUIDs.
+    """
+    ids = {}
+    for entry in entries or []:
+        if isinstance(entry, dict) and entry.get('id') not in (None, ''):
+            try:
+                ids[str(entry['id'])] = uuid.UUID(str(entry['id']))
+            except ValueError:
+                ids[str(entry['id'])] = uuid.uuid5(workflow.id, str(entry['id']))
+    for model in (Task, Connection):
+        taken = set(
+            model.objects.filter(id__in=ids.values()).exclude(workflow=workflow)
+            .values_list('id', flat=True)
+        )
+        for client_id, row_id in ids.items():
+            if row_id in taken:
+                ids[client_id] = uuid.uuid5(workflow.id, client_id)
+    return ids
+
+
+def _position(entry):
+    position = entry.get('position')
+    if not isinstance(position, dict):
+        position = {}
+    try:
+        x = position.get('x', entry.get('position_x', 0))
+        y = position.get('y', entry.get('position_y', 0))
+        return int(round(float(x or 0))), int(round(float(y or 0)))
+    except (TypeError, ValueError):
+        return 0, 0
+
+
+def _previous_entries(workflow, entries):
+    # Row id -> (position in the saved list, the entry as the client sent it).
+    ids = _row_ids(workflow, entries)
+    return {
+        ids[str(entry['id'])]: (index, entry)
+        for index, entry in enumerate(entries or []) if _has_id(entry)
+    }
+
+
+def _in_saved_order(rows, previous):
+    # Rows keep the order the client saved them in; new ones go last.
+    def key(row):
+        return previous.get(row['id'], (len(previous),))[0], row['created_at']
+    return sorted(rows, key=key)
+
+
+def sync_workflow_json(workflow):
+    # Executions read the graph from Workflow.tasks/connections, so keep the
+    # JSON columns in step with the Task and Connection tables. Every path
+    # that edits the tables calls ensure_graph_rows() first. Entries the
+    # client saved keep their ids and any extra keys; only what the rows
+    # hold is written over.
+    previous = _previous_entries(workflow, workflow.tasks)
+    rows = Task.objects.filter(workflow=workflow).values(
+        'id', 'type', 'name', 'config', 'position_x', 'position_y', 'created_at'
+    )
+    client_ids, tasks = {}, []
+    for task in _in_saved_order(rows, previous):
+        entry = dict(previous[task['id']][1]) if task['id'] in previous else {'id': str(task['id'])}
+        entry.update(type=task['type'], name=task['name'], config=task['config'])
+        if _position(entry) != (task['position_x'], task['position_y']):
+            entry.pop('position_x', None)
+            entry.pop('position_y', None)
+            entry['position'] = {'x': task['position_x'], 'y': task['position_y']}
+        client_ids[task['id']] = entry['id']
+        tasks.append(entry)
+
+    previous = _previous_entries(workflow, workflow.connections)
+    rows = Connection.objects.filter(workflow=workflow).values(
+        'id', 'source_id', 'target_id', 'created_at'
+    )
+    connections = []
+    for connection in _in_saved_order(rows, previous):
+        entry = (
+            dict(previous[connection['id']][1]) if connection['id'] in previous
+            else {'id': str(connection['id'])}
+        )
+        entry.update(
+            source=client_ids[connection['source_id']],
+            target=client_ids[connection['target_id']],
+        )
+        connections.append(entry)
+    workflow.tasks, workflow.connections = tasks, connections
+
+
+def _has_id(entry):
+    return isinstance(entry, dict) and entry.get('id') not in (None, '')
+
+
+def store_graph_json(workflow):
+    """Replaces the workflow's Task and Connection rows with its JSON graph.
+
+    Used when a whole graph is saved through the workflow endpoint (and
+    before the first table edit of a workflow whose rows were never
+    written). The JSON itself is left exactly as the client sent it; entries
+    the tables can't hold (no type, a connection to a missing task) get no
+    row.
+    """
+    task_ids = _row_ids(workflow, workflow.tasks)
+    tasks, ids = [], {}
+    for entry in workflow.tasks or []:
+        if not isinstance(entry, dict) or not isinstance(entry.get('type'), str):
+            continue
+        task_id = task_ids[str(entry['id'])] if _has_id(entry) else uuid.uuid4()
+        if task_id in ids.values():
+            continue
+        if _has_id(entry):
+            ids[str(entry['id'])] = task_id
+        position_x, position_y = _position(entry)
+        tasks.append(Task(
+            id=task_id,
+            workflow=workflow,
+            type=entry['type'][:50],
+            name=str(entry.get('name') or entry['type'])[:200],
+            config=entry.get('config') if isinstance(entry.get('config'), dict) else {},
+            position_x=position_x,
+            position_y=position_y,
+        ))
+    connection_ids = _row_ids(workflow, workflow.connections)
+    connections, seen = [], set()
+    for entry in workflow.connections or []:
+        if not isinstance(entry, dict):
+            continue
+        source, target = ids.get(str(entry.get('source'))), ids.get(str(entry.get('target')))
+        connection_id = connection_ids[str(entry['id'])] if _has_id(entry) else uuid.uuid4()
+        if source is None or target is None or connection_id in seen:
+            continue
+        seen.add(connection_id)
+        connections.append(Connection(
+            id=connection_id, workflow=workflow, source_id=source, target_id=target
+        ))
+
+    # Deleting the tasks cascades to their connections.
+    Task.objects.filter(workflow=workflow).delete()
+    Connection.objects.filter(workflow=workflow).delete()
+    Task.objects.bulk_create(tasks)
+    Connection.objects.bulk_create(connections)
+
+
+def ensure_graph_rows(workflow):
+    # Workflows saved as JSON only (before the tables existed) get their rows
+    # written first, so a table edit never rebuilds the JSON from empty
+    # tables and wipes the graph.
+    has_json = bool(workflow.tasks or workflow.connections)
+    if has_json and not Task.objects.filter(workflow=workflow).exists():
+        store_graph_json(workflow)
+
+
+@transaction.atomic
+def apply_graph_diff(workflow_id, diff):
+    """Applies a whole editor graph diff in one transaction.
+
+    Deletes run first, then task upserts (so new connections can reference
+    new tasks), then connection edges are type-checked in one pass and
+    upserted. Returns the stats and the new graph version.
+    """
+    workflow = Workflow.objects.select_for_update().get(pk=workflow_id)
+    base_version = diff.get('base_version')
+    if base_version is not None and base_version != workflow.version:
+        raise GraphConflict(workflow.version)
+    ensure_graph_rows(workflow)
+
+    tasks, connections = diff['tasks'], diff['connections']
+    deleted_connections, _ = Connection.objects.filter(
+        workflow=workflow, id__in=connections['delete']
+    ).delete()
+    # Deleting a task cascades to its connections; count only the tasks.
+    _, deleted = Task.objects.filter(workflow=workflow, id__in=tasks['delete']).delete()
+    deleted_tasks = deleted.get(Task._meta.label, 0)
+
+    created_tasks, updated_tasks = _upsert(
+        Task, workflow, tasks['upsert'], ['type', 'name', 'config', 'position_x', 'position_y']
+    )
+    _validate_connections(workflow, connections['upsert'], tasks['delete'])
+    created_connections, updated_connections = _upsert(
+        Connection, workflow,
+        [
+            {**c, 'source_id': c['source'], 'target_id': c['target']}
+            for c in connections['upsert']
+        ],
+        ['source_id', 'target_id'],
+    )
+
+    sync_workflow_json(workflow)
+    workflow.version += 1
+    workflow.save()
+    return {
+        'version': workflow.version,
+        'tasks': {'created': created_tasks, 'updated': updated_tasks, 'deleted': deleted_tasks},
+        'connections': {
+            'created': created_connections,
+            'updated': updated_connections,
+            'deleted': deleted_connections,
+        },
+    }
+
+
+@transaction.atomic
+def prepare_graph_edit(workflow_id):
+    # Call before a single-item edit of the Task/Connection tables.
+    ensure_graph_rows(Workflow.objects.select_for_update().get(pk=workflow_id))
+
+
+@transaction.atomic
+def touch_graph(workflow_id):
+    workflow = Workflow.objects.select_for_update().get(pk=workflow_id)
+    sync_workflow_json(workflow)
+    workflow.version += 1
+    workflow.save()
+    return workflow.version
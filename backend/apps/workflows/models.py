@@ -1,8 +1,8 @@
 from django.db import models
 import uuid
-from django.core.cache import cache
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from .cache import invalidate_workflow
 
 class Workflow(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -20,6 +20,9 @@ class Workflow(models.Model):
         ],
         default='idle'
     )
+    # Bumped on every graph edit; clients send it back for optimistic
+    # concurrency control.
+    version = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -33,12 +36,6 @@ class Workflow(models.Model):
     def __str__(self):
         return self.name
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Invalidate cache
-        cache.delete(f'workflow_{self.id}')
-        cache.delete('workflow_list')
-        
 class Task(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     workflow = models.ForeignKey(Workflow, related_name='task_objects', on_delete=models.CASCADE)
@@ -58,6 +55,6 @@ class Connection(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 @receiver(post_save, sender=Workflow)
+@receiver(post_delete, sender=Workflow)
 def invalidate_workflow_cache(sender, instance, **kwargs):
-    cache.delete(f'workflow_{instance.id}')
-    cache.delete('workflow_list')
\ No newline at end of file
+    invalidate_workflow(instance.id)
\ No newline at end of file
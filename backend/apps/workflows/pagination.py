@@ -0,0 +1,47 @@
+from urllib.parse import parse_qs, urlsplit
+
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class WorkflowCursorPagination(CursorPagination):
+    # Keyset pagination over the created_at index: each page is a range scan
+    # from the cursor instead of an OFFSET that grows with the table.
+    ordering = '-created_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    # Cached pages keep only the cursor values: the links embed the host and
+    # query string of whoever built them, so they are rebuilt per request.
+    def get_cursors(self):
+        return {
+            'next': self._cursor(self.get_next_link()),
+            'previous': self._cursor(self.get_previous_link()),
+        }
+
+    def _cursor(self, link):
+        if link is None:
+            return None
+        return parse_qs(urlsplit(link).query).get(self.cursor_query_param, [''])[0]
+
+    def _link(self, url, cursor):
+        if cursor is None:
+            return None
+        if not cursor:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_cached_response(self, request, results, cursors):
+        url = request.build_absolute_uri()
+        return Response({
+            'next': self._link(url, cursors['next']),
+            'previous': self._link(url, cursors['previous']),
+            'results': results,
+        })
+
+
+class ExecutionCursorPagination(CursorPagination):
+    ordering = '-started_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
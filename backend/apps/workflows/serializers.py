@@ -1,20 +1,69 @@
+from django.db import transaction
 from rest_framework import serializers
+from .graph import store_graph_json
 from .models import Workflow, Task, Connection
 
-class WorkflowSerializer(serializers.ModelSerializer):
+# JSON columns that are only loaded and serialized when a client asks for them.
+LARGE_WORKFLOW_FIELDS = ('tasks', 'connections')
+
+
+def requested_fields(request):
+    if request is None:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetMixin:
+    """Trims the response to ``?fields=id,name,status`` when given."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+class WorkflowSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Workflow
         fields = '__all__'
-        read_only_fields = ('id', 'status', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'status', 'version', 'created_at', 'updated_at')
+
+    # The Task/Connection tables are the graph's source of truth for diffs
+    # and item edits; a whole graph saved here is stored as sent and its rows
+    # are rebuilt from it.
+    def create(self, validated_data):
+        with transaction.atomic():
+            workflow = super().create(validated_data)
+            store_graph_json(workflow)
+        return workflow
+
+    def update(self, instance, validated_data):
+        if not {'tasks', 'connections'} & set(validated_data):
+            return super().update(instance, validated_data)
+        with transaction.atomic():
+            validated_data['version'] = instance.version + 1
+            workflow = super().update(instance, validated_data)
+            store_graph_json(workflow)
+        return workflow
+
+class WorkflowListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Workflow
+        fields = ['id', 'name', 'description', 'status', 'version', 'created_at', 'updated_at']
+        read_only_fields = fields
 
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
         model = Task
         fields = ['id', 'type', 'name', 'config', 'position_x', 'position_y', 'workflow']
-        read_only_fields = ('id', 'created_at', 'updated_at')
+        read_only_fields = ('id', 'workflow', 'created_at', 'updated_at')
 
 class ConnectionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Connection
         fields = ['id', 'source', 'target', 'workflow']
-        read_only_fields = ('id', 'created_at')
\ No newline at end of file
+        read_only_fields = ('id', 'workflow', 'created_at')
\ No newline at end of file
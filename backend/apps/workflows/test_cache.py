@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from .models import Workflow
+
+
+class WorkflowListCacheTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create(username='reader'))
+        for name in ('one', 'two', 'three'):
+            Workflow.objects.create(name=name, tasks=[])
+
+    def test_cached_page_links_use_the_requesting_host(self):
+        first = self.client.get('/api/workflows/?page_size=1', HTTP_HOST='a.example').json()
+        second = self.client.get('/api/workflows/?page_size=1', HTTP_HOST='b.example').json()
+        self.assertEqual(first['results'], second['results'])
+        self.assertTrue(first['next'].startswith('http://a.example/api/workflows/?'))
+        self.assertTrue(second['next'].startswith('http://b.example/api/workflows/?'))
+        self.assertIsNone(second['previous'])
+
+        page = self.client.get(second['next'], HTTP_HOST='b.example').json()
+        self.assertEqual(page['results'][0]['name'], 'two')
+        self.assertTrue(page['previous'].startswith('http://b.example/'))
+        self.assertIn('page_size=1', page['next'])
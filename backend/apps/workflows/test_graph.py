@@ -0,0 +1,123 @@
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from rest_framework import serializers
+
+from .graph import GraphConflict, GraphDiffSerializer, apply_graph_diff
+from .models import Connection, Task, Workflow
+
+
+def task(task_type, **fields):
+    return {'type': task_type, 'name': task_type, 'position_x': 0, 'position_y': 0, **fields}
+
+
+class ApplyGraphDiffTests(TestCase):
+    def setUp(self):
+        self.workflow = Workflow.objects.create(name='graph', tasks=[])
+
+    def apply(self, diff):
+        serializer = GraphDiffSerializer(data=diff)
+        serializer.is_valid(raise_exception=True)
+        return apply_graph_diff(self.workflow.id, serializer.validated_data)
+
+    def test_upsert_creates_and_updates_tasks_and_connections(self):
+        scrape, email = str(uuid.uuid4()), str(uuid.uuid4())
+        result = self.apply({
+            'base_version': 0,
+            'tasks': {'upsert': [task('scraping', id=scrape), task('email', id=email)]},
+            'connections': {'upsert': [{'source': scrape, 'target': email}]},
+        })
+        self.assertEqual(result['version'], 1)
+        self.assertEqual(result['tasks']['created'], 2)
+        self.assertEqual(result['connections']['created'], 1)
+
+        result = self.apply({'tasks': {'upsert': [task('scraping', id=scrape, name='renamed')]}})
+        self.assertEqual(result['tasks'], {'created': 0, 'updated': 1, 'deleted': 0})
+        self.workflow.refresh_from_db()
+        self.assertEqual([t['name'] for t in self.workflow.tasks], ['renamed', 'email'])
+        self.assertEqual(self.workflow.connections[0]['source'], scrape)
+
+    def test_delete_task_removes_its_connections(self):
+        scrape, email = str(uuid.uuid4()), str(uuid.uuid4())
+        self.apply({
+            'tasks': {'upsert': [task('scraping', id=scrape), task('email', id=email)]},
+            'connections': {'upsert': [{'source': scrape, 'target': email}]},
+        })
+        result = self.apply({'tasks': {'delete': [email]}})
+        self.assertEqual(result['tasks']['deleted'], 1)
+        self.assertFalse(Connection.objects.filter(workflow=self.workflow).exists())
+        self.workflow.refresh_from_db()
+        self.assertEqual([t['id'] for t in self.workflow.tasks], [scrape])
+        self.assertEqual(self.workflow.connections, [])
+
+    def test_stale_base_version_conflicts(self):
+        self.apply({'tasks': {'upsert': [task('email')]}})
+        with self.assertRaises(GraphConflict) as raised:
+            self.apply({'base_version': 0, 'tasks': {'upsert': [task('email')]}})
+        self.assertEqual(raised.exception.current_version, 1)
+        self.assertEqual(Task.objects.filter(workflow=self.workflow).count(), 1)
+
+    def test_invalid_connection_rolls_back_the_diff(self):
+        email, scrape = str(uuid.uuid4()), str(uuid.uuid4())
+        with self.assertRaises(serializers.ValidationError):
+            # email has no valid targets.
+            self.apply({
+                'tasks': {'upsert': [task('email', id=email), task('scraping', id=scrape)]},
+                'connections': {'upsert': [{'source': email, 'target': scrape}]},
+            })
+        with self.assertRaises(serializers.ValidationError):
+            missing = str(uuid.uuid4())
+            self.apply({'connections': {'upsert': [{'source': email, 'target': missing}]}})
+        self.assertFalse(Task.objects.filter(workflow=self.workflow).exists())
+        self.workflow.refresh_from_db()
+        self.assertEqual(self.workflow.version, 0)
+
+    def test_diff_keeps_client_ids_of_a_saved_graph(self):
+        self.workflow.tasks = [
+            {'id': 'node-1', 'type': 'scraping', 'name': 's', 'data': 1,
+             'position': {'x': 1, 'y': 2}},
+            {'id': 'node-2', 'type': 'email', 'name': 'e', 'position': {'x': 3, 'y': 4}},
+        ]
+        self.workflow.connections = [{'id': 'edge-1', 'source': 'node-1', 'target': 'node-2'}]
+        self.workflow.save()
+        self.apply({'tasks': {'upsert': [task('summarization')]}})
+        self.workflow.refresh_from_db()
+        self.assertEqual([t['id'] for t in self.workflow.tasks][:2], ['node-1', 'node-2'])
+        self.assertEqual(self.workflow.tasks[0]['data'], 1)
+        self.assertEqual(len(self.workflow.tasks), 3)
+        self.assertEqual(
+            self.workflow.connections, [{'id': 'edge-1', 'source': 'node-1', 'target': 'node-2'}]
+        )
+
+
+class WorkflowSaveTests(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create(username='editor'))
+
+    def test_put_keeps_the_json_as_sent(self):
+        tasks = [
+            {'id': 'node-1', 'type': 'scraping', 'position': {'x': 1.5, 'y': 2}, 'data': {'a': 1}},
+            {'id': 'node-2', 'type': 'custom', 'position': {'x': 3, 'y': 4}},
+        ]
+        connections = [{'id': 'edge-1', 'source': 'node-1', 'target': 'node-2', 'animated': True}]
+        workflow = Workflow.objects.create(name='w', tasks=[])
+        response = self.client.put(
+            f'/api/workflows/{workflow.id}/',
+            {'name': 'w', 'tasks': tasks, 'connections': connections},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['tasks'], tasks)
+        self.assertEqual(response.json()['connections'], connections)
+        self.assertEqual(Task.objects.filter(workflow=workflow).count(), 2)
+        self.assertEqual(Connection.objects.filter(workflow=workflow).count(), 1)
+
+    def test_execute_rejects_a_malformed_graph(self):
+        workflow = Workflow.objects.create(
+            name='w', tasks=[{'type': 'scraping'}], connections=['node-1'],
+        )
+        response = self.client.post(
+            f'/api/workflows/{workflow.id}/execute/', {}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 400, response.content)
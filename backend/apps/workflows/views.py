@@ -1,11 +1,32 @@
+import json
+import shutil
+import uuid
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
 from rest_framework import viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.core.cache import cache
-from django.conf import settings
-from .models import Workflow
-from .serializers import WorkflowSerializer, TaskSerializer, ConnectionSerializer
-from apps.executions.tasks import execute_workflow
+from rest_framework.permissions import BasePermission
+from .models import Workflow, Task, Connection
+from .graph import (
+    GraphConflict, GraphDiffSerializer, apply_graph_diff, prepare_graph_edit, touch_graph,
+)
+from . import cache
+from .serializers import (
+    WorkflowSerializer, WorkflowListSerializer, TaskSerializer, ConnectionSerializer,
+    LARGE_WORKFLOW_FIELDS, requested_fields,
+)
+from .pagination import WorkflowCursorPagination, ExecutionCursorPagination
+from apps.executions.models import WorkflowExecution
+from apps.executions.serializers import WorkflowExecutionListSerializer
+from apps.executions.dag import TASK_METHODS, WorkflowGraphError
+from apps.executions.plan import get_plan, validate_config
+from apps.executions.scheduler import Overloaded, scheduler
+from apps.executions.batch import BatchInputError, batch_dir, create_batch_run, detect_format
+from apps.executions.tasks import aenqueue_workflow, enqueue_batch
+from apps.ml.registry import MODEL_SPECS, serves_models
 from .constants import VALID_TASK_CONNECTIONS
 
 
@@ -15,90 +36,258 @@ class WorkflowViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status']
     search_fields = ['name', 'description']
     ordering_fields = ['created_at', 'updated_at']
+    pagination_class = WorkflowCursorPagination
 
-    def get_queryset(self):
+    def get_serializer_class(self):
         if self.action == 'list':
-            cache_key = 'workflow_list'
-            queryset = cache.get(cache_key)
-            if queryset is None:
-                queryset = super().get_queryset()
-                cache.set(cache_key, queryset, timeout=settings.CACHE_TTL)
-            return queryset
-        return super().get_queryset()
-
-    def get_object(self):
-        obj = cache.get(f'workflow_{self.kwargs["pk"]}')
-        if obj is None:
-            obj = super().get_object()
-            cache.set(f'workflow_{obj.id}', obj, timeout=settings.CACHE_TTL)
-        return obj
+            requested = requested_fields(self.request)
+            if not requested or requested <= set(WorkflowListSerializer.Meta.fields):
+                return WorkflowListSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            requested = requested_fields(self.request)
+            if self.action == 'list' and requested is None:
+                requested = set()
+            if requested is not None:
+                deferred = [name for name in LARGE_WORKFLOW_FIELDS if name not in requested]
+                if deferred:
+                    queryset = queryset.defer(*deferred)
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        # Cache the serialized page and its cursors, keyed by every query
+        # parameter (filter, search, ordering, page) and the list generation.
+        def build():
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            serializer = self.get_serializer(page, many=True)
+            return {'results': serializer.data, 'cursors': self.paginator.get_cursors()}
+
+        payload = cache.get_or_build(cache.list_key(request.query_params), build)
+        return self.paginator.get_cached_response(
+            request, payload['results'], payload['cursors']
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if self._has_object_permissions():
+            return super().retrieve(request, *args, **kwargs)
+        payload = cache.get_or_build(
+            cache.detail_key(kwargs['pk'], requested_fields(request)),
+            lambda: super(WorkflowViewSet, self).retrieve(request, *args, **kwargs).data,
+        )
+        return Response(payload)
+
+    def _has_object_permissions(self):
+        # View-level permissions already ran in initial(). Object-level ones
+        # need the instance, so skip the cache if any class implements them.
+        return any(
+            type(permission).has_object_permission is not BasePermission.has_object_permission
+            for permission in self.get_permissions()
+        )
+
+    @action(detail=True, methods=['get'])
+    def executions(self, request, pk=None):
+        # Run history, newest first, paged by started_at over the
+        # (workflow, started_at) index. Logs are left out unless requested
+        # with ?fields=...,logs.
+        queryset = WorkflowExecution.objects.filter(workflow_id=pk)
+        requested = requested_fields(request)
+        if requested and 'logs' in requested:
+            queryset = queryset.prefetch_related('events')
+        else:
+            queryset = queryset.defer('logs')
+        paginator = ExecutionCursorPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = WorkflowExecutionListSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post'])
-    def execute(self, request, pk=None):
+    def graph(self, request, pk=None):
+        serializer = GraphDiffSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            result = apply_graph_diff(pk, serializer.validated_data)
+        except Workflow.DoesNotExist:
+            return Response({'detail': 'Not found.'}, status=404)
+        except GraphConflict as e:
+            return Response({'detail': str(e), 'version': e.current_version}, status=409)
+        return Response(result)
+
+    @action(detail=True, methods=['post'])
+    def batch(self, request, pk=None):
+        # multipart: `file` (CSV or JSONL), `bindings` (JSON object of
+        # "<task id>.<field>": "<column>"), optional `format`,
+        # `output_format` ("jsonl" or "parquet") and `concurrency`.
         workflow = self.get_object()
-        execution = execute_workflow.delay(str(workflow.id))
-        return Response({
-            'execution_id': execution.id,
-            'status': 'started'
-        })
-    
-    @action(detail=False, methods=['POST'])
-    async def execute_task(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'file is required'}, status=400)
+        bindings = request.data.get('bindings')
         try:
-            node_id = request.data.get('nodeId')
-            task_type = request.data.get('type')
-            config = request.data.get('config')
-            
-            # Map frontend task types to service method names
-            method_mapping = {
-                'scraping': 'scrape_web',
-                'summarization': 'summarize_text',
-                'classification': 'classify_image',
-                'email': 'send_email'
-            }
-            
-            # Get the correct method name
-            method_name = method_mapping.get(task_type)
-            if not method_name:
-                return Response({
-                    'nodeId': node_id,
-                    'error': f'Invalid task type: {task_type}',
-                    'status': 'error'
-                }, status=400)
-
-            # Initialize ML service and execute
-            ml_service = MLService()
-            result = await getattr(ml_service, method_name)(config)
-            
-            return Response({
-                'nodeId': node_id,
-                'result': result,
-                'status': 'success'
-            })
+            if isinstance(bindings, str):
+                bindings = json.loads(bindings)
+            concurrency = int(request.data.get('concurrency') or 0)
+        except ValueError as e:
+            return Response({'error': f'Invalid bindings or concurrency: {e}'}, status=400)
 
-        except Exception as e:
-            return Response({
-                'nodeId': node_id,
-                'error': str(e),
-                'status': 'error'
-            }, status=400)
+        batch_id = uuid.uuid4()
+        directory = batch_dir(batch_id)
+        try:
+            input_format = detect_format(upload.name, request.data.get('format'))
+            directory.mkdir(parents=True, exist_ok=True)
+            input_path = directory / f'input.{input_format}'
+            with open(input_path, 'wb') as f:
+                for chunk in upload.chunks():
+                    f.write(chunk)
+            batch = create_batch_run(
+                workflow, bindings, input_path,
+                input_format=input_format,
+                output_format=request.data.get('output_format'),
+                concurrency=concurrency,
+                batch_id=batch_id,
+            )
+        except (BatchInputError, WorkflowGraphError) as e:
+            shutil.rmtree(directory, ignore_errors=True)
+            return Response({'error': str(e)}, status=400)
+        job = enqueue_batch(batch)
+        return Response({'batch_id': batch.id, 'job_id': job.id, 'status': 'queued'}, status=202)
+
+class GraphItemViewSet(viewsets.ModelViewSet):
+    # Single-item edits for the editor; use the workflow `graph` action to
+    # save many changes in one request.
+    def perform_create(self, serializer):
+        prepare_graph_edit(self.kwargs['workflow_pk'])
+        serializer.save(workflow_id=self.kwargs['workflow_pk'])
+        touch_graph(self.kwargs['workflow_pk'])
+
+    def perform_update(self, serializer):
+        prepare_graph_edit(self.kwargs['workflow_pk'])
+        serializer.save()
+        touch_graph(self.kwargs['workflow_pk'])
 
-class TaskViewSet(viewsets.ModelViewSet):
+    def perform_destroy(self, instance):
+        prepare_graph_edit(self.kwargs['workflow_pk'])
+        instance.delete()
+        touch_graph(self.kwargs['workflow_pk'])
+
+class TaskViewSet(GraphItemViewSet):
     serializer_class = TaskSerializer
 
     def get_queryset(self):
         return Task.objects.filter(workflow_id=self.kwargs['workflow_pk'])
 
-    def perform_create(self, serializer):
-        workflow = Workflow.objects.get(pk=self.kwargs['workflow_pk'])
-        serializer.save(workflow=workflow)
-
-class ConnectionViewSet(viewsets.ModelViewSet):
+class ConnectionViewSet(GraphItemViewSet):
     serializer_class = ConnectionSerializer
 
     def get_queryset(self):
         return Connection.objects.filter(workflow_id=self.kwargs['workflow_pk'])
 
-    def perform_create(self, serializer):
-        workflow = Workflow.objects.get(pk=self.kwargs['workflow_pk'])
-        serializer.save(workflow=workflow)
\ No newline at end of file
+
+# The execute endpoints are plain async Django views rather than viewset
+# actions: DRF runs its views synchronously, so under ASGI an action would
+# hold a thread for the whole ML call. These run on the event loop and only
+# use the async ORM; they check the session the way the API's
+# IsAuthenticated default does.
+
+def _request_data(request):
+    if request.content_type == 'application/json':
+        data = json.loads(request.body or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError('Expected a JSON object')
+        return data
+    return request.POST.dict()
+
+
+@require_POST
+async def execute_workflow(request, pk):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+    try:
+        data = _request_data(request)
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid request body: {e}'}, status=400)
+    try:
+        workflow = await Workflow.objects.aget(id=pk)
+    except Workflow.DoesNotExist:
+        return JsonResponse({'detail': 'Not found.'}, status=404)
+    try:
+        # Reject malformed graphs and configs before queueing a run.
+        get_plan(workflow)
+    except WorkflowGraphError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    # {"full": true} recomputes every node instead of reusing results
+    # from earlier runs.
+    incremental = False if data.get('full') else None
+    execution, job = await aenqueue_workflow(workflow, incremental=incremental)
+    return JsonResponse({
+        'execution_id': execution.id,
+        'job_id': job.id,
+        'status': 'queued'
+    }, status=202)
+
+
+@require_POST
+async def execute_task(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=403)
+    node_id = None
+    try:
+        data = _request_data(request)
+        node_id = data.get('nodeId')
+        task_type = data.get('type')
+        config = data.get('config')
+
+        method_name = TASK_METHODS.get(task_type)
+        if not method_name:
+            return JsonResponse({
+                'nodeId': node_id,
+                'error': f'Invalid task type: {task_type}',
+                'status': 'error'
+            }, status=400)
+        validate_config(task_type, config)
+        if task_type in MODEL_SPECS and not serves_models():
+            # API-only process: models run on the job workers, so run this
+            # task as part of a workflow instead.
+            return JsonResponse({
+                'nodeId': node_id,
+                'error': f'{task_type} is not served by this process',
+                'status': 'error'
+            }, status=503)
+
+        from apps.ml.services import MLService, aclose_for_loop
+        ml_service = MLService()
+        client = f"client:{request.META.get('REMOTE_ADDR')}"
+        try:
+            async with scheduler.slot(task_type, key=client, reject=True):
+                result = await getattr(ml_service, method_name)(config)
+        finally:
+            if isinstance(request, WSGIRequest):
+                # Under WSGI every async view gets its own event loop, so the
+                # HTTP clients opened on it must be closed before it goes.
+                await aclose_for_loop()
+
+        return JsonResponse({
+            'nodeId': node_id,
+            'result': result,
+            'status': 'success'
+        })
+
+    except Overloaded as e:
+        response = JsonResponse({
+            'nodeId': node_id,
+            'error': str(e),
+            'status': 'error',
+            'retry_after': round(e.retry_after, 1)
+        }, status=429)
+        response['Retry-After'] = str(max(1, round(e.retry_after)))
+        return response
+    except Exception as e:
+        return JsonResponse({
+            'nodeId': node_id,
+            'error': str(e),
+            'status': 'error'
+        }, status=400)
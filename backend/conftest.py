@@ -0,0 +1,22 @@
+import os
+
+import django
+import pytest
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+django.setup()
+
+
+@pytest.fixture(scope='session', autouse=True)
+def django_test_databases():
+    # The tests are Django TestCases; give them the test databases that
+    # `manage.py test` would create.
+    from django.test.utils import (
+        setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+    )
+
+    setup_test_environment()
+    databases = setup_databases(verbosity=0, interactive=False)
+    yield
+    teardown_databases(databases, verbosity=0)
+    teardown_test_environment()
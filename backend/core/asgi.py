@@ -3,4 +3,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
-application = get_asgi_application()
\ No newline at end of file
+application = get_asgi_application()
+
+from apps.ml.registry import warm_up
+
+warm_up()
@@ -0,0 +1,304 @@
+import cProfile
+import hmac
+import random
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import Http404, HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if len(labels) != len(self.labels):
+            raise ValueError(f"{self.name} takes labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, values, extra, value in self.samples():
+            labels = _format_labels(self.labels, values, extra)
+            lines.append(f'{self.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [('', key, (), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down.
+
+    With ``collect``, values are read when metrics are rendered instead:
+    it returns ``(label values, value)`` pairs.
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=(), collect=None):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.collect is not None:
+            values = sorted((tuple(map(str, key)), value) for key, value in self.collect())
+        else:
+            with self._lock:
+                values = sorted(self._values.items())
+        return [('', key, (), value) for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, then sum and count.
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(
+                (key, (list(counts), total, count))
+                for key, (counts, total, count) in self._values.items()
+            )
+        samples = []
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                samples.append(('_bucket', key, (('le', _format_value(float(bound))),), cumulative))
+            samples.append(('_bucket', key, (('le', '+Inf'),), count))
+            samples.append(('_sum', key, (), total))
+            samples.append(('_count', key, (), count))
+        return samples
+
+
+class MetricsRegistry:
+    """In-process metrics, rendered in the Prometheus text format.
+
+    Every process (web worker, ``runworkers``) keeps its own values, so each
+    one is scraped separately.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif type(metric) is not cls:
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter, name, documentation, labels)
+
+    def gauge(self, name, documentation, labels=(), collect=None):
+        return self._register(Gauge, name, documentation, labels, collect=collect)
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labels, buckets=buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        return '\n'.join(metric.render() for _, metric in metrics) + '\n'
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter(
+    'http_requests_total', 'HTTP requests by view, method and status', ['view', 'method', 'status']
+)
+HTTP_REQUEST_SECONDS = metrics.histogram(
+    'http_request_duration_seconds', 'HTTP request latency by view', ['view', 'method']
+)
+DB_QUERY_SECONDS = metrics.histogram(
+    'db_query_duration_seconds',
+    'Database statements and their time, including waits on SQLite write locks',
+    ['alias', 'statement'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+CACHE_REQUESTS = metrics.counter(
+    'cache_requests_total', 'Cache lookups by cache and outcome', ['cache', 'result']
+)
+CACHE_INVALIDATIONS = metrics.counter(
+    'cache_invalidations_total', 'Cache invalidations (generation bumps)', ['cache']
+)
+
+
+def _query_metrics(execute, sql, params, many, context):
+    statement = sql.lstrip().split(None, 1)[0].upper() if sql else 'UNKNOWN'
+    alias = context['connection'].alias
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - started, alias=alias, statement=statement)
+
+
+def instrument_connection(connection, **kwargs):
+    if _query_metrics not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_metrics)
+
+
+# Connections opened from here on are counted; so is any already open.
+connection_created.connect(instrument_connection)
+for _connection in connections.all(initialized_only=True):
+    instrument_connection(_connection)
+
+
+def authorized(header):
+    token = settings.METRICS['TOKEN']
+    if not token:
+        return True
+    return hmac.compare_digest((header or '').encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    if not settings.METRICS['ENABLED']:
+        raise Http404
+    if not authorized(request.headers.get('Authorization')):
+        return HttpResponse('Unauthorized', status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if not authorized(self.headers.get('Authorization')):
+            self.send_response(401)
+            self.send_header('WWW-Authenticate', 'Bearer')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, address='0.0.0.0'):
+    # For processes without a web server of their own (runworkers).
+    server = ThreadingHTTPServer((address, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+@contextmanager
+def sampled_profile(name, rate=None):
+    """Profiles the block with cProfile for a ``rate`` fraction of calls.
+
+    Yields the path the stats will be written to, or None when this call
+    isn't sampled. cProfile only sees the current thread, so work handed to
+    other threads (batched inference, the apps.ml.executors pools) shows up
+    as time spent waiting.
+    """
+    rate = settings.METRICS['PROFILE_SAMPLE_RATE'] if rate is None else rate
+    if not rate or random.random() >= rate:
+        yield None
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active in this thread.
+        yield None
+        return
+    path = Path(settings.METRICS['PROFILE_DIR']) / f'{name}.prof'
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(path)
@@ -0,0 +1,37 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import HTTP_REQUEST_SECONDS, HTTP_REQUESTS
+
+
+class MetricsMiddleware:
+    # Request counts and latency per resolved view name (e.g.
+    # "workflow-execute"), which keeps label values bounded unlike raw paths.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    async def _acall(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self._record(request, response, started)
+        return response
+
+    def _record(self, request, response, started):
+        match = request.resolver_match
+        view = (match.view_name or match.route) if match is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, view=view, method=request.method)
+        HTTP_REQUESTS.inc(view=view, method=request.method, status=response.status_code)
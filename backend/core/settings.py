@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from datetime import timedelta
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -29,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -60,12 +62,56 @@ TEMPLATES = [
 WSGI_APPLICATION = 'core.wsgi.application'
 
 
-#SQLite Configuration
-DATABASES = {
-   'default': {
-       'ENGINE': 'django.db.backends.sqlite3',
-       'NAME': BASE_DIR / 'db.sqlite3',
-   }
+# Database. DB_ENGINE is "sqlite" (default) or "postgres" (the POSTGRES_*
+# variables; needs psycopg2). Connections are kept open for DB_CONN_MAX_AGE
+# seconds (0 closes them after every request) and health-checked on reuse.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'workflow_db'),
+            'USER': os.getenv('POSTGRES_USER', 'workflow_user'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('POSTGRES_HOST', 'localhost'),
+            'PORT': os.getenv('POSTGRES_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': int(os.getenv('POSTGRES_CONNECT_TIMEOUT', '10'))},
+        }
+    }
+else:
+    # core.sqlite3 is Django's SQLite backend plus the SQLITE settings below.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+        }
+    }
+
+# SQLite tuning for concurrent writers (web requests, job workers). PRAGMAS
+# run on every new connection: WAL lets readers work during a write,
+# synchronous=NORMAL skips most fsyncs and is still safe in WAL mode (a power
+# loss can drop the latest commits, never corrupt the file), busy_timeout
+# (ms) waits for the write lock instead of failing with "database is
+# locked", and mmap_size/cache_size (KiB when negative) keep hot pages in
+# memory. TRANSACTION_MODE "IMMEDIATE" makes atomic blocks take
+# the write lock when they start, so one that reads and then writes waits
+# its turn rather than failing on the upgrade.
+SQLITE = {
+    'PRAGMAS': {
+        'journal_mode': os.getenv('SQLITE_JOURNAL_MODE', 'WAL'),
+        'synchronous': os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'),
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '20000')),
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', '-65536')),
+        'temp_store': os.getenv('SQLITE_TEMP_STORE', 'MEMORY'),
+    },
+    'TRANSACTION_MODE': os.getenv('SQLITE_TRANSACTION_MODE', 'IMMEDIATE'),
 }
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -107,10 +153,272 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10
 }
 
+# Cache generations must be shared by every process (the API, runworkers),
+# or a bump in one never reaches the others: use Redis when REDIS_URL is set
+# (install requirements-redis.txt) and otherwise a file-based cache in
+# CACHE_DIR, which processes on one host share.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv(
+                'CACHE_DIR', os.path.join(tempfile.gettempdir(), 'taskautomation-cache')
+            ),
+        }
+    }
+CACHE_TTL = int(os.getenv('CACHE_TTL', '300'))
+WORKFLOW_CACHE_LOCK_TIMEOUT = float(os.getenv('WORKFLOW_CACHE_LOCK_TIMEOUT', '5'))
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 CORS_ALLOW_CREDENTIALS = True
 
 # ML Service settings
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+
+# Models are loaded lazily per process. List task types here (e.g.
+# "summarization,classification") to load them when a web or job worker
+# starts, and set an idle timeout in seconds to free models that haven't been
+# used.
+ML_WARMUP_MODELS = [m for m in os.getenv('ML_WARMUP_MODELS', '').split(',') if m]
+ML_MODEL_IDLE_TIMEOUT = int(os.getenv('ML_MODEL_IDLE_TIMEOUT', '0')) or None
+
+# What this process is for. "all" serves the API and runs models in-process.
+# "api" never loads a model or imports torch/transformers: workflows still
+# run on the job workers, but execute_task answers 503 for model tasks.
+# "inference" is for `runworkers` processes that run the model lanes; they
+# load every model on start unless ML_WARMUP_MODELS says otherwise.
+ML_PROCESS_ROLE = os.getenv('ML_PROCESS_ROLE', 'all')
+
+# Concurrent summarization/classification calls with the same config are
+# grouped into one batched forward pass. A batch is flushed once it holds
+# ML_BATCH_MAX_SIZE inputs or its oldest input has waited ML_BATCH_MAX_LATENCY
+# seconds.
+ML_BATCHING_ENABLED = os.getenv('ML_BATCHING_ENABLED', 'True') == 'True'
+ML_BATCH_MAX_SIZE = int(os.getenv('ML_BATCH_MAX_SIZE', '8'))
+ML_BATCH_MAX_LATENCY = float(os.getenv('ML_BATCH_MAX_LATENCY', '0.01'))
+
+# Run inference in separate worker processes (each loads its own copy of the
+# models it serves) instead of threads of the web/queue process. WORKERS=0
+# uses one worker per THREADS_PER_WORKER cores; PIN_THREADS pins each worker
+# to its own cores.
+ML_WORKER_POOL = {
+    'ENABLED': os.getenv('ML_WORKER_POOL_ENABLED', 'False') == 'True',
+    'WORKERS': int(os.getenv('ML_WORKER_POOL_WORKERS', '0')),
+    'THREADS_PER_WORKER': int(os.getenv('ML_WORKER_POOL_THREADS_PER_WORKER', '2')),
+    'PIN_THREADS': os.getenv('ML_WORKER_POOL_PIN_THREADS', 'True') == 'True',
+}
+
+# Summarization/classification results are cached by a hash of task type,
+# model, normalized input and config. BACKEND is "memory" (per-process LRU),
+# "django" (the default Django cache) or "sqlite" (on-disk, shared by local
+# processes).
+ML_RESULT_CACHE = {
+    'ENABLED': os.getenv('ML_RESULT_CACHE_ENABLED', 'True') == 'True',
+    'BACKEND': os.getenv('ML_RESULT_CACHE_BACKEND', 'memory'),
+    'TTL': int(os.getenv('ML_RESULT_CACHE_TTL', '3600')),
+    'MAX_ENTRIES': int(os.getenv('ML_RESULT_CACHE_MAX_ENTRIES', '1024')),
+}
+
+# Concurrent calls of these task types with the same normalized config share
+# one computation and its result or error. Set CACHE to a cache alias to
+# coordinate across processes too (needs a shared cache such as Redis);
+# LOCK_TIMEOUT bounds how long other processes wait on a stuck leader.
+ML_SINGLE_FLIGHT = {
+    'ENABLED': os.getenv('ML_SINGLE_FLIGHT_ENABLED', 'True') == 'True',
+    'TASKS': os.getenv('ML_SINGLE_FLIGHT_TASKS', 'scraping,summarization,classification').split(','),
+    'CACHE': os.getenv('ML_SINGLE_FLIGHT_CACHE', ''),
+    'LOCK_TIMEOUT': int(os.getenv('ML_SINGLE_FLIGHT_LOCK_TIMEOUT', '300')),
+    'POLL_INTERVAL': float(os.getenv('ML_SINGLE_FLIGHT_POLL_INTERVAL', '0.05')),
+    'RESULT_TTL': int(os.getenv('ML_SINGLE_FLIGHT_RESULT_TTL', '30')),
+}
+
+# Maximum number of workflow nodes executed at the same time within one run.
+WORKFLOW_MAX_CONCURRENCY = int(os.getenv('WORKFLOW_MAX_CONCURRENCY', '4'))
+
+# Compiled execution plans kept per process, keyed by workflow and updated_at.
+WORKFLOW_PLAN_CACHE_SIZE = int(os.getenv('WORKFLOW_PLAN_CACHE_SIZE', '256'))
+
+# Incremental re-execution: a node whose type, config and upstream outputs
+# match a node from an earlier run of the same workflow reuses that result.
+# KEEP_PER_TASK bounds how many stored results each node keeps.
+WORKFLOW_INCREMENTAL = {
+    'ENABLED': os.getenv('WORKFLOW_INCREMENTAL_ENABLED', 'True') == 'True',
+    'KEEP_PER_TASK': int(os.getenv('WORKFLOW_INCREMENTAL_KEEP_PER_TASK', '5')),
+}
+
+# Process-wide limits on running tasks, shared by every workflow run and
+# execute_task call. LIMITS caps concurrently running tasks per type; RATES
+# are token buckets (tasks per second, burst) for outbound traffic. Waiting
+# tasks are served round-robin across workflows, and execute_task answers
+# 429 once more than MAX_QUEUE calls of a type are waiting.
+TASK_SCHEDULER = {
+    'LIMITS': {
+        'summarization': int(os.getenv('SCHEDULER_SUMMARIZATION_LIMIT', '8')),
+        'classification': int(os.getenv('SCHEDULER_CLASSIFICATION_LIMIT', '8')),
+        'scraping': int(os.getenv('SCHEDULER_SCRAPING_LIMIT', '16')),
+        'email': int(os.getenv('SCHEDULER_EMAIL_LIMIT', '4')),
+    },
+    'RATES': {
+        'scraping': (
+            float(os.getenv('SCHEDULER_SCRAPING_RATE', '10')),
+            int(os.getenv('SCHEDULER_SCRAPING_BURST', '20')),
+        ),
+        'email': (
+            float(os.getenv('SCHEDULER_EMAIL_RATE', '1')),
+            int(os.getenv('SCHEDULER_EMAIL_BURST', '5')),
+        ),
+    },
+    'MAX_QUEUE': int(os.getenv('SCHEDULER_MAX_QUEUE', '50')),
+}
+
+# Intra-op threads torch may use. 0 splits the cores between the inference
+# threads that can run at once (one per model when batching).
+ML_TORCH_THREADS = int(os.getenv('ML_TORCH_THREADS', '0'))
+
+# Thread pools that services hand blocking work to, sized per kind of work:
+# INFERENCE runs unbatched model calls, CPU parses HTML and tokenizes, IO
+# reads and writes files and loads tokenizers. 0 picks a default (INFERENCE:
+# the scheduler's summarization + classification limits, CPU: one per core,
+# IO: 16).
+ML_EXECUTORS = {
+    'INFERENCE': int(os.getenv('ML_EXECUTOR_INFERENCE', '0')),
+    'CPU': int(os.getenv('ML_EXECUTOR_CPU', '0')),
+    'IO': int(os.getenv('ML_EXECUTOR_IO', '0')),
+}
+
+# Prometheus-style metrics at /metrics (per process; `runworkers
+# --metrics-port` serves the job workers' own). Off unless enabled; with a
+# TOKEN set, scrapers must send `Authorization: Bearer <token>`. A
+# PROFILE_SAMPLE_RATE fraction of workflow executions run under cProfile,
+# with stats written to PROFILE_DIR/<execution id>.prof.
+METRICS = {
+    'ENABLED': os.getenv('METRICS_ENABLED', 'False') == 'True',
+    'TOKEN': os.getenv('METRICS_TOKEN', ''),
+    'PROFILE_SAMPLE_RATE': float(os.getenv('METRICS_PROFILE_SAMPLE_RATE', '0')),
+    'PROFILE_DIR': os.getenv('METRICS_PROFILE_DIR', str(BASE_DIR / 'profiles')),
+}
+
+# Execution log events are buffered and written with one bulk INSERT per
+# batch instead of re-saving the execution row after every task.
+EXECUTION_EVENT_BATCH_SIZE = int(os.getenv('EXECUTION_EVENT_BATCH_SIZE', '50'))
+EXECUTION_EVENT_FLUSH_INTERVAL = float(os.getenv('EXECUTION_EVENT_FLUSH_INTERVAL', '1.0'))
+
+# Web scraping. PARSER is "lxml", "html.parser" or "selectolax"; optional
+# parsers fall back to html.parser when they aren't installed.
+SCRAPER = {
+    'PARSER': os.getenv('SCRAPER_PARSER', 'lxml'),
+    'TIMEOUT': float(os.getenv('SCRAPER_TIMEOUT', '10')),
+    'MAX_CONNECTIONS': int(os.getenv('SCRAPER_MAX_CONNECTIONS', '100')),
+    'MAX_CONNECTIONS_PER_HOST': int(os.getenv('SCRAPER_MAX_CONNECTIONS_PER_HOST', '6')),
+    'CONDITIONAL_CACHE_ENTRIES': int(os.getenv('SCRAPER_CONDITIONAL_CACHE_ENTRIES', '256')),
+}
+
+# Background job queue, stored in the database (no broker needed). Run the
+# workers with `python manage.py runworkers`. LANES maps each lane to its
+# number of worker threads; TASK_LANES decides which lane a workflow goes to.
+# Every SWEEP_INTERVAL seconds, jobs whose lease expired with no attempts
+# left are marked failed.
+JOB_QUEUE = {
+    'LANES': {
+        'inference': int(os.getenv('JOB_QUEUE_INFERENCE_WORKERS', '1')),
+        'io': int(os.getenv('JOB_QUEUE_IO_WORKERS', '4')),
+        'default': int(os.getenv('JOB_QUEUE_DEFAULT_WORKERS', '2')),
+    },
+    'TASK_LANES': {
+        'summarization': 'inference',
+        'classification': 'inference',
+        'scraping': 'io',
+        'email': 'io',
+    },
+    'LEASE_SECONDS': int(os.getenv('JOB_QUEUE_LEASE_SECONDS', '300')),
+    'MAX_ATTEMPTS': int(os.getenv('JOB_QUEUE_MAX_ATTEMPTS', '3')),
+    'RETRY_BACKOFF': float(os.getenv('JOB_QUEUE_RETRY_BACKOFF', '5')),
+    'POLL_INTERVAL': float(os.getenv('JOB_QUEUE_POLL_INTERVAL', '1.0')),
+    'SWEEP_INTERVAL': float(os.getenv('JOB_QUEUE_SWEEP_INTERVAL', '30')),
+}
+
+# Batch runs execute a workflow once per record of a CSV/JSONL dataset.
+# Uploaded inputs and result files live under DIR. CONCURRENCY records run
+# at once; progress is checkpointed every CHECKPOINT_EVERY records or
+# CHECKPOINT_INTERVAL seconds, whichever comes first.
+BATCH_RUNS = {
+    'DIR': os.getenv('BATCH_RUNS_DIR', str(BASE_DIR / 'batch_runs')),
+    'CONCURRENCY': int(os.getenv('BATCH_RUNS_CONCURRENCY', '16')),
+    'CHECKPOINT_EVERY': int(os.getenv('BATCH_RUNS_CHECKPOINT_EVERY', '100')),
+    'CHECKPOINT_INTERVAL': float(os.getenv('BATCH_RUNS_CHECKPOINT_INTERVAL', '5')),
+}
+
+# Server-Sent Events progress stream (served by core.asgi). Each watched
+# execution is polled once per POLL_INTERVAL seconds no matter how many
+# clients are connected.
+EXECUTION_STREAM = {
+    'POLL_INTERVAL': float(os.getenv('EXECUTION_STREAM_POLL_INTERVAL', '0.5')),
+    'HEARTBEAT': float(os.getenv('EXECUTION_STREAM_HEARTBEAT', '15')),
+}
+
+# Long-document summarization. Texts longer than CHUNK_TOKENS are split into
+# overlapping windows, summarized in batches and reduced hierarchically (at
+# most MAX_DEPTH levels). MODE is "auto", "long" or "single".
+LONG_DOCUMENT = {
+    'MODE': os.getenv('LONG_DOCUMENT_MODE', 'auto'),
+    'CHUNK_TOKENS': int(os.getenv('LONG_DOCUMENT_CHUNK_TOKENS', '900')),
+    'CHUNK_OVERLAP': int(os.getenv('LONG_DOCUMENT_CHUNK_OVERLAP', '64')),
+    'MAX_DEPTH': int(os.getenv('LONG_DOCUMENT_MAX_DEPTH', '3')),
+    'CHUNK_SUMMARY_MAX_LENGTH': int(os.getenv('LONG_DOCUMENT_CHUNK_SUMMARY_MAX_LENGTH', '150')),
+}
+
+# Image ingestion for classification: downloads are capped at MAX_BYTES and
+# cached on disk by content for URL_TTL seconds; images over MAX_PIXELS or in
+# other FORMATS are rejected before decoding. Decoding and resizing run in a
+# DECODE_POOL ("thread" or "process") of DECODE_WORKERS (0 = one per core).
+IMAGE_INGEST = {
+    'CACHE_DIR': os.getenv('IMAGE_CACHE_DIR', str(BASE_DIR / 'image_cache')),
+    'URL_TTL': int(os.getenv('IMAGE_URL_TTL', '3600')),
+    'MAX_BYTES': int(os.getenv('IMAGE_MAX_BYTES', str(10 * 2**20))),
+    'MAX_PIXELS': int(os.getenv('IMAGE_MAX_PIXELS', str(40_000_000))),
+    'FORMATS': os.getenv('IMAGE_FORMATS', 'JPEG,PNG,WEBP,GIF,BMP').split(','),
+    'TIMEOUT': float(os.getenv('IMAGE_FETCH_TIMEOUT', '10')),
+    'DECODE_POOL': os.getenv('IMAGE_DECODE_POOL', 'thread'),
+    'DECODE_WORKERS': int(os.getenv('IMAGE_DECODE_WORKERS', '0')),
+    'ARRAY_CACHE_ENTRIES': int(os.getenv('IMAGE_ARRAY_CACHE_ENTRIES', '64')),
+}
+
+# Inference backend per task type: "eager" (fp32), "int8" (dynamic
+# quantization), "onnx" (needs optimum[onnxruntime]) or "torchscript"
+# (classification only). Build artifacts ahead of time with
+# `python manage.py export_models`.
+ML_INFERENCE_BACKENDS = {
+    'summarization': os.getenv('ML_SUMMARIZATION_BACKEND', 'eager'),
+    'classification': os.getenv('ML_CLASSIFICATION_BACKEND', 'eager'),
+}
+ML_ARTIFACTS_DIR = os.getenv('ML_ARTIFACTS_DIR', str(BASE_DIR / 'ml_artifacts'))
+
+# Outgoing mail for the email task. Messages go out over MAILER['POOL_SIZE']
+# long-lived SMTP sessions in batches. For offline development run
+# `python manage.py smtpdebug` and set EMAIL_HOST=127.0.0.1, EMAIL_PORT=1025,
+# EMAIL_USE_TLS=False.
+EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.gmail.com')
+EMAIL_PORT = int(os.getenv('EMAIL_PORT', '587'))
+EMAIL_HOST_USER = os.getenv('EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.getenv('EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True') == 'True'
+EMAIL_USE_SSL = os.getenv('EMAIL_USE_SSL', 'False') == 'True'
+EMAIL_TIMEOUT = float(os.getenv('EMAIL_TIMEOUT', '30'))
+DEFAULT_FROM_EMAIL = os.getenv('EMAIL_FROM', EMAIL_HOST_USER)
+MAILER = {
+    'POOL_SIZE': int(os.getenv('MAILER_POOL_SIZE', '2')),
+    'BATCH_SIZE': int(os.getenv('MAILER_BATCH_SIZE', '20')),
+    'BATCH_MAX_LATENCY': float(os.getenv('MAILER_BATCH_MAX_LATENCY', '0.05')),
+    'MAX_RETRIES': int(os.getenv('MAILER_MAX_RETRIES', '3')),
+    'RETRY_BACKOFF': float(os.getenv('MAILER_RETRY_BACKOFF', '1.0')),
+    'IDLE_TIMEOUT': float(os.getenv('MAILER_IDLE_TIMEOUT', '60')),
+}
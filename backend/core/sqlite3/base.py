@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Django's SQLite backend with settings.SQLITE applied.
+
+    Django 5.0 has neither init_command nor transaction_mode for SQLite, so
+    the pragmas run here on each new connection and transactions open with
+    the configured BEGIN mode.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in settings.SQLITE['PRAGMAS'].items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = settings.SQLITE['TRANSACTION_MODE']
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
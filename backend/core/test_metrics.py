@@ -0,0 +1,22 @@
+from django.test import SimpleTestCase, override_settings
+
+METRICS = {'ENABLED': True, 'TOKEN': '', 'PROFILE_SAMPLE_RATE': 0, 'PROFILE_DIR': ''}
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_disabled_by_default(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS=METRICS)
+    def test_enabled_without_token(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'# TYPE', response.content)
+
+    @override_settings(METRICS={**METRICS, 'TOKEN': 'secret'})
+    def test_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer wrong'})
+        self.assertEqual(response.status_code, 401)
+        response = self.client.get('/metrics', headers={'Authorization': 'Bearer secret'})
+        self.assertEqual(response.status_code, 200)
@@ -2,7 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_nested import routers
 from rest_framework.routers import DefaultRouter
-from apps.workflows.views import WorkflowViewSet, TaskViewSet, ConnectionViewSet
+from apps.workflows.views import (
+    WorkflowViewSet, TaskViewSet, ConnectionViewSet, execute_task, execute_workflow,
+)
+from apps.executions.views import BatchRunViewSet, WorkflowExecutionViewSet, execution_stream
+from apps.ml.views import ml_stats
+from core.metrics import metrics_view
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
@@ -19,14 +24,23 @@ schema_view = get_schema_view(
 
 router = DefaultRouter()
 router.register(r'workflows', WorkflowViewSet)
+router.register(r'executions', WorkflowExecutionViewSet)
+router.register(r'batch-runs', BatchRunViewSet)
 workflows_router = routers.NestedDefaultRouter(router, r'workflows', lookup='workflow')
 workflows_router.register(r'tasks', TaskViewSet, basename='workflow-tasks')
 workflows_router.register(r'connections', ConnectionViewSet, basename='workflow-connections')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Async views, ahead of the router so they win over its detail routes.
+    path('api/workflows/<uuid:pk>/execute/', execute_workflow),
+    path('api/workflows/execute_task/', execute_task),
+    path('api/workflows/execute-task/', execute_task),
     path('api/', include(router.urls)),
     path('api/', include(workflows_router.urls)),
+    path('api/executions/<uuid:pk>/stream/', execution_stream),
+    path('api/ml/stats/', ml_stats),
+    path('metrics', metrics_view),
     path('api/docs/', schema_view.with_ui('swagger', cache_timeout=0)),
-    path('workflows/execute-task/', WorkflowViewSet.as_view({'post': 'execute_task'})),
+    path('workflows/execute-task/', execute_task),
 ]
\ No newline at end of file